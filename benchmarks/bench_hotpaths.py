@@ -0,0 +1,276 @@
+"""Benchmarks for the sizing and execution hot paths.
+
+Each scenario runs against a synthetic universe of strategies x securities
+and a fake FTX client, and records wall time, peak traced memory and the
+number of DB queries. A scenario fails if any of them is over its budget
+in budgets.json, so a regression shows up as a failing benchmark.
+
+    make bench                        # small universe, 5 x 200
+    WAGMI_BENCH_SCALE=full make bench # 50 strategies x 2,000 securities
+    WAGMI_BENCH_UPDATE=1 make bench   # rewrite budgets from this run
+
+Time is measured with tracemalloc running, so it's slower than production
+but comparable between runs. Query budgets are exact counts: a change in
+either direction fails, so an improvement gets its budget lowered too.
+
+Budgets were measured on the database named in budgets.json (SQLite, whose
+bulk operations batch differently from Postgres); on any other database
+the numbers are reported but not checked.
+"""
+
+import contextlib
+import io
+import json
+import math
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from django.core import management
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from execution.exchanges.ftx import FTXExchange
+from execution.exchanges.snapshot import AccountSnapshot
+from helpers.ftxtools import FTXStrategy
+from sizing.models import (
+    Exchange,
+    Security,
+    Strategy,
+    StrategyPositionRequest,
+    TargetPosition,
+)
+
+pytestmark = pytest.mark.django_db
+
+SCALES = {"small": (5, 200), "full": (50, 2000)}
+SCALE = os.environ.get("WAGMI_BENCH_SCALE", "small")
+NUM_STRATEGIES, NUM_SECURITIES = SCALES[SCALE]
+FILLS_PER_MARKET = 5
+
+BUDGETS_PATH = Path(__file__).with_name("budgets.json")
+BUDGETS = json.loads(BUDGETS_PATH.read_text())
+# headroom given to time and memory when budgets are rewritten
+HEADROOM = 3.0
+
+calculated_at = datetime(2021, 11, 25, tzinfo=timezone.utc)
+
+
+def markets():
+    return [f"COIN{i}/USD" for i in range(NUM_SECURITIES)]
+
+
+class BenchClient:
+    """Answers the FtxClient calls made by the hot paths from memory"""
+
+    def __init__(self, fills=()):
+        self.fills = list(fills)
+
+    def get_balances(self):
+        return [{"coin": f"COIN{i}", "total": 1.0} for i in range(NUM_SECURITIES)]
+
+    def get_positions(self):
+        return []
+
+    def get_open_orders(self):
+        return []
+
+    def get_market(self, market):
+        return {
+            "bid": 99.0,
+            "ask": 101.0,
+            "price": 100.0,
+            "priceIncrement": 0.5,
+            "sizeIncrement": 0.001,
+            "minProvideSize": 0.001,
+        }
+
+    def get_fills(self, start_time, end_time):
+        return [
+            fill for fill in self.fills if start_time <= fill["timestamp"] <= end_time
+        ][::-1]
+
+    def list_lts(self):
+        return []
+
+    def get_futures(self):
+        return []
+
+
+def synthetic_fills(now):
+    """Round trips in every market, spread over the last few days."""
+    fills = []
+    for i, market in enumerate(markets()):
+        for j in range(FILLS_PER_MARKET):
+            when = now - timedelta(hours=3 * (FILLS_PER_MARKET - j), minutes=i % 60)
+            fills.append(
+                {
+                    "id": len(fills) + 1,
+                    "orderId": len(fills) + 1,
+                    "market": market,
+                    "side": "buy" if j % 2 == 0 else "sell",
+                    "size": 1.0,
+                    "price": 100.0 + j,
+                    "fee": 0.01,
+                    "feeCurrency": "USD",
+                    "liquidity": "maker",
+                    "time": when.isoformat(),
+                    "timestamp": when.timestamp(),
+                }
+            )
+    return sorted(fills, key=lambda fill: fill["timestamp"])
+
+
+@pytest.fixture(scope="session")
+def results():
+    results = {}
+    yield results
+    print(f"\n{SCALE} universe, {NUM_STRATEGIES} strategies x {NUM_SECURITIES}")
+    for name, result in results.items():
+        print(
+            f"{name:30} {result['seconds']:8.3f}s {result['peak_mb']:8.1f}MB "
+            f"{result['queries']:6} queries"
+        )
+    if os.environ.get("WAGMI_BENCH_UPDATE"):
+        BUDGETS["database"] = connection.vendor
+        BUDGETS[SCALE] = {
+            name: {
+                "seconds": round(result["seconds"] * HEADROOM, 3),
+                "peak_mb": round(max(result["peak_mb"] * HEADROOM, 1.0), 1),
+                "queries": result["queries"],
+            }
+            for name, result in results.items()
+        }
+        BUDGETS_PATH.write_text(json.dumps(BUDGETS, indent=4, sort_keys=True) + "\n")
+
+
+def measure(results, name, fn):
+    """Run fn once, recording its time, peak memory and DB queries, and
+    fail if any of them is over budget."""
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            value = fn()
+            seconds = time.perf_counter() - start
+    peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    result = {"seconds": seconds, "peak_mb": peak_mb, "queries": len(queries)}
+    results[name] = result
+    budget = BUDGETS.get(SCALE, {}).get(name)
+    if (
+        budget
+        and connection.vendor == BUDGETS["database"]
+        and not os.environ.get("WAGMI_BENCH_UPDATE")
+    ):
+        over = {
+            k: v
+            for k, v in result.items()
+            if (v != budget[k] if k == "queries" else v > budget[k])
+        }
+        assert not over, f"{name} off budget {budget}: {over}"
+    return value
+
+
+@pytest.fixture
+def universe():
+    management.call_command("loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0)
+    ftx = Exchange.objects.get(name="ftx")
+    strategies = [
+        Strategy.objects.create(
+            name=f"strategy{i}",
+            exchange=ftx,
+            max_position_size_usd=Decimal(10000),
+            url=f"http://localhost:8000/weights/strategy{i}",
+            command="bench",
+        )
+        for i in range(NUM_STRATEGIES)
+    ]
+    return ftx, strategies
+
+
+def ingest(strategies):
+    for i, strategy in enumerate(strategies):
+        StrategyPositionRequest.objects.set_positions(
+            strategy.name,
+            "ftx",
+            [
+                {
+                    "security_name": market,
+                    "weight": (-1) ** (i + j) / NUM_SECURITIES,
+                    "arrival_price_usd": 100.0,
+                }
+                for j, market in enumerate(markets())
+            ],
+            calculated_at,
+        )
+
+
+def test_set_positions(results, universe) -> None:
+    _, strategies = universe
+    measure(results, "set_positions", lambda: ingest(strategies))
+    assert StrategyPositionRequest.objects.count() == NUM_STRATEGIES * NUM_SECURITIES
+
+
+def test_create_new_desired_positions(results, universe) -> None:
+    _, strategies = universe
+    ingest(strategies)
+
+    targets = measure(
+        results,
+        "create_new_desired_positions",
+        TargetPosition.objects.create_new_desired_positions,
+    )
+    assert len(targets) == NUM_SECURITIES
+
+
+def test_set_position(results) -> None:
+    exchange = FTXExchange(
+        subaccount="bench", testmode=True, api_key="none", api_secret="none"
+    )
+    exchange.client = BenchClient()
+    exchange.snapshot = AccountSnapshot(exchange.client)
+    securities = [Security(name=market) for market in markets()]
+
+    def set_positions():
+        for security in securities:
+            exchange.set_position(security, 2.0)
+
+    measure(results, "set_position", set_positions)
+    assert exchange.quote_cache.stats["misses"] == NUM_SECURITIES
+
+
+def test_get_spread_midpoint(results) -> None:
+    exchange = FTXExchange(
+        subaccount="bench", testmode=True, api_key="none", api_secret="none"
+    )
+    quotes = [
+        {"bid": 100.0, "ask": 100.0 + i % 7, "priceIncrement": 0.5}
+        for i in range(NUM_STRATEGIES * NUM_SECURITIES)
+    ]
+
+    def midpoints():
+        return [
+            exchange._get_spread_midpoint(quote, side)
+            for quote in quotes
+            for side in (exchange.BUY, exchange.SELL)
+        ]
+
+    prices = measure(results, "_get_spread_midpoint", midpoints)
+    assert len(prices) == 2 * len(quotes)
+
+
+def test_pandl(results, universe) -> None:
+    now = datetime.now(tz=timezone.utc)
+    client = BenchClient(synthetic_fills(now))
+    with mock.patch("helpers.ftxtools.ftx.FtxClient", return_value=client):
+        strategy = FTXStrategy(subaccount="bench")
+
+    trades = measure(results, "FTXStrategy.pandl", strategy.pandl)
+    assert len(trades) == NUM_SECURITIES * math.ceil(FILLS_PER_MARKET / 2)
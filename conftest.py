@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings):
+    """Tests get a cache of their own, not the live app's shared one.
+
+    WAGMI_CACHE_URL can point settings.CACHES at a cache every wagmi process
+    on the host shares, and a test's cache.clear() would empty the running
+    app's.
+    """
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "wagmi-tests",
+        }
+    }
+    settings.WAGMI_SHARED_EXCHANGE_CACHE = False
@@ -0,0 +1,49 @@
+"""Cached JSON bodies for the read-only API.
+
+Bodies are kept in the Django cache under the current generation, a
+number that invalidate() replaces whenever the data behind the API
+changes (a netting pass, new strategy requests, a fill sync). Every
+entry from before that is then unreachable and simply expires, so
+invalidation is one cache write however many pages were cached.
+Entries also expire after settings.WAGMI_API_CACHE_TTL, which bounds
+how stale exchange positions can get.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+GENERATION_KEY = "api:generation"
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    """Make every cached API response stale."""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_or_build(path, build):
+    """The (etag, body) for a request path, building it on a miss.
+
+    Args:
+        path (str): the full path, query string included
+        build (callable): returns the data to serialise as JSON
+
+    Returns:
+        tuple: (etag, body)
+    """
+    key = f"api:{generation()}:{hashlib.md5(path.encode('utf-8')).hexdigest()}"
+    entry = cache.get(key)
+    if entry is None:
+        body = json.dumps(build(), cls=DjangoJSONEncoder)
+        etag = f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"'
+        entry = (etag, body)
+        cache.set(key, entry, settings.WAGMI_API_CACHE_TTL)
+    return entry
@@ -0,0 +1,76 @@
+"""A no-trade band around each target position.
+
+Small weight changes produce small deltas whose fees and API calls cost
+more than the tracking error they fix. A delta is only traded when it is
+worth more than `min_notional_usd` and more than `band_pct` of the
+target; otherwise the current position is kept.
+
+When a delta does trade, it stops `hysteresis` of the band short of the
+target, inside the band, rather than at the target itself. A target that
+then swings back has to move further before it trades again, so weights
+oscillating around a level settle into one position instead of trading
+back and forth every cycle. A target of 0 is the exception: closing a
+position trades all the way, or it would never be closed.
+"""
+
+import logging
+import math
+import threading
+
+logger = logging.getLogger("execution")
+
+
+class NoTradeBand(object):
+    """Thread-safe, shared by every order worker of a create_orders cycle.
+
+    Args:
+        min_notional_usd (float): deltas worth less are not traded
+        band_pct (float): deltas smaller than this fraction of the target
+            are not traded, e.g. 0.05
+        hysteresis (float): fraction of the band, from 0 (trade all the way
+            to the target) to 1 (trade only to the edge of the band)
+    """
+
+    def __init__(self, min_notional_usd=0.0, band_pct=0.0, hysteresis=0.0) -> None:
+        assert 0.0 <= hysteresis <= 1.0, "hysteresis is a fraction of the band"
+        self.min_notional_usd = min_notional_usd
+        self.band_pct = band_pct
+        self.hysteresis = hysteresis
+        self._lock = threading.Lock()
+        self.stats = {"traded": 0, "suppressed": 0, "saved_usd": 0.0}
+
+    def width(self, target, price):
+        """Half-width of the band around `target`, in units."""
+        return max(self.min_notional_usd / price, self.band_pct * abs(target))
+
+    def apply(self, market, current, target, price):
+        """The position to trade to.
+
+        Args:
+            market (str): for logging
+            current (float): position held now, in units
+            target (float): netted target position, in units
+            price (float): USD price of a unit
+
+        Returns:
+            float: `current` if the delta is inside the band, else the
+                target less the hysteresis (or 0, if that's the target).
+        """
+        delta = target - current
+        band = self.width(target, price)
+        if abs(delta) <= band:
+            with self._lock:
+                self.stats["suppressed"] += 1
+                self.stats["saved_usd"] += abs(delta) * price
+            logger.info(
+                f"{market} delta {delta} is inside the no-trade band of {band}, not trading"
+            )
+            return current
+
+        trade_to = target
+        if target != 0:
+            trade_to -= math.copysign(self.hysteresis * band, delta)
+        with self._lock:
+            self.stats["traded"] += 1
+            self.stats["saved_usd"] += abs(target - trade_to) * price
+        return trade_to
@@ -0,0 +1,181 @@
+import threading
+import time
+
+from django.core.cache import cache as default_cache
+
+from wagmi import tracing
+
+_missing = object()
+
+# seconds a process trusts its copy of a SharedTTLCache's generation
+GENERATION_TTL = 1.0
+
+
+class TTLCache(object):
+    """A thread-safe in-memory cache whose entries expire `ttl` seconds
+    after they were stored.
+
+    Hits and misses are counted so callers can report how many exchange
+    round trips the cache saved.
+    """
+
+    def __init__(self, ttl: float, clock=time.monotonic) -> None:
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._loading = {}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() - entry[1] <= self.ttl:
+            return entry[0]
+        self._entries.pop(key, None)
+        return _missing
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _missing:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+
+    def get_or_set(self, key, loader):
+        """Return the cached value for key, calling loader() to fill a miss.
+
+        Concurrent misses on the same key wait for a single load, and a
+        slow load of one key does not block readers of the others.
+        """
+        value = self.get(key, _missing)
+        if value is not _missing:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                value = self._lookup(key)
+            if value is _missing:
+                value = loader()
+                self.set(key, value)
+        with self._lock:
+            self._loading.pop(key, None)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key if none is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class SharedTTLCache(object):
+    """TTLCache's interface over a Django cache backend, so every process
+    on the host (or every host, with an external store) shares entries.
+
+    Keys are namespaced by `name`, and invalidate() with no key moves the
+    namespace to a new generation rather than deleting entries one by one.
+    Each process re-reads the generation at most every GENERATION_TTL
+    seconds, so a get is one backend round trip, and other processes see
+    an invalidate() within that time. Generations are stored without a
+    timeout, and losing one silently starts a new generation, so use a
+    backend that evicts by recency or only keys with a timeout (memcached,
+    redis with volatile-lru), not a file cache, which culls at random.
+    Concurrent misses within a process wait for a single load; across
+    processes a miss may be loaded more than once. Hits and misses are
+    also counted in the tracing registry as wagmi_cache_requests_total.
+
+    Args:
+        name (str): namespace, e.g. "ftx:main:snapshot"
+        ttl (float): seconds entries live
+        backend (BaseCache, optional): Defaults to django's default cache,
+            see settings.WAGMI_CACHE_URL.
+    """
+
+    def __init__(self, name, ttl: float, backend=None, clock=time.monotonic) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend or default_cache
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._generation = None  # (generation, when it was read)
+
+    def _key(self, key):
+        with self._lock:
+            generation = self._generation
+        if generation is None or self.clock() - generation[1] > GENERATION_TTL:
+            generation = (
+                self.backend.get_or_set(f"{self.name}:generation", time.time_ns, None),
+                self.clock(),
+            )
+            with self._lock:
+                self._generation = generation
+        return f"{self.name}:{generation[0]}:{key}"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        tracing.REGISTRY.increment(
+            "wagmi_cache_requests_total",
+            cache=self.name,
+            result="hit" if hit else "miss",
+        )
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        value = self.backend.get(self._key(key), _missing)
+        self._count(value is not _missing)
+        return default if value is _missing else value
+
+    def set(self, key, value):
+        self.backend.set(self._key(key), value, self.ttl)
+
+    def get_or_set(self, key, loader):
+        """Return the cached value for key, calling loader() to fill a miss."""
+        value = self.get(key, _missing)
+        if value is not _missing:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            value = self.backend.get(self._key(key), _missing)
+            if value is _missing:
+                value = loader()
+                self.set(key, value)
+        with self._lock:
+            self._loading.pop(key, None)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key if none is given."""
+        if key is None:
+            generation = time.time_ns()
+            self.backend.set(f"{self.name}:generation", generation, None)
+            with self._lock:
+                self._generation = (generation, self.clock())
+        else:
+            self.backend.delete(self._key(key))
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
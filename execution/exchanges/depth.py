@@ -0,0 +1,173 @@
+"""Order book depth and expected slippage.
+
+The best bid and ask say nothing about how much size is behind them.
+DepthModel reads an L2 snapshot of the book, briefly cached, and for an
+order of a given size it:
+
+- caps the size at what the book absorbs within `max_slippage_bps` of
+  the mid, leaving the rest for a later cycle (or a SlicingScheduler's
+  next child);
+- sweeps the book with an immediate-or-cancel order when that costs no
+  more than `sweep_bps` beyond the mid;
+- otherwise posts at the midpoint of the spread, or passively at the best
+  bid/ask when the spread is a single tick.
+
+A book with an empty side isn't planned from; the order is priced from
+the quote as it would be without a DepthModel.
+"""
+
+import math
+import time
+from collections import namedtuple
+
+from execution.exchanges.cache import TTLCache
+
+PASSIVE = "passive"
+MIDPOINT = "midpoint"
+SWEEP = "sweep"
+
+Pricing = namedtuple("Pricing", ["style", "price", "units", "slippage"])
+
+
+class OrderBook(object):
+    """An L2 snapshot, levels are (price, size) best first."""
+
+    def __init__(self, bids, asks) -> None:
+        self.bids = [(float(price), float(size)) for price, size in bids]
+        self.asks = [(float(price), float(size)) for price, size in asks]
+
+    @classmethod
+    def from_ftx(cls, data):
+        return cls(data["bids"], data["asks"])
+
+    @property
+    def bid(self):
+        return self.bids[0][0]
+
+    @property
+    def ask(self):
+        return self.asks[0][0]
+
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2
+
+    def _levels(self, side):
+        return self.asks if side == "buy" else self.bids
+
+    def sweep(self, side: str, units: float):
+        """Walk the book as a market order of `units` would.
+
+        Returns:
+            tuple: (units filled, average price, worst price touched)
+        """
+        filled = cost = 0.0
+        worst = None
+        for price, size in self._levels(side):
+            if filled >= units:
+                break
+            take = min(size, units - filled)
+            filled += take
+            cost += take * price
+            worst = price
+        return filled, (cost / filled if filled else None), worst
+
+    def slippage(self, side: str, units: float):
+        """Expected cost of sweeping `units`, as a fraction of the mid.
+
+        Returns:
+            float: slippage, or math.inf if the book isn't deep enough.
+        """
+        filled, average, _ = self.sweep(side, units)
+        if not filled or filled < units:
+            return math.inf
+        sign = 1 if side == "buy" else -1
+        return sign * (average - self.mid) / self.mid
+
+    def capacity(self, side: str, max_slippage: float):
+        """The most units that can be swept within `max_slippage` of the mid."""
+        sign = 1 if side == "buy" else -1
+        limit = self.mid * (1 + sign * max_slippage)
+        units = cost = 0.0
+        for price, size in self._levels(side):
+            if sign * (price - limit) <= 0:
+                units += size
+                cost += size * price
+                continue
+            # the average reaches the limit part way into this level
+            units += max(0.0, min(size, (limit * units - cost) / (price - limit)))
+            break
+        return units
+
+
+class DepthModel(object):
+    """Chooses how to price and size an order from the depth of the book.
+
+    Args:
+        client (ftx.FtxClient): client used to fetch order books
+        ttl (float, optional): seconds a book snapshot is reused. Defaults to 1.0.
+        depth (int, optional): levels fetched per side. Defaults to 20.
+        sweep_bps (float, optional): sweep when it costs at most this much
+            beyond the mid. Defaults to 2.0.
+        max_slippage_bps (float, optional): cap order size at what the
+            book absorbs within this much of the mid. Defaults to 50.0.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl=1.0,
+        depth=20,
+        sweep_bps=2.0,
+        max_slippage_bps=50.0,
+        clock=time.monotonic,
+    ) -> None:
+        self.client = client
+        self.depth = depth
+        self.sweep_bps = sweep_bps
+        self.max_slippage_bps = max_slippage_bps
+        self.cache = TTLCache(ttl=ttl, clock=clock)
+
+    def get_book(self, market):
+        return self.cache.get_or_set(
+            str(market),
+            lambda: OrderBook.from_ftx(
+                self.client.get_orderbook(str(market), self.depth)
+            ),
+        )
+
+    def plan(self, market, side: str, units: float, metadata: dict):
+        """Price and size an order.
+
+        Args:
+            market (str): the market, e.g. 'BTC/USD'
+            side (str): 'buy' or 'sell'
+            units (float): the size wanted
+            metadata (dict): priceIncrement and sizeIncrement of the market
+
+        Returns:
+            Pricing: style, price, units (possibly capped) and the expected
+                slippage of sweeping them, or None if a side of the book is
+                empty, so there's no mid to price from.
+        """
+        book = self.get_book(market)
+        if not book.bids or not book.asks:
+            return None
+        capacity = book.capacity(side, self.max_slippage_bps / 10000)
+        size_increment = metadata.get("sizeIncrement")
+        if capacity < units and size_increment:
+            capacity = math.floor(round(capacity / size_increment, 9)) * size_increment
+        units = min(units, capacity)
+        slippage = book.slippage(side, units)
+
+        if slippage <= self.sweep_bps / 10000:
+            return Pricing(SWEEP, book.sweep(side, units)[2], units, slippage)
+
+        price_increment = metadata.get("priceIncrement")
+        spread_in_ticks = round((book.ask - book.bid) / price_increment, 9)
+        if spread_in_ticks <= 1:
+            price = book.bid if side == "buy" else book.ask
+            return Pricing(PASSIVE, price, units, slippage)
+        offset = math.ceil(spread_in_ticks / 2) * price_increment
+        price = book.bid + offset if side == "buy" else book.ask - offset
+        return Pricing(MIDPOINT, price, units, slippage)
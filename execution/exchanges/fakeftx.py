@@ -0,0 +1,506 @@
+"""An in-process stand-in for the FTX REST API.
+
+FakeFTXState keeps the markets, balances, orders and fills of one account
+and matches orders against a synthetic best bid/ask. FakeFTXServer serves
+it over HTTP on localhost, so a real ftx.FtxClient (pointed at `url`) can
+be used offline. Latency, jitter, 429 rate limiting and server errors can
+be injected to load-test concurrent execution and caching.
+
+    with FakeFTXServer(latency=0.05, jitter=0.02, rate_limit=30) as server:
+        client = ftx.FtxClient(base_url=server.url, api_key="x", api_secret="y")
+        client.place_order("BTC/USD", "buy", 49480.0, 0.1, post_only=True)
+"""
+
+import collections
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("execution")
+
+MAKER_FEE = 0.0002
+TAKER_FEE = 0.0007
+
+
+class FakeFTXError(Exception):
+    def __init__(self, message, status=400):
+        super(FakeFTXError, self).__init__(message)
+        self.status = status
+
+
+class FakeFTXState(object):
+    """Markets, balances, orders and fills of one fake FTX account.
+
+    Args:
+        markets (dict, optional): market name -> (bid, ask)
+        balances (dict, optional): coin -> total. Defaults to 100,000 USD.
+        futures (list, optional): get_futures() records
+        lts (list, optional): list_lts() records
+    """
+
+    def __init__(self, markets=None, balances=None, futures=(), lts=()) -> None:
+        self.lock = threading.RLock()
+        self.markets = {}
+        self.balances = collections.defaultdict(float, balances or {"USD": 100000.0})
+        self.futures = list(futures)
+        self.lts = list(lts)
+        self.orders = {}
+        self.fills = []
+        self._ids = itertools.count(1)
+        markets = markets or {
+            "BTC/USD": (49480.0, 49484.0),
+            "ETH/USD": (4000.0, 4001.0),
+        }
+        for name, (bid, ask) in markets.items():
+            self.add_market(name, bid, ask)
+
+    def add_market(
+        self, name, bid, ask, price_increment=1.0, size_increment=0.0001, volume=1e8
+    ):
+        base, quote = name.split("/")
+        self.markets[name] = {
+            "name": name,
+            "type": "spot",
+            "baseCurrency": base,
+            "quoteCurrency": quote,
+            "enabled": True,
+            "bid": bid,
+            "ask": ask,
+            "last": ask,
+            "price": ask,
+            "priceIncrement": price_increment,
+            "sizeIncrement": size_increment,
+            "minProvideSize": size_increment,
+            "volumeUsd24h": volume,
+        }
+
+    def _market(self, name):
+        if name not in self.markets:
+            raise FakeFTXError(f"No such market: {name}", status=404)
+        return self.markets[name]
+
+    def _order(self, order_id):
+        if int(order_id) not in self.orders:
+            raise FakeFTXError("Order not found", status=404)
+        return self.orders[int(order_id)]
+
+    def get_markets(self):
+        with self.lock:
+            return [dict(market) for market in self.markets.values()]
+
+    def get_market(self, name):
+        with self.lock:
+            return dict(self._market(name))
+
+    def get_orderbook(self, name, depth=20, level_size=1.0):
+        """A synthetic book, `level_size` at every tick behind the top."""
+        with self.lock:
+            market = self._market(name)
+            tick = market["priceIncrement"]
+            levels = range(int(depth or 20))
+            return {
+                "bids": [[market["bid"] - i * tick, level_size] for i in levels],
+                "asks": [[market["ask"] + i * tick, level_size] for i in levels],
+            }
+
+    def get_balances(self):
+        with self.lock:
+            return [
+                {"coin": coin, "total": total, "free": total, "usdValue": None}
+                for coin, total in self.balances.items()
+            ]
+
+    def get_open_orders(self, market=None):
+        with self.lock:
+            return [
+                dict(order)
+                for order in self.orders.values()
+                if order["status"] == "open" and market in (None, order["market"])
+            ]
+
+    def get_order_status(self, order_id):
+        with self.lock:
+            return dict(self._order(order_id))
+
+    def get_fills(self, start_time=None, end_time=None, limit=100):
+        """Fills in the time range, newest first, one page of `limit`."""
+        with self.lock:
+            fills = [
+                fill
+                for fill in self.fills
+                if (start_time is None or fill["timestamp"] >= start_time)
+                and (end_time is None or fill["timestamp"] <= end_time)
+            ]
+        fills = sorted(fills, key=lambda fill: fill["timestamp"], reverse=True)
+        return [
+            {k: v for k, v in fill.items() if k != "timestamp"}
+            for fill in fills[:limit]
+        ]
+
+    def _fill(self, order, price, size, liquidity):
+        market = self.markets[order["market"]]
+        fee = size * price * (MAKER_FEE if liquidity == "maker" else TAKER_FEE)
+        sign = 1 if order["side"] == "buy" else -1
+        self.balances[market["baseCurrency"]] += sign * size
+        self.balances[market["quoteCurrency"]] -= sign * size * price + fee
+
+        filled = order["filledSize"] + size
+        order["avgFillPrice"] = (
+            (order["avgFillPrice"] or 0.0) * order["filledSize"] + price * size
+        ) / filled
+        order["filledSize"] = filled
+        order["remainingSize"] = order["size"] - filled
+        if order["remainingSize"] <= 0:
+            order["status"] = "closed"
+
+        now = time.time()
+        self.fills.append(
+            {
+                "id": len(self.fills) + 1,
+                "orderId": order["id"],
+                "market": order["market"],
+                "baseCurrency": market["baseCurrency"],
+                "quoteCurrency": market["quoteCurrency"],
+                "type": "order",
+                "side": order["side"],
+                "size": size,
+                "price": price,
+                "fee": fee,
+                "feeCurrency": market["quoteCurrency"],
+                "liquidity": liquidity,
+                "time": datetime.fromtimestamp(now, tz=timezone.utc).isoformat(),
+                "timestamp": now,
+            }
+        )
+
+    def _crosses(self, order):
+        market = self.markets[order["market"]]
+        if order["side"] == "buy":
+            return order["price"] >= market["ask"]
+        return order["price"] <= market["bid"]
+
+    def place_order(
+        self,
+        market,
+        side,
+        price,
+        size,
+        type="limit",
+        reduceOnly=False,
+        ioc=False,
+        postOnly=False,
+        clientId=None,
+    ):
+        """Place a limit order. Crossing orders fill at once at the touch,
+        unless they're post-only (then they're cancelled); others rest
+        until set_quote moves the market through them."""
+        with self.lock:
+            quote = self._market(market)
+            if side not in ("buy", "sell"):
+                raise FakeFTXError(f"Invalid side: {side}")
+            if size < quote["sizeIncrement"]:
+                raise FakeFTXError("Size too small")
+            order = {
+                "id": next(self._ids),
+                "clientId": clientId,
+                "market": market,
+                "type": type,
+                "side": side,
+                "price": price,
+                "size": size,
+                "filledSize": 0.0,
+                "remainingSize": size,
+                "avgFillPrice": None,
+                "status": "open",
+                "reduceOnly": reduceOnly,
+                "ioc": ioc,
+                "postOnly": postOnly,
+                "createdAt": datetime.now(tz=timezone.utc).isoformat(),
+            }
+            self.orders[order["id"]] = order
+            if self._crosses(order):
+                if postOnly:
+                    order["status"] = "closed"
+                else:
+                    touch = quote["ask"] if side == "buy" else quote["bid"]
+                    self._fill(order, touch, size, "taker")
+            elif ioc:
+                order["status"] = "closed"
+            return dict(order)
+
+    def cancel_order(self, order_id):
+        with self.lock:
+            order = self._order(order_id)
+            if order["status"] != "open":
+                raise FakeFTXError("Order already closed")
+            order["status"] = "closed"
+            return "Order queued for cancellation"
+
+    def modify_order(self, order_id, price=None, size=None, clientId=None):
+        """Cancel and replace, as FTX does: the new order gets a new id."""
+        with self.lock:
+            order = self._order(order_id)
+            self.cancel_order(order_id)
+            return self.place_order(
+                order["market"],
+                order["side"],
+                order["price"] if price is None else price,
+                order["remainingSize"] if size is None else size,
+                type=order["type"],
+                reduceOnly=order["reduceOnly"],
+                ioc=order["ioc"],
+                postOnly=order["postOnly"],
+                clientId=clientId,
+            )
+
+    def set_quote(self, market, bid, ask):
+        """Move the market; resting orders it crosses fill at their price."""
+        with self.lock:
+            quote = self._market(market)
+            quote.update(bid=bid, ask=ask, last=ask, price=ask)
+            for order in list(self.orders.values()):
+                if order["status"] == "open" and order["market"] == market:
+                    if self._crosses(order):
+                        self._fill(
+                            order, order["price"], order["remainingSize"], "maker"
+                        )
+
+    def get_market_info(self, market):
+        with self.lock:
+            coin = self._market(market)["baseCurrency"]
+            return [
+                {
+                    "coin": coin,
+                    "borrowed": 0.0,
+                    "free": self.balances[coin],
+                    "estimatedRate": 1e-05,
+                    "previousFunding": 1e-05,
+                }
+            ]
+
+    def get_borrow_rates(self):
+        with self.lock:
+            coins = {market["baseCurrency"] for market in self.markets.values()}
+            return [
+                {"coin": coin, "estimate": 1e-05, "previous": 1e-05}
+                for coin in sorted(coins)
+            ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(f"fake ftx {format % args}")
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(json.loads(self.rfile.read(length)))
+        status, body = self.server.fake.dispatch(method, url.path, params)
+        self._respond(status, body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def _float(params, key):
+    return float(params[key]) if params.get(key) is not None else None
+
+
+class FakeFTXServer(object):
+    """Serves a FakeFTXState over HTTP from a background thread.
+
+    Args:
+        state (FakeFTXState, optional): Defaults to a new FakeFTXState.
+        latency (float, optional): seconds added to every response
+        jitter (float, optional): up to this many extra seconds, at random
+        rate_limit (float, optional): requests per second; more than that
+            in any one second get a 429, like FTX's "Please slow down".
+        error_rate (float, optional): chance of answering with a 500
+        seed (int, optional): seeds the jitter and error injection
+        port (int, optional): Defaults to any free port.
+    """
+
+    def __init__(
+        self,
+        state=None,
+        latency=0.0,
+        jitter=0.0,
+        rate_limit=None,
+        error_rate=0.0,
+        seed=None,
+        port=0,
+    ) -> None:
+        self.state = state or FakeFTXState()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.port = port
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = collections.deque()
+        self._httpd = None
+        self._routes = [
+            ("GET", r"markets", lambda p: self.state.get_markets()),
+            (
+                "GET",
+                r"markets/(?P<market>.+)/orderbook",
+                lambda p: self.state.get_orderbook(p["market"], p.get("depth")),
+            ),
+            (
+                "GET",
+                r"markets/(?P<market>.+)",
+                lambda p: self.state.get_market(p["market"]),
+            ),
+            ("GET", r"wallet/balances", lambda p: self.state.get_balances()),
+            ("GET", r"positions", lambda p: []),
+            ("GET", r"orders", lambda p: self.state.get_open_orders(p.get("market"))),
+            (
+                "GET",
+                r"orders/(?P<id>\d+)",
+                lambda p: self.state.get_order_status(p["id"]),
+            ),
+            (
+                "POST",
+                r"orders",
+                lambda p: self.state.place_order(
+                    p["market"],
+                    p["side"],
+                    float(p["price"]),
+                    float(p["size"]),
+                    type=p.get("type", "limit"),
+                    reduceOnly=p.get("reduceOnly", False),
+                    ioc=p.get("ioc", False),
+                    postOnly=p.get("postOnly", False),
+                    clientId=p.get("clientId"),
+                ),
+            ),
+            (
+                "POST",
+                r"orders/(?P<id>\d+)/modify",
+                lambda p: self.state.modify_order(
+                    p["id"], _float(p, "price"), _float(p, "size"), p.get("clientId")
+                ),
+            ),
+            (
+                "DELETE",
+                r"orders/(?P<id>\d+)",
+                lambda p: self.state.cancel_order(p["id"]),
+            ),
+            (
+                "GET",
+                r"fills",
+                lambda p: self.state.get_fills(
+                    _float(p, "start_time"), _float(p, "end_time")
+                ),
+            ),
+            ("GET", r"futures", lambda p: self.state.futures),
+            ("GET", r"lt/tokens", lambda p: self.state.lts),
+            (
+                "GET",
+                r"spot_margin/market_info",
+                lambda p: self.state.get_market_info(p["market"]),
+            ),
+            (
+                "GET",
+                r"spot_margin/borrow_rates",
+                lambda p: self.state.get_borrow_rates(),
+            ),
+        ]
+
+    @property
+    def url(self):
+        """Base url for ftx.FtxClient"""
+        return f"http://127.0.0.1:{self.port}/api/"
+
+    def _throttled(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def dispatch(self, method, path, params):
+        """Answer one request.
+
+        Returns:
+            tuple: (http status, FTX style {"success", "result"/"error"} body)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if self._throttled():
+            with self._lock:
+                self.stats["throttled"] += 1
+            return 429, {"success": False, "error": "Please slow down"}
+        if fail:
+            with self._lock:
+                self.stats["errors"] += 1
+            return 500, {"success": False, "error": "Internal server error"}
+
+        path = path[len("/api/") :] if path.startswith("/api/") else path.lstrip("/")
+        for route_method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                try:
+                    result = handler({**params, **match.groupdict()})
+                except FakeFTXError as e:
+                    return e.status, {"success": False, "error": str(e)}
+                except (KeyError, ValueError) as e:
+                    return 400, {"success": False, "error": f"Bad request: {e}"}
+                return 200, {"success": True, "result": result}
+        return 404, {"success": False, "error": "Not Found"}
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f"fake ftx serving on {self.url}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
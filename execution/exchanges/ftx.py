@@ -1,11 +1,17 @@
 import logging
 import json
 import math
+import time
 from types import BuiltinMethodType
 
 import ftx
+from requests.adapters import HTTPAdapter
 
 from execution.exchanges import BaseExchange
+from execution.exchanges import depth
+from execution.exchanges.cache import SharedTTLCache, TTLCache
+from execution.exchanges.ratelimit import RateLimitedClient, RateLimiter
+from execution.exchanges.snapshot import AccountSnapshot
 
 # import http
 
@@ -19,12 +25,43 @@ class FTXExchange(BaseExchange):
     BUY = LONG = "buy"
     SELL = SHORT = "sell"
 
-    def __init__(self, subaccount, testmode, api_key, api_secret) -> None:
-
+    def __init__(
+        self,
+        subaccount,
+        testmode,
+        api_key,
+        api_secret,
+        snapshot_max_age=30.0,
+        metadata_ttl=3600.0,
+        quote_ttl=1.0,
+        rate_limit=None,
+        pool_size=None,
+        base_url=None,
+    ) -> None:
+
+        # base_url is for a stand-in such as fakeftx.FakeFTXServer
         self.client = ftx.FtxClient(
-            api_key=api_key, api_secret=api_secret, subaccount_name=subaccount
+            api_key=api_key,
+            api_secret=api_secret,
+            subaccount_name=subaccount,
+            **({"base_url": base_url} if base_url else {}),
         )
+        if pool_size:
+            # keep-alive connections for every thread sharing this exchange
+            for prefix in ("https://", "http://"):
+                self.client._session.mount(
+                    prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                )
+        if rate_limit:
+            # calls per second, shared by every thread using this exchange
+            self.client = RateLimitedClient(self.client, RateLimiter(rate_limit))
         self.testmode = testmode
+        self.snapshot = AccountSnapshot(self.client, max_age=snapshot_max_age)
+        # increments and minimum sizes almost never change, quotes do
+        self.metadata_cache = TTLCache(ttl=metadata_ttl)
+        self.quote_cache = TTLCache(ttl=quote_ttl)
+        self.feed = None  # optional streaming top-of-book, see attach_feed
+        self.depth = None  # optional order book depth model, see attach_depth_model
         logger.debug(f"ftx inited with testmode={testmode}")
 
     def _parse_symbol(self, market):
@@ -53,7 +90,80 @@ class FTXExchange(BaseExchange):
 
         """
         # TODO check there is one and only one result?
-        return self.client.get_market(market=market)
+        return self.quote_cache.get_or_set(
+            str(market), lambda: self._fetch_quote(market)
+        )
+
+    def _fetch_quote(self, market):
+        quote = self.client.get_market(market=market)
+        self.metadata_cache.set(str(market), self._parse_metadata(quote))
+        return quote
+
+    def _parse_metadata(self, quote):
+        return {
+            "priceIncrement": quote.get("priceIncrement"),
+            "sizeIncrement": quote.get("sizeIncrement"),
+            "minProvideSize": quote.get("minProvideSize"),
+        }
+
+    def get_market_metadata(self, market):
+        """Static market data (increments and minimum size), cached for
+        `metadata_ttl` seconds.
+
+        Args:
+            market (string): the market, e.g. 'BTC/USD'.
+
+        Returns:
+            dict: priceIncrement, sizeIncrement and minProvideSize
+        """
+        return self.metadata_cache.get_or_set(
+            str(market), lambda: self._parse_metadata(self.get_quote(market))
+        )
+
+    def attach_feed(self, feed):
+        """Price orders from a streaming top-of-book instead of REST quotes.
+
+        Args:
+            feed (marketdata.Feed): a started feed
+        """
+        self.feed = feed
+
+    def attach_depth_model(self, model):
+        """Price and size orders from order book depth, see depth.DepthModel.
+
+        Args:
+            model (depth.DepthModel): the model
+        """
+        self.depth = model
+
+    def attach_shared_cache(self, name, backend=None):
+        """Share market metadata and the account snapshot with every process
+        using the same Django cache, see cache.SharedTTLCache.
+
+        Quotes stay in this process's TTLCache: they live about a second,
+        so sharing them would mostly be writes.
+
+        Args:
+            name (str): namespace, e.g. "ftx:<subaccount>"
+            backend (BaseCache, optional): Defaults to django's default cache.
+        """
+        self.metadata_cache = SharedTTLCache(
+            f"{name}:metadata", self.metadata_cache.ttl, backend
+        )
+        self.snapshot.cache = SharedTTLCache(
+            f"{name}:snapshot", self.snapshot.cache.ttl, backend
+        )
+
+    def _get_book_quote(self, market):
+        """A quote from the streaming book, or None if it's missing or stale."""
+        if self.feed is None:
+            return None
+        self.feed.subscribe(str(market))
+        top = self.feed.book.get(str(market))
+        if top is None:
+            logger.debug(f"{market} has no fresh streaming quote, using REST")
+            return None
+        return {**self.get_market_metadata(market), **top}
 
     def spot_is_borrowable(self, market):
         """Check if this spot market has lending (so you can short it).
@@ -73,8 +183,8 @@ class FTXExchange(BaseExchange):
             aggressive (bool, optional): [description]. Defaults to False.
         """
         assert not aggressive, "unsupported policy aggressive"
-        quote = self.get_quote(market)
-        return self._get_spread_midpoint(market, side)
+        quote = self._get_book_quote(market) or self.get_quote(market)
+        return self._get_spread_midpoint(quote, side)
 
     def _get_spread_midpoint(self, quote, side):
         """Compute target price to midpoint of the spread
@@ -112,11 +222,10 @@ class FTXExchange(BaseExchange):
             return target
 
     def get_tick_size(self, market):
-        quote = self.get_quote(market)
-        return quote.get("sizeIncrement")
+        return self.get_market_metadata(market).get("sizeIncrement")
 
     def _get_position(self, market: str):
-        """[summary]
+        """Current spot position, read from the per-cycle account snapshot.
 
         Args:
             market ([type]): [description]
@@ -124,7 +233,7 @@ class FTXExchange(BaseExchange):
         Returns:
             [type]: [description]
         """
-        spot_balances = self.client.get_balances()  # spot
+        spot_balances = self.snapshot.balances()  # spot
         symbol = self._parse_symbol(market.name)
         positions = list(filter(lambda x: x["coin"] == symbol, spot_balances))
         if len(positions) == 1:
@@ -137,24 +246,51 @@ class FTXExchange(BaseExchange):
         else:
             raise IndexError(f"more than one position for {market} in {positions}")
 
-    def set_position(self, market: str, target_position: float):
+    def set_position(self, market: str, target_position: float, slicer=None, band=None):
         """[summary]
 
         Args:
             market ([type]): [description]
             target_position ([type]): [description]
+            slicer (SlicingScheduler, optional): large deltas are queued on
+                this as a ParentOrder instead of being sent at once.
+            band (bands.NoTradeBand, optional): small deltas are not traded.
+
+        Returns:
+            dict: the placed order, or None if no order was sent.
+                ParentOrder if the delta was queued on the slicer.
         """
 
         # TODO Need to consider if you can enter a short position on this security.
         current_position = self._get_position(market)
 
+        if band is not None:
+            quote = self.get_quote(market)
+            target_position = band.apply(
+                market,
+                current_position,
+                target_position,
+                (quote["bid"] + quote["ask"]) / 2,
+            )
+            if target_position == current_position:
+                # the position is kept, so an order left resting by an
+                # earlier cycle would only move it: cancel it
+                if self.testmode == False:
+                    self._amend_open_order(
+                        market, self.BUY, 0.0, None, self.get_tick_size(market)
+                    )
+                return None
+
         delta = target_position - current_position
 
+        side = self.BUY
         if delta < 0:
             delta = abs(delta)
-            self._place_order(market, self.SELL, delta)
-        else:
-            self._place_order(market, self.BUY, delta)
+            side = self.SELL
+
+        if slicer is not None and slicer.should_slice(self, market, delta):
+            return slicer.submit(self, market, side, delta)
+        return self._place_order(market, side, delta)
 
         # TODO
         # log whatgever you do.
@@ -168,38 +304,180 @@ class FTXExchange(BaseExchange):
             units ([type]): [description]
         """
 
-        ### TODO Also need to check open orders....
-
-        target_price = self.get_target_price(market, side)
+        pricing = None
+        if self.depth is not None:
+            pricing = self.depth.plan(
+                market, side, units, self.get_market_metadata(market)
+            )
+            logger.info(f"{market} {side} {units} priced from depth: {pricing}")
+        if pricing is not None:
+            units, target_price = pricing.units, pricing.price
+        else:
+            target_price = self.get_target_price(market, side)
+        sweep = pricing is not None and pricing.style == depth.SWEEP
         consideration = target_price * units
 
         tick = self.get_tick_size(market)
 
-        print(
-            f"""endpoint="executor",
+        print(f"""endpoint="executor",
             testmode="{self.testmode}"", 
             market="{market}",
             side="{side}",
             consideration="{consideration}",
             target_price="{target_price}",
-            units="{units}" """
-        )
+            units="{units}" """)
 
         if units < tick:
             print(f"{market} order size {units} is less than the tick size {tick}")
+            if self.testmode == False:
+                self._amend_open_order(market, side, 0.0, None, tick)
 
         elif self.testmode == False:
             try:
-                print(
-                    self.client.place_order(
+                order = None
+                if not sweep:
+                    order = self._amend_open_order(
+                        market, side, units, target_price, tick
+                    )
+                else:
+                    self._amend_open_order(market, side, 0.0, None, tick)
+                if order is None:
+                    order = self.client.place_order(
                         market=str(market),
                         side=side,
                         price=target_price,
                         size=units,
                         type="limit",
-                        post_only=True,
+                        ioc=sweep,
+                        post_only=not sweep,
                     )
-                )
+                print(order)
+                return order
             except Exception as e:
                 print("Exception!!")
                 raise e
+
+    def _amend_open_order(self, market, side, units, target_price, tick):
+        """Reuse an order already resting on market instead of stacking
+        another one on top of it.
+
+        Open orders come from the account snapshot, so they're downloaded
+        once per cycle. Orders on the other side, and any beyond the first
+        on this side, are cancelled. The first is left alone if it already
+        has the right price and size, otherwise it is amended. ftx amends
+        either the price or the size, so an order needing both is cancelled
+        and placed again.
+
+        Args:
+            units (float): the size wanted, 0 to cancel everything
+            target_price (float): the price wanted
+            tick (float): size increment, smaller size differences are ignored
+
+        Returns:
+            dict: the resting order (possibly amended), or None if there
+                isn't one and a new order should be placed.
+        """
+        orders = self.snapshot.open_orders(market)
+        if not orders:
+            return None
+        resting = [o for o in orders if o["side"] == side and units >= tick]
+        for order in [o for o in orders if o not in resting[:1]]:
+            logger.info(f"cancelling open order {order['id']} on {market}")
+            self.client.cancel_order(order["id"])
+
+        kept = None
+        if resting:
+            order = resting[0]
+            changes = {}
+            if order["price"] != target_price:
+                changes["price"] = target_price
+            remaining = order.get("remainingSize", order["size"])
+            if abs(remaining - units) >= tick:
+                changes["size"] = units
+            if not changes:
+                logger.info(f"open order {order['id']} on {market} is already right")
+                if len(orders) == 1:
+                    return order  # nothing changed
+                kept = order
+            elif len(changes) > 1:
+                logger.info(
+                    f"replacing open order {order['id']} on {market}: {changes}"
+                )
+                self.client.cancel_order(order["id"])
+            else:
+                logger.info(f"amending open order {order['id']} on {market}: {changes}")
+                kept = self.client.modify_order(
+                    existing_order_id=order["id"], **changes
+                )
+        # the snapshot may be shared with other processes (attach_shared_cache),
+        # which mustn't go on reading the old ids
+        self.snapshot.invalidate("open_orders")
+        return kept
+
+    def reprice_open_orders(
+        self,
+        order_ids,
+        timeout=30.0,
+        interval=5.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        exclude_markets=(),
+    ):
+        """Chase this cycle's resting post-only orders as the market moves.
+
+        Every `interval` seconds, until they have all filled or `timeout`
+        seconds have passed, those of `order_ids` still open whose price is
+        no longer the target price are amended to it. ftx amends by
+        replacing, so an amended order is followed under its new id. Other
+        open orders (other markets', manual ones, a SlicingScheduler's
+        children) are left alone, as is an order that can't be amended,
+        e.g. because it filled in the meantime. Nothing is amended in
+        testmode.
+
+        Args:
+            order_ids (iterable): the orders placed or amended this cycle
+            exclude_markets (iterable, optional): markets not to touch, e.g.
+                those a SlicingScheduler is working
+
+        Returns:
+            int: the number of amendments made
+        """
+        if self.testmode:
+            logger.info("testmode, not repricing open orders")
+            return 0
+        exclude_markets = {str(market) for market in exclude_markets}
+        tracked = set(order_ids)
+        deadline = clock() + timeout
+        amended = 0
+        while tracked:
+            self.snapshot.invalidate("open_orders")
+            orders = [
+                o
+                for o in self.snapshot.open_orders()
+                if o["id"] in tracked
+                and o.get("postOnly")
+                and o["market"] not in exclude_markets
+            ]
+            tracked = {o["id"] for o in orders}  # the others are done with
+            for order in orders:
+                price = self.get_target_price(order["market"], order["side"])
+                if price == order["price"]:
+                    continue
+                tracked.discard(order["id"])
+                try:
+                    new = self.client.modify_order(
+                        existing_order_id=order["id"], price=price
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"not repricing open order {order['id']} on {order['market']}: {e}"
+                    )
+                    continue
+                tracked.add(new["id"])
+                amended += 1
+            if not tracked or clock() + interval > deadline:
+                break
+            sleep(interval)
+        self.snapshot.invalidate("open_orders")
+        logger.info(f"repriced {amended} open orders")
+        return amended
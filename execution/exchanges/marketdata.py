@@ -0,0 +1,166 @@
+"""Streaming market data.
+
+A Feed writes best bid/ask updates into a TopOfBook, which the exchange
+adapter reads when pricing orders instead of making a REST round trip.
+Entries older than `max_age` seconds are treated as missing, so the
+adapter falls back to REST whenever the feed is slow or disconnected.
+"""
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger("execution")
+
+
+class TopOfBook(object):
+    """Thread-safe best bid and ask for every subscribed market."""
+
+    def __init__(self, max_age: float = 2.0, clock=time.time) -> None:
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._quotes = {}
+
+    def update(self, market: str, bid: float, ask: float, time: float = None):
+        """Record a new best bid/ask.
+
+        Args:
+            market (str): the market, e.g. 'BTC/USD'
+            bid (float): best bid
+            ask (float): best ask
+            time (float, optional): exchange timestamp in seconds. Defaults to now.
+        """
+        with self._lock:
+            self._quotes[market] = {
+                "bid": bid,
+                "ask": ask,
+                "time": self.clock() if time is None else time,
+            }
+
+    def get(self, market: str):
+        """The latest quote for market, or None if there isn't a fresh one.
+
+        Returns:
+            dict: bid, ask and time
+        """
+        with self._lock:
+            quote = self._quotes.get(market)
+        if quote is None or self.clock() - quote["time"] > self.max_age:
+            return None
+        return dict(quote)
+
+    def markets(self):
+        with self._lock:
+            return list(self._quotes)
+
+
+class Feed(object):
+    """A source of top-of-book updates for a set of markets."""
+
+    def __init__(self, book: TopOfBook, markets=()) -> None:
+        self.book = book
+        self.markets = set(markets)
+
+    def subscribe(self, market: str):
+        self.markets.add(market)
+
+    def is_subscribed(self, market: str):
+        return market in self.markets
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class FakeFeed(Feed):
+    """A local feed for tests and offline runs.
+
+    Ticks are written to the book synchronously by publish() or replay().
+    """
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, market: str, bid: float, ask: float, time: float = None):
+        if self.is_subscribed(market):
+            self.book.update(market, bid, ask, time)
+
+    def replay(self, ticks):
+        """Publish a sequence of recorded (market, bid, ask, time) ticks."""
+        for market, bid, ask, time in ticks:
+            self.publish(market, bid, ask, time)
+
+
+class FTXTickerFeed(Feed):
+    """FTX websocket 'ticker' channel, run in a background thread.
+
+    Needs the optional websocket-client package.
+    """
+
+    URL = "wss://ftx.com/ws/"
+
+    def __init__(self, book: TopOfBook, markets=(), url=URL) -> None:
+        super(FTXTickerFeed, self).__init__(book, markets)
+        self.url = url
+        self._ws = None
+        self._thread = None
+
+    def _send_subscribe(self, market):
+        self._ws.send(
+            json.dumps({"op": "subscribe", "channel": "ticker", "market": market})
+        )
+
+    def subscribe(self, market: str):
+        if market in self.markets:
+            return
+        super(FTXTickerFeed, self).subscribe(market)
+        if self._ws is not None and self._ws.sock and self._ws.sock.connected:
+            self._send_subscribe(market)
+
+    def _on_open(self, ws):
+        logger.info(f"ftx ticker feed connected, {len(self.markets)} markets")
+        for market in list(self.markets):
+            self._send_subscribe(market)
+
+    def _on_message(self, ws, message):
+        message = json.loads(message)
+        if message.get("channel") != "ticker" or message.get("type") != "update":
+            return
+        data = message["data"]
+        self.book.update(message["market"], data["bid"], data["ask"], data["time"])
+
+    def _on_error(self, ws, error):
+        logger.error(f"ftx ticker feed error: {error}")
+
+    def start(self):
+        import websocket
+
+        self._ws = websocket.WebSocketApp(
+            self.url,
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_error=self._on_error,
+        )
+
+        def run_forever():
+            while True:
+                ws = self._ws
+                if ws is None:
+                    break
+                ws.run_forever(ping_interval=15)
+                time.sleep(1)  # reconnect
+
+        self._thread = threading.Thread(target=run_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            ws.close()
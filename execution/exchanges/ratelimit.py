@@ -0,0 +1,68 @@
+import threading
+import time
+
+from wagmi import tracing
+
+
+class RateLimiter(object):
+    """Token bucket shared by every thread talking to one exchange.
+
+    Allows bursts of up to `rate` calls, refilled at `rate` calls every
+    `per` seconds. acquire() blocks until a call is allowed.
+    """
+
+    def __init__(
+        self, rate: float, per: float = 1.0, clock=time.monotonic, sleep=time.sleep
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.per = per
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = rate
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(
+                    self.rate,
+                    self._tokens + (now - self._updated_at) * self.rate / self.per,
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.per / self.rate
+            self.sleep(wait)
+
+
+class RateLimitedClient(object):
+    """Wraps an exchange client so every API call first takes a token
+    from a RateLimiter.
+
+    Time spent waiting for a token and in each call are traced, as the
+    "exchange.rate_limit_wait" and "exchange.<method>" spans.
+
+    Attributes that aren't callable are passed through untouched.
+    """
+
+    def __init__(self, client, limiter: RateLimiter) -> None:
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with tracing.span("exchange.rate_limit_wait"):
+                self._limiter.acquire()
+            with tracing.span(f"exchange.{name}"):
+                return attr(*args, **kwargs)
+
+        return call
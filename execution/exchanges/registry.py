@@ -0,0 +1,85 @@
+"""Process-wide registry of exchange adapters.
+
+Adapters are created once per (exchange name, subaccount) and then shared
+by every waitress thread and scheduler job in the process, so their HTTP
+keep-alive connection pools, caches and rate limiters are reused rather
+than rebuilt (with a fresh TLS handshake) for every order.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+
+from execution.exchanges import depth, ftx, marketdata
+
+logger = logging.getLogger("execution")
+
+# names _create_exchange knows how to build
+SUPPORTED = ("ftx",)
+
+_lock = threading.Lock()
+_exchanges = {}
+
+
+def _create_exchange(name, subaccount):
+    if name == "ftx":
+        logger.debug(f"Creating exchange ftx, subaccount={subaccount}")
+        exchange = ftx.FTXExchange(
+            subaccount=subaccount,
+            testmode=settings.WAGMI_ORDER_TESTMODE,
+            api_key=settings.WAGMI_FTX_API_KEY,
+            api_secret=settings.WAGMI_FTX_API_SECRET,
+            snapshot_max_age=settings.WAGMI_ACCOUNT_SNAPSHOT_MAX_AGE,
+            metadata_ttl=settings.WAGMI_MARKET_METADATA_TTL,
+            quote_ttl=settings.WAGMI_QUOTE_TTL,
+            rate_limit=settings.WAGMI_FTX_RATE_LIMIT,
+            pool_size=settings.WAGMI_ORDER_WORKERS,
+            base_url=settings.WAGMI_FTX_BASE_URL,
+        )
+        if settings.WAGMI_SHARED_EXCHANGE_CACHE:
+            exchange.attach_shared_cache(f"ftx:{subaccount}")
+        if settings.WAGMI_MARKET_DATA_FEED == "ftx":
+            feed = marketdata.FTXTickerFeed(
+                marketdata.TopOfBook(max_age=settings.WAGMI_MARKET_DATA_MAX_AGE)
+            )
+            feed.start()
+            exchange.attach_feed(feed)
+        if settings.WAGMI_DEPTH_MODEL:
+            exchange.attach_depth_model(
+                depth.DepthModel(
+                    exchange.client,
+                    ttl=settings.WAGMI_ORDERBOOK_TTL,
+                    sweep_bps=settings.WAGMI_SWEEP_MAX_BPS,
+                    max_slippage_bps=settings.WAGMI_MAX_SLIPPAGE_BPS,
+                )
+            )
+        return exchange
+    return None
+
+
+def get_exchange(name, subaccount=None):
+    """Get the shared adapter for an exchange, creating it on first use.
+
+    Args:
+        name (str): exchange name, e.g. 'ftx'
+        subaccount (str, optional): Defaults to settings.WAGMI_FTX_SUB_ACCOUNT.
+
+    Returns:
+        BaseExchange: the adapter, or None if the exchange isn't supported.
+    """
+    if name not in SUPPORTED:
+        return None  # not cached: names can come from a request
+    if subaccount is None:
+        subaccount = settings.WAGMI_FTX_SUB_ACCOUNT
+    key = (name, subaccount)
+    with _lock:
+        if key not in _exchanges:
+            _exchanges[key] = _create_exchange(name, subaccount)
+        return _exchanges[key]
+
+
+def clear():
+    """Forget every adapter, e.g. after credentials change or in tests."""
+    with _lock:
+        _exchanges.clear()
@@ -0,0 +1,65 @@
+import logging
+import time
+
+from execution.exchanges.cache import TTLCache
+
+logger = logging.getLogger("execution")
+
+
+class AccountSnapshot(object):
+    """Balances, positions and open orders of an exchange account.
+
+    Each part is fetched lazily on first use and then served from memory
+    for the rest of the execution cycle, so a rebalance over many markets
+    downloads the account once rather than once per market.
+
+    A part is refetched when it is older than `max_age` seconds, or after
+    it has been invalidated (e.g. once an order is placed or filled).
+    """
+
+    PARTS = ("balances", "positions", "open_orders")
+
+    def __init__(self, client, max_age: float = 30.0, clock=time.monotonic) -> None:
+        self._fetchers = {
+            "balances": client.get_balances,
+            "positions": client.get_positions,
+            "open_orders": client.get_open_orders,
+        }
+        self.cache = TTLCache(ttl=max_age, clock=clock)
+
+    def _fetch(self, part):
+        logger.debug(f"account snapshot fetching {part}")
+        return self._fetchers[part]()
+
+    def _get(self, part):
+        return self.cache.get_or_set(part, lambda: self._fetch(part))
+
+    def balances(self):
+        """Spot balances, as returned by FtxClient.get_balances()"""
+        return self._get("balances")
+
+    def positions(self):
+        """Futures positions, as returned by FtxClient.get_positions()"""
+        return self._get("positions")
+
+    def open_orders(self, market=None):
+        """Open orders, optionally only those for `market`"""
+        orders = self._get("open_orders")
+        if market is None:
+            return orders
+        return [order for order in orders if order["market"] == str(market)]
+
+    def invalidate(self, *parts):
+        """Drop cached parts so they are refetched on next use.
+
+        Args:
+            parts (str): any of PARTS. Defaults to all of them.
+        """
+        for part in parts or self.PARTS:
+            if part not in self.PARTS:
+                raise ValueError(f"Unknown snapshot part: {part}")
+            self.cache.invalidate(part)
+
+    def refresh(self):
+        """Start a new execution cycle: everything is refetched on next use."""
+        self.invalidate()
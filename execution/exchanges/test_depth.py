@@ -0,0 +1,126 @@
+import math
+
+import pytest
+from .depth import MIDPOINT, PASSIVE, SWEEP, DepthModel, OrderBook
+from .ftx import FTXExchange
+from .snapshot import AccountSnapshot
+from .test_ftxexchange import FakeClient
+
+# recorded BTC/USD books, trimmed to a few levels
+BTC_BOOK = {
+    "bids": [[49480.0, 0.5], [49479.0, 1.0], [49470.0, 2.0], [49400.0, 5.0]],
+    "asks": [[49484.0, 0.3], [49486.0, 1.2], [49500.0, 2.0], [49600.0, 5.0]],
+}
+TIGHT_BOOK = {
+    "bids": [[49483.0, 0.5], [49482.0, 1.0]],
+    "asks": [[49484.0, 0.01], [49490.0, 1.0]],
+}
+METADATA = {"priceIncrement": 1.0, "sizeIncrement": 0.001}
+
+
+class FakeBookClient(FakeClient):
+    def __init__(self, book=BTC_BOOK):
+        super(FakeBookClient, self).__init__()
+        self.book = book
+        self.book_calls = 0
+        self.placed = []
+        self.cancelled = []
+
+    def get_orderbook(self, market, depth=None):
+        self.book_calls += 1
+        return self.book
+
+    def place_order(self, **kwargs):
+        self.placed.append(kwargs)
+        return kwargs
+
+    def cancel_order(self, order_id):
+        self.cancelled.append(order_id)
+
+
+class TestOrderBook:
+    def test_slippage(self) -> None:
+        book = OrderBook.from_ftx(BTC_BOOK)
+        assert book.mid == 49482.0
+        # 0.3 @ 49484 and 0.7 @ 49486
+        assert book.slippage("buy", 1.0) == pytest.approx(3.4 / 49482)
+        assert book.slippage("sell", 0.5) == pytest.approx(2 / 49482)
+        assert book.slippage("buy", 100.0) == math.inf
+
+    def test_capacity_is_within_max_slippage(self) -> None:
+        book = OrderBook.from_ftx(BTC_BOOK)
+        capacity = book.capacity("buy", 0.0005)
+        assert 3.5 < capacity < 8.5
+        assert book.slippage("buy", capacity) == pytest.approx(0.0005)
+        capacity = book.capacity("sell", 0.0005)
+        assert book.slippage("sell", capacity) == pytest.approx(0.0005)
+
+
+class TestDepthModel:
+    def test_small_orders_sweep(self) -> None:
+        model = DepthModel(FakeBookClient())
+        pricing = model.plan("BTC/USD", "buy", 1.0, METADATA)
+        assert pricing.style == SWEEP
+        assert pricing.price == 49486.0
+        assert pricing.units == 1.0
+
+    def test_larger_orders_post_at_midpoint(self) -> None:
+        model = DepthModel(FakeBookClient())
+        pricing = model.plan("BTC/USD", "buy", 3.0, METADATA)
+        assert pricing.style == MIDPOINT
+        assert pricing.price == 49482.0
+        assert pricing.slippage > 0.0002
+
+    def test_size_is_capped(self) -> None:
+        model = DepthModel(FakeBookClient(), max_slippage_bps=5.0)
+        pricing = model.plan("BTC/USD", "buy", 10.0, METADATA)
+        assert pricing.units == pytest.approx(3.984)
+        assert pricing.slippage <= 0.0005
+
+    def test_one_tick_spread_is_passive(self) -> None:
+        model = DepthModel(FakeBookClient(TIGHT_BOOK), sweep_bps=0.0)
+        pricing = model.plan("BTC/USD", "sell", 1.0, METADATA)
+        assert pricing.style == PASSIVE
+        assert pricing.price == 49484.0
+
+    def test_books_are_cached(self) -> None:
+        client = FakeBookClient()
+        model = DepthModel(client)
+        model.plan("BTC/USD", "buy", 1.0, METADATA)
+        model.plan("BTC/USD", "sell", 1.0, METADATA)
+        assert client.book_calls == 1
+
+    def test_empty_side_isnt_planned(self) -> None:
+        model = DepthModel(FakeBookClient({"bids": BTC_BOOK["bids"], "asks": []}))
+        assert model.plan("BTC/USD", "buy", 1.0, METADATA) is None
+        assert model.plan("BTC/USD", "sell", 1.0, METADATA) is None
+
+
+class TestDepthPricedOrders:
+    def test_empty_book_falls_back_to_the_quote(self) -> None:
+        ftx = FTXExchange(
+            subaccount="pytest", testmode=False, api_key="none", api_secret="none"
+        )
+        ftx.client = FakeBookClient({"bids": [], "asks": []})
+        ftx.snapshot = AccountSnapshot(ftx.client)
+        ftx.attach_depth_model(DepthModel(ftx.client))
+
+        order = ftx._place_order("BTC/USD", ftx.BUY, 1.0)
+
+        assert order["price"] == ftx.get_target_price("BTC/USD", ftx.BUY)
+        assert order["size"] == 1.0 and order["post_only"]
+
+    def test_sweep_is_immediate_or_cancel(self) -> None:
+        ftx = FTXExchange(
+            subaccount="pytest", testmode=False, api_key="none", api_secret="none"
+        )
+        ftx.client = FakeBookClient()
+        ftx.snapshot = AccountSnapshot(ftx.client)
+        ftx.attach_depth_model(DepthModel(ftx.client))
+
+        order = ftx._place_order("BTC/USD", ftx.BUY, 1.0)
+
+        assert order["price"] == 49486.0
+        assert order["ioc"] and not order["post_only"]
+        # a resting post-only order would be left behind, so it's cancelled
+        assert ftx.client.cancelled == [7]
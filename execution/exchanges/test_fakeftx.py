@@ -0,0 +1,99 @@
+import ftx
+import pytest
+from .fakeftx import FakeFTXError, FakeFTXServer, FakeFTXState
+from .ftx import FTXExchange
+from sizing.models import Security
+
+
+@pytest.fixture
+def server():
+    with FakeFTXServer() as server:
+        yield server
+
+
+def client_for(server):
+    return ftx.FtxClient(base_url=server.url, api_key="key", api_secret="secret")
+
+
+class TestFakeFTXState:
+    def test_crossing_order_fills_at_touch(self) -> None:
+        state = FakeFTXState()
+        order = state.place_order("BTC/USD", "buy", 49500.0, 0.1)
+
+        assert order["status"] == "closed"
+        assert order["avgFillPrice"] == 49484.0
+        assert state.balances["BTC"] == pytest.approx(0.1)
+        assert state.balances["USD"] == pytest.approx(100000.0 - 4948.4 * (1 + 0.0007))
+
+    def test_post_only_rests_until_market_moves(self) -> None:
+        state = FakeFTXState()
+        assert (
+            state.place_order("BTC/USD", "buy", 49500.0, 0.1, postOnly=True)["status"]
+            == "closed"
+        )  # would have crossed
+        order = state.place_order("BTC/USD", "buy", 49482.0, 0.1, postOnly=True)
+        assert state.get_open_orders("BTC/USD")[0]["id"] == order["id"]
+
+        state.set_quote("BTC/USD", 49470.0, 49481.0)
+
+        assert state.get_open_orders() == []
+        fill = state.get_fills()[0]
+        assert (fill["price"], fill["liquidity"]) == (49482.0, "maker")
+
+    def test_modify_replaces_order(self) -> None:
+        state = FakeFTXState()
+        order = state.place_order("BTC/USD", "buy", 49000.0, 0.1, postOnly=True)
+        amended = state.modify_order(order["id"], price=49100.0)
+
+        assert amended["id"] != order["id"]
+        assert amended["size"] == 0.1 and amended["postOnly"]
+        assert state.get_order_status(order["id"])["status"] == "closed"
+        with pytest.raises(FakeFTXError, match="already closed"):
+            state.cancel_order(order["id"])
+
+
+class TestFakeFTXServer:
+    def test_ftx_client_round_trip(self, server) -> None:
+        client = client_for(server)
+
+        order = client.place_order("BTC/USD", "sell", 49470.0, 0.2)
+        assert order["status"] == "closed"
+        assert client.get_market("BTC/USD")["bid"] == 49480.0
+        assert client.get_orderbook("BTC/USD", 3)["asks"][2] == [49486.0, 1.0]
+        assert {b["coin"]: b["total"] for b in client.get_balances()}["BTC"] == -0.2
+        assert [f["orderId"] for f in client.get_fills()] == [order["id"]]
+        with pytest.raises(Exception, match="No such market: SOL/USD"):
+            client.get_market("SOL/USD")
+
+    def test_rate_limit_and_errors(self) -> None:
+        with FakeFTXServer(rate_limit=2) as server:
+            client = client_for(server)
+            client.get_market("BTC/USD")
+            client.get_market("BTC/USD")
+            with pytest.raises(Exception, match="Please slow down"):
+                client.get_market("BTC/USD")
+            assert server.stats["throttled"] == 1
+
+        with FakeFTXServer(error_rate=1.0) as server:
+            with pytest.raises(Exception, match="Internal server error"):
+                client_for(server).get_balances()
+
+    def test_exchange_amends_instead_of_stacking(self, server) -> None:
+        exchange = FTXExchange(
+            subaccount="pytest",
+            testmode=False,
+            api_key="key",
+            api_secret="secret",
+            base_url=server.url,
+        )
+        market = Security(name="ETH/USD")
+
+        first = exchange.set_position(market, 1.0)
+        server.state.set_quote("ETH/USD", 4010.0, 4011.0)
+        exchange.snapshot.refresh()
+        exchange.quote_cache.invalidate()
+        second = exchange.set_position(market, 1.0)
+
+        assert first["status"] == "open"
+        assert second["price"] == 4010.0 and second["id"] != first["id"]
+        assert [o["id"] for o in server.state.get_open_orders()] == [second["id"]]
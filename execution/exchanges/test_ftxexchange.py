@@ -1,6 +1,40 @@
 import pytest
 import json
+from types import SimpleNamespace
+from unittest import mock
 from .ftx import FTXExchange
+from django.core.cache.backends.filebased import FileBasedCache
+from .cache import SharedTTLCache, TTLCache
+from .snapshot import AccountSnapshot
+from wagmi import tracing
+
+
+class FakeClient:
+    """Counts calls to the account endpoints used by AccountSnapshot"""
+
+    def __init__(self):
+        self.calls = {"balances": 0, "positions": 0, "open_orders": 0}
+        self.market_calls = 0
+
+    def get_balances(self):
+        self.calls["balances"] += 1
+        return [{"coin": "BTC", "total": 0.5}, {"coin": "ETH", "total": 2.0}]
+
+    def get_positions(self):
+        self.calls["positions"] += 1
+        return []
+
+    def get_open_orders(self):
+        self.calls["open_orders"] += 1
+        return [
+            {"id": 7, "market": "BTC/USD", "side": "buy", "size": 0.1, "price": 1.0}
+        ]
+
+    def get_market(self, market):
+        self.market_calls += 1
+        return json.loads(
+            '{"bid": 49480.0, "ask": 49484.0, "priceIncrement": 1.0, "sizeIncrement": 0.0001, "price": 49484.0}'
+        )
 
 
 class TestFTXExchange:
@@ -45,3 +79,299 @@ class TestFTXExchange:
         )
         with pytest.raises(NotImplementedError, match="Unsupported side: sellshort"):
             ftx._get_spread_midpoint(quote, "sellshort")
+
+
+class TestAccountSnapshot:
+    def test_balances_fetched_once_per_cycle(self) -> None:
+        ftx = FTXExchange(
+            subaccount="pytest", testmode=True, api_key="none", api_secret="none"
+        )
+        client = FakeClient()
+        ftx.snapshot = AccountSnapshot(client)
+
+        assert ftx._get_position(SimpleNamespace(name="BTC/USD")) == 0.5
+        assert ftx._get_position(SimpleNamespace(name="ETH/USD")) == 2.0
+        assert ftx._get_position(SimpleNamespace(name="SOL/USD")) == 0.0
+        assert client.calls["balances"] == 1
+
+        ftx.snapshot.refresh()
+        ftx._get_position(SimpleNamespace(name="BTC/USD"))
+        assert client.calls["balances"] == 2
+
+    def test_staleness_bound(self) -> None:
+        now = [0.0]
+        client = FakeClient()
+        snapshot = AccountSnapshot(client, max_age=10.0, clock=lambda: now[0])
+
+        snapshot.balances()
+        now[0] = 10.0
+        snapshot.balances()
+        assert client.calls["balances"] == 1
+        now[0] = 10.1
+        snapshot.balances()
+        assert client.calls["balances"] == 2
+
+    def test_invalidate_single_part(self) -> None:
+        client = FakeClient()
+        snapshot = AccountSnapshot(client)
+
+        snapshot.balances()
+        assert len(snapshot.open_orders("BTC/USD")) == 1
+        assert snapshot.open_orders("ETH/USD") == []
+        snapshot.invalidate("open_orders")
+        snapshot.balances()
+        snapshot.open_orders()
+        assert client.calls == {"balances": 1, "positions": 0, "open_orders": 2}
+
+        with pytest.raises(ValueError, match="Unknown snapshot part: fills"):
+            snapshot.invalidate("fills")
+
+
+class TestMarketCaches:
+    def test_ttl_cache_expiry_and_stats(self) -> None:
+        now = [0.0]
+        cache = TTLCache(ttl=5.0, clock=lambda: now[0])
+
+        assert cache.get_or_set("BTC/USD", lambda: 1) == 1
+        assert cache.get_or_set("BTC/USD", lambda: 2) == 1
+        now[0] = 6.0
+        assert cache.get_or_set("BTC/USD", lambda: 3) == 3
+        assert cache.stats == {"hits": 1, "misses": 2, "size": 1}
+
+    def test_place_order_quotes_once(self) -> None:
+        ftx = FTXExchange(
+            subaccount="pytest", testmode=True, api_key="none", api_secret="none"
+        )
+        ftx.client = FakeClient()
+
+        assert ftx.get_target_price("BTC/USD", ftx.BUY) == 49482
+        assert ftx.get_tick_size("BTC/USD") == 0.0001
+        assert ftx.client.market_calls == 1
+
+    def test_metadata_outlives_quotes(self) -> None:
+        ftx = FTXExchange(
+            subaccount="pytest",
+            testmode=True,
+            api_key="none",
+            api_secret="none",
+            quote_ttl=-1.0,
+        )
+        ftx.client = FakeClient()
+
+        ftx.get_quote("BTC/USD")
+        ftx.get_quote("BTC/USD")
+        assert ftx.get_tick_size("BTC/USD") == 0.0001
+        assert ftx.client.market_calls == 2
+        assert ftx.metadata_cache.stats["hits"] == 1
+
+    def test_shared_cache_spans_processes(self, tmp_path, monkeypatch) -> None:
+        # see each other's invalidations at once
+        monkeypatch.setattr("execution.exchanges.cache.GENERATION_TTL", 0.0)
+        # two adapters over one file cache stand in for two processes
+        backend = FileBasedCache(str(tmp_path), {})
+        web, scheduler = [
+            FTXExchange(
+                subaccount="pytest", testmode=True, api_key="none", api_secret="none"
+            )
+            for _ in range(2)
+        ]
+        for ftx in (web, scheduler):
+            ftx.client = FakeClient()
+            ftx.snapshot = AccountSnapshot(ftx.client)
+            ftx.attach_shared_cache("ftx:pytest", backend)
+
+        assert isinstance(web.quote_cache, TTLCache)  # quotes stay per process
+        assert web.get_tick_size("BTC/USD") == scheduler.get_tick_size("BTC/USD")
+        assert web.snapshot.balances() == scheduler.snapshot.balances()
+        assert web.client.market_calls + scheduler.client.market_calls == 1
+        assert scheduler.client.calls["balances"] == 0
+
+        scheduler.snapshot.refresh()
+        web.snapshot.balances()
+        assert web.client.calls["balances"] == 2
+        assert scheduler.metadata_cache.stats == {"hits": 1, "misses": 0}
+        assert (
+            'wagmi_cache_requests_total{cache="ftx:pytest:metadata",result="hit"}'
+            in tracing.REGISTRY.render()
+        )
+
+    def test_generation_is_reread_once_a_second(self, tmp_path) -> None:
+        now = [0.0]
+        backend = FileBasedCache(str(tmp_path), {})
+        web, scheduler = [
+            SharedTTLCache("ftx:pytest:quote", 60.0, backend, clock=lambda: now[0])
+            for _ in range(2)
+        ]
+        web.set("BTC/USD", 1.0)
+
+        with mock.patch.object(
+            backend, "get_or_set", wraps=backend.get_or_set
+        ) as generation:
+            for _ in range(10):
+                assert web.get("BTC/USD") == 1.0
+        assert generation.call_count == 0  # read when web.set() made the key
+
+        scheduler.invalidate()
+        assert web.get("BTC/USD") == 1.0  # web's generation is still fresh
+        now[0] += 1.5
+        assert web.get("BTC/USD") is None
+
+
+class FakeOrderClient(FakeClient):
+    """Records order placement, amendment and cancellation"""
+
+    def __init__(self, open_orders):
+        super(FakeOrderClient, self).__init__()
+        self.open_orders = open_orders
+        self.placed = []
+        self.modified = []
+        self.cancelled = []
+
+    def get_open_orders(self):
+        self.calls["open_orders"] += 1
+        return self.open_orders
+
+    def place_order(self, **kwargs):
+        self.placed.append(kwargs)
+        return kwargs
+
+    def modify_order(self, existing_order_id, price=None, size=None):
+        # as FtxClient.modify_order
+        assert (price is None) or (size is None), "Must modify price or size of order"
+        changes = {k: v for k, v in (("price", price), ("size", size)) if v is not None}
+        self.modified.append((existing_order_id, changes))
+        return dict(id=existing_order_id, **changes)
+
+    def cancel_order(self, order_id):
+        self.cancelled.append(order_id)
+
+
+def resting(side="buy", price=1.0, size=0.1, market="BTC/USD"):
+    return {
+        "id": 7,
+        "market": market,
+        "side": side,
+        "price": price,
+        "size": size,
+        "remainingSize": size,
+        "postOnly": True,
+    }
+
+
+def live_exchange(client):
+    ftx = FTXExchange(
+        subaccount="pytest", testmode=False, api_key="none", api_secret="none"
+    )
+    ftx.client = client
+    ftx.snapshot = AccountSnapshot(client)
+    return ftx
+
+
+class TestOpenOrders:
+    def test_amends_price_of_resting_order(self) -> None:
+        client = FakeOrderClient([resting(price=1.0)])
+        ftx = live_exchange(client)
+
+        order = ftx._place_order("BTC/USD", ftx.BUY, 0.1)
+
+        assert client.modified == [(7, {"price": 49482})]
+        assert client.placed == [] and order["id"] == 7
+
+    def test_replaces_order_when_price_and_size_change(self) -> None:
+        client = FakeOrderClient([resting(price=1.0, size=0.1)])
+        ftx = live_exchange(client)
+
+        order = ftx._place_order("BTC/USD", ftx.BUY, 0.3)
+
+        assert client.modified == [] and client.cancelled == [7]
+        assert (order["price"], order["size"]) == (49482, 0.3)
+
+    def test_leaves_right_order_alone(self) -> None:
+        client = FakeOrderClient([resting(price=49482.0, size=0.1)])
+        ftx = live_exchange(client)
+
+        assert ftx._place_order("BTC/USD", ftx.BUY, 0.10000001)["id"] == 7
+        assert client.modified == client.placed == client.cancelled == []
+
+    def test_cancels_other_side(self) -> None:
+        client = FakeOrderClient([resting(side="sell")])
+        ftx = live_exchange(client)
+
+        ftx._place_order("BTC/USD", ftx.BUY, 0.1)
+
+        assert client.cancelled == [7]
+        assert len(client.placed) == 1
+
+    def test_open_orders_loaded_once_per_cycle(self) -> None:
+        client = FakeOrderClient([resting(market="ETH/USD")])
+        ftx = live_exchange(client)
+
+        ftx._place_order("BTC/USD", ftx.BUY, 0.1)
+        ftx._place_order("SOL/USD", ftx.BUY, 0.1)
+
+        assert client.calls["open_orders"] == 1
+        assert len(client.placed) == 2
+
+    def test_amending_refreshes_the_shared_snapshot(self, tmp_path) -> None:
+        client = FakeOrderClient([resting(price=1.0)])
+        ftx = live_exchange(client)
+        ftx.attach_shared_cache("ftx:pytest", FileBasedCache(str(tmp_path), {}))
+
+        ftx._place_order("BTC/USD", ftx.BUY, 0.1)
+        ftx._place_order("SOL/USD", ftx.BUY, 0.1)  # no open orders to amend
+
+        assert client.modified == [(7, {"price": 49482.0})]
+        assert client.calls["open_orders"] == 2
+
+    def test_reprice_loop_is_bounded(self) -> None:
+        client = FakeOrderClient([resting(price=1.0)])
+        ftx = live_exchange(client)
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        amended = ftx.reprice_open_orders(
+            [7], timeout=12.0, interval=5.0, clock=lambda: now[0], sleep=sleep
+        )
+
+        # the fake order never fills, so it's repriced at 0s, 5s and 10s
+        assert amended == 3
+        assert now[0] == 10.0
+        client.open_orders = []
+        assert ftx.reprice_open_orders([7], timeout=12.0, sleep=sleep) == 0
+
+    def test_reprice_only_this_cycles_orders(self) -> None:
+        manual = dict(resting(market="ETH/USD"), id=8)
+        sliced = dict(resting(market="SOL/USD"), id=9)
+        client = FakeOrderClient([resting(price=1.0), manual, sliced])
+        ftx = live_exchange(client)
+
+        amended = ftx.reprice_open_orders(
+            [7, 9], timeout=0.0, exclude_markets=["SOL/USD"]
+        )
+
+        assert amended == 1
+        assert [order_id for order_id, _ in client.modified] == [7]
+
+    def test_reprice_skips_orders_it_cant_amend(self) -> None:
+        client = FakeOrderClient([resting(price=1.0), dict(resting(), id=8)])
+        ftx = live_exchange(client)
+        modify_order = client.modify_order
+
+        def filled_meanwhile(existing_order_id, **changes):
+            if existing_order_id == 7:
+                raise Exception("Order already closed")
+            return modify_order(existing_order_id, **changes)
+
+        client.modify_order = filled_meanwhile
+        assert ftx.reprice_open_orders([7, 8], timeout=0.0) == 1
+        assert [order_id for order_id, _ in client.modified] == [8]
+
+    def test_reprice_does_nothing_in_testmode(self) -> None:
+        client = FakeOrderClient([resting(price=1.0)])
+        ftx = live_exchange(client)
+        ftx.testmode = True
+
+        assert ftx.reprice_open_orders([7], timeout=12.0, sleep=lambda s: None) == 0
+        assert client.modified == []
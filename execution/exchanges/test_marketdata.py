@@ -0,0 +1,58 @@
+import pytest
+from .ftx import FTXExchange
+from .marketdata import FakeFeed, TopOfBook
+from .test_ftxexchange import FakeClient
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+@pytest.fixture
+def feed(clock):
+    return FakeFeed(TopOfBook(max_age=2.0, clock=lambda: clock[0]), ["BTC/USD"])
+
+
+@pytest.fixture
+def exchange(feed):
+    ftx = FTXExchange(
+        subaccount="pytest", testmode=True, api_key="none", api_secret="none"
+    )
+    ftx.client = FakeClient()
+    ftx.attach_feed(feed)
+    return ftx
+
+
+class TestTopOfBook:
+    def test_stale_quotes_are_missing(self, clock, feed) -> None:
+        feed.replay([("BTC/USD", 49480.0, 49484.0, 999.0)])
+        assert feed.book.get("BTC/USD")["bid"] == 49480.0
+        clock[0] = 1001.5
+        assert feed.book.get("BTC/USD") is None
+        assert feed.book.get("ETH/USD") is None
+
+    def test_unsubscribed_markets_are_ignored(self, feed) -> None:
+        feed.publish("ETH/USD", 4000.0, 4001.0)
+        assert feed.book.markets() == []
+
+
+class TestStreamingPricing:
+    def test_prices_from_book(self, feed, exchange) -> None:
+        exchange.get_tick_size("BTC/USD")  # warm the metadata cache
+        feed.publish("BTC/USD", 49490.0, 49494.0)
+
+        assert exchange.get_target_price("BTC/USD", exchange.BUY) == 49492
+        assert exchange.get_target_price("BTC/USD", exchange.SELL) == 49492
+        assert exchange.client.market_calls == 1
+
+    def test_falls_back_to_rest_when_stale(self, clock, feed, exchange) -> None:
+        feed.publish("BTC/USD", 49490.0, 49494.0)
+        clock[0] += 5
+
+        assert exchange.get_target_price("BTC/USD", exchange.BUY) == 49482
+
+    def test_subscribes_on_first_use(self, feed, exchange) -> None:
+        assert exchange.get_target_price("ETH/USD", exchange.BUY) == 49482
+        assert feed.is_subscribed("ETH/USD")
@@ -5,17 +5,38 @@ from django.conf import settings
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django_apscheduler.jobstores import DjangoJobStore
 from django_apscheduler.models import DjangoJobExecution
 from django_apscheduler import util
 
+from sizing.pipeline import run_pipeline
+from wagmi import tracing
+
 logger = logging.getLogger(__name__)
 
 
-def my_job():
-    # Your job processing logic here...
-    pass
+@util.close_old_connections
+def rebalance():
+    """Fetch every Strategy's weights, then net and execute them once."""
+    run_pipeline(
+        job_timeout=settings.WAGMI_PIPELINE_JOB_TIMEOUT,
+        deadline=settings.WAGMI_PIPELINE_DEADLINE,
+    )
+
+
+@util.close_old_connections
+def sync_fills():
+    """Pull new fills from the exchange into the fill ledger."""
+    with tracing.run("sync_fills"):
+        call_command("sync_fills")
+
+
+@util.close_old_connections
+def compact_target_history():
+    """Thin out old TargetPositionHistory."""
+    call_command("compact_target_history")
 
 
 # The `close_old_connections` decorator ensures that database connections, that have become
@@ -37,17 +58,42 @@ class Command(BaseCommand):
     help = "Runs APScheduler."
 
     def handle(self, *args, **options):
+        if settings.WAGMI_METRICS_PORT:
+            tracing.start_metrics_server(
+                settings.WAGMI_METRICS_PORT, settings.WAGMI_METRICS_HOST
+            )
+
         scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
         scheduler.add_jobstore(DjangoJobStore(), "default")
 
         scheduler.add_job(
-            my_job,
-            trigger=CronTrigger(second="*/10"),  # Every 10 seconds
-            id="my_job",  # The `id` assigned to each job MUST be unique
+            rebalance,
+            trigger=CronTrigger.from_crontab(
+                settings.WAGMI_PIPELINE_CRON, timezone=settings.TIME_ZONE
+            ),
+            id="rebalance",  # The `id` assigned to each job MUST be unique
+            max_instances=1,
+            replace_existing=True,
+        )
+        logger.info("Added job 'rebalance'.")
+
+        scheduler.add_job(
+            sync_fills,
+            trigger=CronTrigger(minute="*/15"),
+            id="sync_fills",
+            max_instances=1,
+            replace_existing=True,
+        )
+        logger.info("Added job 'sync_fills'.")
+
+        scheduler.add_job(
+            compact_target_history,
+            trigger=CronTrigger(hour="01", minute="30"),
+            id="compact_target_history",
             max_instances=1,
             replace_existing=True,
         )
-        logger.info("Added job 'my_job'.")
+        logger.info("Added daily job: 'compact_target_history'.")
 
         scheduler.add_job(
             delete_old_job_executions,
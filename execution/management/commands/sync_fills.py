@@ -0,0 +1,21 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from execution.exchanges import registry
+from execution.models import Fill
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Sync new fills from the exchange into the fill ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exchange", default="ftx")
+
+    def handle(self, *args, **options):
+        exchange = registry.get_exchange(options["exchange"])
+        if Fill.objects.sync(exchange.client, options["exchange"]):
+            # positions moved, so the account snapshot is out of date
+            exchange.snapshot.invalidate()
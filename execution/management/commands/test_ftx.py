@@ -1,21 +1,70 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from execution.exchanges import ftx
+from execution.exchanges import registry
+from execution.exchanges.fakeftx import FakeFTXServer, FakeFTXState
+from execution.exchanges.ftx import FTXExchange
+from sizing.models import Security
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = "Runs ftx tests."
+    help = "Runs ftx tests. --fake load-tests execution against a local fake ftx."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fake", action="store_true")
+        parser.add_argument("--markets", type=int, default=50)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument("--jitter", type=float, default=0.02)
+        parser.add_argument("--server-rate-limit", type=float, default=30.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
 
     def handle(self, *args, **options):
-        exchange = ftx.FTXExchange(
-            subaccount=settings.WAGMI_FTX_SUB_ACCOUNT,
-            testmode=settings.WAGMI_ORDER_TESTMODE,
-            api_key=settings.WAGMI_FTX_API_KEY,
-            api_secret=settings.WAGMI_FTX_API_SECRET,
-        )
+        if options["fake"]:
+            return self.load_test(options)
+        exchange = registry.get_exchange("ftx")
         exchange.set_position(market="BTC/USD", units=0.0001)
+
+    def load_test(self, options):
+        markets = [f"COIN{i}/USD" for i in range(options["markets"])]
+        state = FakeFTXState(markets={market: (99.0, 101.0) for market in markets})
+        server = FakeFTXServer(
+            state,
+            latency=options["latency"],
+            jitter=options["jitter"],
+            rate_limit=options["server_rate_limit"],
+            error_rate=options["error_rate"],
+        )
+        with server:
+            exchange = FTXExchange(
+                subaccount="fake",
+                testmode=False,
+                api_key="fake",
+                api_secret="fake",
+                rate_limit=settings.WAGMI_FTX_RATE_LIMIT,
+                pool_size=settings.WAGMI_ORDER_WORKERS,
+                base_url=server.url,
+            )
+            securities = [Security(name=market) for market in markets]
+
+            def set_position(security):
+                try:
+                    return exchange.set_position(security, 1.0)
+                except Exception as e:
+                    logger.error(f"{security} failed: {e}")
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=settings.WAGMI_ORDER_WORKERS) as pool:
+                orders = [o for o in pool.map(set_position, securities) if o]
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{len(orders)}/{len(markets)} orders in {elapsed:.2f}s "
+            f"({len(orders) / elapsed:.1f}/s), server {server.stats}, "
+            f"quote cache {exchange.quote_cache.stats}"
+        )
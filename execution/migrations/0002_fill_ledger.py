@@ -0,0 +1,113 @@
+# Generated by Django 3.2.8 on 2026-10-18 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sizing", "0012_auto_20211115_2111"),
+        ("execution", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fill",
+            name="exchange",
+            field=models.ForeignKey(
+                default=1,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="sizing.exchange",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="exchange_order_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="fee",
+            field=models.FloatField(default=0.0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="fee_currency",
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="fill_id",
+            field=models.BigIntegerField(
+                default=0, help_text="the exchange's id for this fill"
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="liquidity",
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="market",
+            field=models.CharField(default="", max_length=32),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="price",
+            field=models.FloatField(default=0.0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="side",
+            field=models.CharField(default="", max_length=4),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="size",
+            field=models.FloatField(default=0.0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="fill",
+            name="time",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name="fill",
+            name="order",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="execution.order",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fill",
+            index=models.Index(
+                fields=["exchange", "time"], name="execution_f_exchang_d7e03e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fill",
+            index=models.Index(
+                fields=["market", "time"], name="execution_f_market_a7739f_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="fill",
+            constraint=models.UniqueConstraint(
+                fields=("exchange", "fill_id"), name="unique_exchange_fill"
+            ),
+        ),
+    ]
@@ -1,8 +1,17 @@
 import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
 from django.conf import settings
 from django.db import models
 from django.db.models.deletion import CASCADE
-from execution.exchanges import ftx
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from execution import apicache
+from execution.bands import NoTradeBand
+from execution.exchanges import registry
+from execution.slicing import SlicingScheduler
+from wagmi import tracing
 
 logger = logging.getLogger("execution")
 
@@ -13,32 +22,289 @@ class AuditableMixin(object):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+OrderResult = namedtuple("OrderResult", ["target_position", "order", "error"])
+
+
 class OrderManager(models.Manager):
-    def create_order(self, target_position):
-        if target_position.exchange.name == "ftx":
-            logger.debug("Using exchange ftx")
-            exchange = ftx.FTXExchange(
-                subaccount=settings.WAGMI_FTX_SUB_ACCOUNT,
-                testmode=settings.WAGMI_ORDER_TESTMODE,
-                api_key=settings.WAGMI_FTX_API_KEY,
-                api_secret=settings.WAGMI_FTX_API_SECRET,
-            )
-            exchange.set_position(
+    def _get_exchange(self, exchange_name):
+        return registry.get_exchange(exchange_name)
+
+    @tracing.traced("execution.create_order")
+    def create_order(self, target_position, exchange=None, slicer=None, band=None):
+        if exchange is None:
+            exchange = self._get_exchange(target_position.exchange.name)
+        if exchange is not None:
+            return exchange.set_position(
                 market=target_position.security,
                 target_position=target_position.size,
+                slicer=slicer,
+                band=band,
             )
 
-    def create_orders(self, qs):
+    def _get_slicer(self):
+        if not settings.WAGMI_SLICE_ABOVE_USD:
+            return None
+        return SlicingScheduler(
+            horizon=settings.WAGMI_SLICE_HORIZON,
+            interval=settings.WAGMI_SLICE_INTERVAL,
+            min_notional_usd=settings.WAGMI_SLICE_ABOVE_USD,
+            participation_rate=settings.WAGMI_SLICE_PARTICIPATION or None,
+            workers=settings.WAGMI_ORDER_WORKERS,
+        )
+
+    def _get_band(self):
+        if not (settings.WAGMI_NO_TRADE_USD or settings.WAGMI_NO_TRADE_PCT):
+            return None
+        return NoTradeBand(
+            min_notional_usd=settings.WAGMI_NO_TRADE_USD,
+            band_pct=settings.WAGMI_NO_TRADE_PCT,
+            hysteresis=settings.WAGMI_NO_TRADE_HYSTERESIS,
+        )
+
+    @tracing.traced("execution.create_orders")
+    def create_orders(self, qs, workers=None):
         """Receives a queryset of TargetPositions.
         Get's current position from exchange.
-        Post's order to correct position"""
-        for target_position in qs:
-            self.create_order(target_position)
+        Post's order to correct position
+
+        Orders are placed concurrently by a pool of `workers` threads
+        (default settings.WAGMI_ORDER_WORKERS). One exchange, and so one
+        account snapshot and rate limiter, is shared by every TargetPosition
+        in the cycle. A failed order doesn't stop the others.
+
+        A market's resting order is amended rather than stacked on, and if
+        settings.WAGMI_REPRICE_TIMEOUT is set, this cycle's unfilled
+        post-only orders are repriced for that many seconds after they're
+        placed (sliced markets aside).
+
+        Deltas worth at least settings.WAGMI_SLICE_ABOVE_USD (if set) are
+        worked as child orders over settings.WAGMI_SLICE_HORIZON seconds;
+        this call then blocks until they're done.
+
+        Deltas inside the no-trade band of settings.WAGMI_NO_TRADE_USD and
+        settings.WAGMI_NO_TRADE_PCT aren't traded (see bands.NoTradeBand).
+
+        Returns:
+            list: an OrderResult for every TargetPosition.
+        """
+        if isinstance(qs, models.QuerySet):
+            qs = qs.select_related("security", "exchange")
+        target_positions = list(qs)
+
+        exchanges = {}
+        for target_position in target_positions:
+            name = target_position.exchange.name
+            if name not in exchanges:
+                exchanges[name] = self._get_exchange(name)
+                if exchanges[name] is not None:
+                    exchanges[name].snapshot.refresh()
+
+        slicer = self._get_slicer()
+        band = self._get_band()
+        results = []
+        with ThreadPoolExecutor(
+            max_workers=workers or settings.WAGMI_ORDER_WORKERS
+        ) as pool:
+            futures = {
+                pool.submit(
+                    self.create_order,
+                    target_position,
+                    exchange=exchanges[target_position.exchange.name],
+                    slicer=slicer,
+                    band=band,
+                ): target_position
+                for target_position in target_positions
+            }
+            for future in as_completed(futures):
+                target_position = futures[future]
+                try:
+                    results.append(OrderResult(target_position, future.result(), None))
+                except Exception as e:
+                    logger.error(f"order for {target_position.security} failed: {e}")
+                    results.append(OrderResult(target_position, None, e))
+
+        if settings.WAGMI_REPRICE_TIMEOUT:
+            sliced = [p.market for p in slicer.parents] if slicer is not None else []
+            for name, exchange in exchanges.items():
+                placed = [
+                    r.order["id"]
+                    for r in results
+                    if r.target_position.exchange.name == name
+                    and isinstance(r.order, dict)
+                    and r.order.get("id")
+                ]
+                if exchange is None or not placed:
+                    continue
+                try:
+                    exchange.reprice_open_orders(
+                        placed,
+                        timeout=settings.WAGMI_REPRICE_TIMEOUT,
+                        interval=settings.WAGMI_REPRICE_INTERVAL,
+                        exclude_markets=sliced,
+                    )
+                except Exception as e:
+                    logger.error(f"repricing {name} orders failed: {e}")
+
+        if slicer is not None and slicer.parents:
+            try:
+                slicer.run()
+            except Exception as e:
+                logger.error(f"slicing failed: {e}")
+
+        for name, exchange in exchanges.items():
+            if exchange is not None:
+                logger.info(
+                    f"{name} quote cache {exchange.quote_cache.stats}, metadata cache {exchange.metadata_cache.stats}"
+                )
+        if band is not None:
+            logger.info(
+                f"no-trade band kept {band.stats['suppressed']} positions, traded "
+                f"{band.stats['traded']}, saving {band.stats['saved_usd']:.2f} USD of turnover"
+            )
+        logger.info(
+            f"placed {len(results)} orders, {sum(1 for r in results if r.error)} failed"
+        )
+        return results
 
 
 class Order(models.Model, AuditableMixin):
     objects = OrderManager()
 
 
+class FillManager(models.Manager):
+    @tracing.traced("execution.sync_fills")
+    def sync(self, client, exchange_name="ftx", start_time=None, window=None):
+        """Copy fills we don't have yet from the exchange into the ledger.
+
+        Fetching starts at the most recent stored fill (or `start_time` if
+        the ledger is empty, default 30 days ago) and walks forward to now
+        in `window` sized steps. Within a window, pages are fetched
+        backwards from the window end, each overlapping the last by its
+        oldest timestamp; the unique (exchange, fill_id) constraint drops
+        the repeats. Fills beyond a full page sharing a single timestamp
+        can't be reached by paging on time.
+
+        Args:
+            client (ftx.FtxClient): client for the account
+            exchange_name (str, optional): Defaults to "ftx".
+            start_time (datetime, optional): where to start an empty ledger
+            window (timedelta, optional): Defaults to one day.
+
+        Returns:
+            int: how many new fills were stored.
+        """
+        from sizing.models import Exchange
+
+        exchange = Exchange.objects.get(name=exchange_name)
+        window = window or timedelta(days=1)
+        now = timezone.now()
+        last_time = self.filter(exchange=exchange).aggregate(models.Max("time"))[
+            "time__max"
+        ]
+        start = last_time or start_time or now - timedelta(days=30)
+        known = set(
+            self.filter(exchange=exchange, time__gte=start).values_list(
+                "fill_id", flat=True
+            )
+        )
+
+        created = 0
+        while start < now:
+            end = min(start + window, now)
+            page_end = end
+            while True:
+                page = client.get_fills(
+                    start_time=start.timestamp(), end_time=page_end.timestamp()
+                )
+                if not page:
+                    break
+                new = [fill for fill in page if fill["id"] not in known]
+                if new:
+                    self.bulk_create(
+                        [self._from_exchange(exchange, fill) for fill in new],
+                        ignore_conflicts=True,
+                    )
+                    known.update(fill["id"] for fill in new)
+                    created += len(new)
+                # the next page ends at this one's oldest fill, inclusive, so
+                # fills sharing that timestamp aren't skipped. A page of
+                # nothing new is where the last sync left off, unless it's
+                # all at page_end, repeating the fills just stored: step past.
+                oldest = min(parse_datetime(fill["time"]) for fill in page)
+                if not new:
+                    if oldest < page_end:
+                        break
+                    oldest -= timedelta(microseconds=1)
+                if oldest < start:
+                    break
+                page_end = oldest
+            start = end
+
+        logger.info(f"synced {created} new {exchange_name} fills")
+        if created:
+            apicache.invalidate()  # positions moved
+        return created
+
+    def _from_exchange(self, exchange, fill):
+        return Fill(
+            exchange=exchange,
+            fill_id=fill["id"],
+            exchange_order_id=fill.get("orderId"),
+            market=fill["market"],
+            side=fill["side"],
+            size=fill["size"],
+            price=fill["price"],
+            fee=fill["fee"],
+            fee_currency=fill.get("feeCurrency") or "",
+            liquidity=fill.get("liquidity") or "",
+            time=parse_datetime(fill["time"]),
+        )
+
+    def to_dataframe(self, exchange_name="ftx", start_time=None, end_time=None):
+        """Fills from the ledger, oldest first, as a pandas DataFrame with
+        id, time, market, side, size, price and fee columns.
+        """
+        import pandas as pd
+
+        qs = self.filter(exchange__name=exchange_name)
+        if start_time:
+            qs = qs.filter(time__gte=start_time)
+        if end_time:
+            qs = qs.filter(time__lt=end_time)
+        columns = ["fill_id", "time", "market", "side", "size", "price", "fee"]
+        fills = pd.DataFrame.from_records(
+            qs.order_by("time", "fill_id").values_list(*columns), columns=columns
+        )
+        return fills.rename(columns={"fill_id": "id"})
+
+
 class Fill(models.Model, AuditableMixin):
-    order = models.ForeignKey(Order, on_delete=CASCADE)
+    """A fill from the exchange. The ledger is synced incrementally by
+    Fill.objects.sync and is the source for P&L and reporting.
+    """
+
+    order = models.ForeignKey(Order, on_delete=CASCADE, null=True, blank=True)
+    exchange = models.ForeignKey("sizing.Exchange", on_delete=CASCADE)
+    fill_id = models.BigIntegerField(help_text="the exchange's id for this fill")
+    exchange_order_id = models.BigIntegerField(null=True, blank=True)
+    market = models.CharField(max_length=32)
+    side = models.CharField(max_length=4)
+    size = models.FloatField()
+    price = models.FloatField()
+    fee = models.FloatField()
+    fee_currency = models.CharField(max_length=16, blank=True)
+    liquidity = models.CharField(max_length=5, blank=True)
+    time = models.DateTimeField()
+
+    objects = FillManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["exchange", "fill_id"], name="unique_exchange_fill"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["exchange", "time"]),
+            models.Index(fields=["market", "time"]),
+        ]
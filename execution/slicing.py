@@ -0,0 +1,242 @@
+"""Split large orders into child orders over a time horizon.
+
+A ParentOrder is the whole delta for one market. Its child sizes come
+from twap_slices (even sizes, one per interval) or participation_slices
+(each child capped at a fraction of the market's hourly volume). The
+SlicingScheduler works many parents at once. When a child is due, the
+previous one is checked: its fills are recorded, and if it is still
+resting it is cancelled and its remainder rolled into the next child. The
+last child is cancelled at the end of the horizon, and what it didn't
+fill is recorded as the parent's `unfilled`.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("execution")
+
+
+def _round_down(units, increment):
+    if not increment:
+        return units
+    return math.floor(round(units / increment, 9)) * increment
+
+
+def twap_slices(units: float, horizon: float, interval: float, increment=None):
+    """Even child sizes, one per interval across the horizon.
+
+    Args:
+        units (float): total size of the parent
+        horizon (float): seconds to work the parent over
+        interval (float): seconds between children
+        increment (float, optional): size increment to round children to;
+            the rounding remainder goes in the last child.
+
+    Returns:
+        list: child sizes
+    """
+    count = max(1, int(horizon // interval))
+    size = _round_down(units / count, increment)
+    if size <= 0:
+        return [units]
+    return [size] * (count - 1) + [units - size * (count - 1)]
+
+
+def participation_slices(
+    units: float,
+    hourly_volume: float,
+    rate: float,
+    interval: float,
+    increment=None,
+):
+    """Child sizes capped at `rate` of the volume traded per interval.
+
+    Args:
+        units (float): total size of the parent
+        hourly_volume (float): market volume per hour, in units
+        rate (float): participation rate, e.g. 0.05 for 5%
+        interval (float): seconds between children
+        increment (float, optional): size increment to round children to
+
+    Returns:
+        list: child sizes
+    """
+    cap = _round_down(hourly_volume * rate * interval / 3600, increment)
+    if cap <= 0 or cap >= units:
+        return [units]
+    count = math.ceil(round(units / cap, 9))
+    return [cap] * (count - 1) + [units - cap * (count - 1)]
+
+
+class ParentOrder(object):
+    """The full delta for one market and its child orders."""
+
+    def __init__(self, exchange, market, side, units, slices, start, interval):
+        self.exchange = exchange
+        self.market = market
+        self.side = side
+        self.units = units
+        self.slices = slices
+        self.due = [start + i * interval for i in range(len(slices))]
+        self.end = start + len(slices) * interval
+        self.children = []
+        self.filled = 0.0
+        self.carry = 0.0
+        self.unfilled = 0.0
+        self.error = None  # the exception that stopped the parent, if any
+        self._reconciled = 0
+
+    @property
+    def next_due(self):
+        if len(self.children) < len(self.slices):
+            return self.due[len(self.children)]
+        return self.end
+
+    @property
+    def placed(self):
+        return len(self.children) == len(self.slices)
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def __str__(self):
+        return (
+            f"{self.side} {self.units} {self.market}: "
+            f"{len(self.children)}/{len(self.slices)} children, filled {self.filled}"
+            + (f", unfilled {self.unfilled}" if self.unfilled else "")
+            + (f", failed: {self.error}" if self.failed else "")
+        )
+
+
+class SlicingScheduler(object):
+    """Works parent orders as timed child orders.
+
+    Args:
+        horizon (float): seconds to work each parent over
+        interval (float): seconds between child orders
+        min_notional_usd (float): only deltas at least this big are sliced
+        participation_rate (float, optional): cap children at this share of
+            hourly volume instead of slicing evenly (TWAP)
+        workers (int, optional): children placed concurrently. Defaults to 4.
+    """
+
+    def __init__(
+        self,
+        horizon,
+        interval,
+        min_notional_usd,
+        participation_rate=None,
+        workers=4,
+        clock=time.time,
+        sleep=time.sleep,
+    ) -> None:
+        self.horizon = horizon
+        self.interval = interval
+        self.min_notional_usd = min_notional_usd
+        self.participation_rate = participation_rate
+        self.workers = workers
+        self.clock = clock
+        self.sleep = sleep
+        self.parents = []
+
+    def should_slice(self, exchange, market, units):
+        price = exchange.get_quote(market).get("price")
+        return bool(price) and units * price >= self.min_notional_usd
+
+    def submit(self, exchange, market, side, units):
+        """Plan child orders for a delta and queue them.
+
+        Returns:
+            ParentOrder: the queued parent
+        """
+        quote = exchange.get_quote(market)
+        increment = exchange.get_market_metadata(market).get("sizeIncrement")
+        if self.participation_rate:
+            hourly_volume = quote.get("volumeUsd24h", 0.0) / 24 / quote["price"]
+            slices = participation_slices(
+                units, hourly_volume, self.participation_rate, self.interval, increment
+            )
+        else:
+            slices = twap_slices(units, self.horizon, self.interval, increment)
+        parent = ParentOrder(
+            exchange, market, side, units, slices, self.clock(), self.interval
+        )
+        self.parents.append(parent)
+        logger.info(f"sliced {parent} into {slices}")
+        return parent
+
+    def _reconcile(self, parent):
+        """Record fills of the latest child; cancel it and carry its
+        remainder into the next child if it's still resting."""
+        if parent._reconciled == len(parent.children):
+            return
+        child = parent.children[-1]
+        if child.get("id"):  # else testmode, nothing was sent
+            status = parent.exchange.client.get_order_status(child["id"])
+            parent.filled += status.get("filledSize") or 0.0
+            if status.get("status") != "closed":
+                parent.exchange.client.cancel_order(child["id"])
+                parent.carry += status["size"] - (status.get("filledSize") or 0.0)
+            parent.exchange.snapshot.invalidate()
+        parent._reconciled = len(parent.children)
+
+    def _step(self, parent):
+        """Place the parent's next child, or finish it at the end of its
+        horizon. An exception fails this parent only."""
+        try:
+            if parent.placed:
+                # the horizon is over: the last child doesn't get to rest
+                self._reconcile(parent)
+                parent.unfilled, parent.carry = parent.carry, 0.0
+                return
+            if parent.children:
+                self._reconcile(parent)
+            size = parent.slices[len(parent.children)] + parent.carry
+            parent.carry = 0.0
+            order = parent.exchange._place_order(parent.market, parent.side, size)
+            if order and order.get("size") is not None and order["size"] < size:
+                # capped by the book's depth, the rest goes in the next child
+                parent.carry += size - order["size"]
+            parent.children.append(order or {"id": None, "size": size})
+        except Exception as e:
+            logger.error(f"slicing {parent.market} failed: {e}")
+            parent.error = e
+            self._cancel_latest(parent)
+
+    def _cancel_latest(self, parent):
+        """Best effort: don't leave a failed parent's child on the book."""
+        if parent._reconciled == len(parent.children):
+            return  # already cancelled, or filled
+        child = parent.children[-1]
+        if not child.get("id"):
+            return
+        try:
+            parent.exchange.client.cancel_order(child["id"])
+        except Exception as e:  # e.g. it filled in the meantime
+            logger.warning(f"couldn't cancel {parent.market} order {child['id']}: {e}")
+
+    def run(self):
+        """Place every child as it comes due. Blocks until all parents
+        have been worked to the end of their horizon.
+
+        Returns:
+            list: the ParentOrders
+        """
+        pending = [parent for parent in self.parents]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending:
+                now = self.clock()
+                ready = [p for p in pending if p.next_due <= now]
+                if not ready:
+                    self.sleep(min(p.next_due for p in pending) - now)
+                    continue
+                list(pool.map(self._step, ready))
+                pending = [
+                    p for p in pending if not (p.failed or (p.placed and p.end <= now))
+                ]
+        for parent in self.parents:
+            logger.info(f"finished {parent}")
+        return self.parents
@@ -0,0 +1,61 @@
+import pytest
+from execution.bands import NoTradeBand
+from execution.test_slicing import FakeOrderClient, make_exchange
+from sizing.models import Security
+
+
+class TestNoTradeBand:
+    def test_small_deltas_keep_the_position(self) -> None:
+        band = NoTradeBand(min_notional_usd=10.0, band_pct=0.05)
+
+        assert band.apply("BTC/USD", 1.0, 1.04, 100.0) == 1.0  # 5% of target
+        assert band.apply("BTC/USD", 0.0, 0.05, 100.0) == 0.0  # $5
+        assert band.apply("BTC/USD", 1.0, 1.2, 100.0) == 1.2
+
+        assert band.stats == {
+            "traded": 1,
+            "suppressed": 2,
+            "saved_usd": pytest.approx(9.0),
+        }
+
+    def test_hysteresis_stops_inside_the_band(self) -> None:
+        band = NoTradeBand(band_pct=0.1, hysteresis=0.5)
+
+        position = band.apply("BTC/USD", 0.0, 10.0, 1.0)
+        assert position == pytest.approx(9.5)
+
+        # a target swinging around 10 trades once, not every time
+        for target in (10.4, 9.6, 10.4, 9.6):
+            position = band.apply("BTC/USD", position, target, 1.0)
+        assert position == pytest.approx(9.5)
+        assert band.stats["traded"] == 1
+
+    def test_hysteresis_closes_positions_all_the_way(self) -> None:
+        band = NoTradeBand(min_notional_usd=10.0, hysteresis=0.5)
+
+        assert band.apply("BTC/USD", 1.0, 0.0, 100.0) == 0.0
+        assert band.apply("BTC/USD", -1.0, 0.0, 100.0) == 0.0
+
+    def test_set_position_skips_orders_inside_the_band(self) -> None:
+        client = FakeOrderClient()
+        exchange = make_exchange(client)
+        band = NoTradeBand(min_notional_usd=10.0)
+        btc = Security(name="BTC/USD")  # 0.5 held, at 49482
+
+        assert exchange.set_position(btc, 0.5001, band=band) is None
+        assert client.orders == {}
+
+        order = exchange.set_position(btc, 0.6, band=band)
+        assert (order["side"], order["size"]) == ("buy", pytest.approx(0.1))
+
+    def test_set_position_inside_the_band_cancels_open_orders(self) -> None:
+        client = FakeOrderClient(fill_ratio=0.0)  # orders rest unfilled
+        exchange = make_exchange(client)
+        band = NoTradeBand(min_notional_usd=10.0)
+        btc = Security(name="BTC/USD")  # 0.5 held, at 49482
+
+        order = exchange.set_position(btc, 0.6, band=band)
+        exchange.snapshot.refresh()  # next cycle, the target is back near 0.5
+
+        assert exchange.set_position(btc, 0.5001, band=band) is None
+        assert client.cancelled == [order["id"]]
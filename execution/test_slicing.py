@@ -0,0 +1,166 @@
+import pytest
+from execution.exchanges.ftx import FTXExchange
+from execution.exchanges.snapshot import AccountSnapshot
+from execution.exchanges.test_ftxexchange import FakeClient
+from execution.slicing import SlicingScheduler, participation_slices, twap_slices
+
+
+class FakeOrderClient(FakeClient):
+    """Fills a fixed share of every child order"""
+
+    def __init__(self, fill_ratio=1.0):
+        super(FakeOrderClient, self).__init__()
+        self.fill_ratio = fill_ratio
+        self.orders = {}
+        self.cancelled = []
+
+    def get_market(self, market):
+        quote = super(FakeOrderClient, self).get_market(market)
+        quote["volumeUsd24h"] = 49484.0 * 24 * 10  # 10 units an hour
+        return quote
+
+    def place_order(self, market, side, price, size, type, ioc, post_only):
+        order = {"id": len(self.orders) + 1, "market": market, "side": side}
+        order.update(price=price, size=size)
+        self.orders[order["id"]] = order
+        return order
+
+    def get_open_orders(self):
+        return [
+            dict(order, remainingSize=order["size"] * (1 - self.fill_ratio))
+            for order in self.orders.values()
+            if self.fill_ratio < 1 and order["id"] not in self.cancelled
+        ]
+
+    def get_order_status(self, existing_order_id):
+        order = self.orders[existing_order_id]
+        filled = order["size"] * self.fill_ratio
+        return {
+            "size": order["size"],
+            "filledSize": filled,
+            "status": "closed" if filled == order["size"] else "open",
+        }
+
+    def cancel_order(self, order_id):
+        self.cancelled.append(order_id)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_exchange(client):
+    ftx = FTXExchange(
+        subaccount="pytest", testmode=False, api_key="none", api_secret="none"
+    )
+    ftx.client = client
+    ftx.snapshot = AccountSnapshot(client)
+    return ftx
+
+
+class TestSlices:
+    def test_twap_rounds_to_increment(self) -> None:
+        slices = twap_slices(1.0, horizon=1800, interval=600, increment=0.1)
+        assert slices == [pytest.approx(0.3), pytest.approx(0.3), pytest.approx(0.4)]
+
+    def test_participation_caps_children(self) -> None:
+        # 5% of 120 units an hour is 1 unit per 10 minutes
+        slices = participation_slices(3.5, 120.0, 0.05, 600)
+        assert slices == [1.0, 1.0, 1.0, 0.5]
+
+    def test_small_delta_is_one_child(self) -> None:
+        assert participation_slices(0.5, 120.0, 0.05, 600) == [0.5]
+
+
+class TestSlicingScheduler:
+    def test_only_large_deltas_are_sliced(self) -> None:
+        scheduler = SlicingScheduler(3600, 600, min_notional_usd=10000)
+        exchange = make_exchange(FakeOrderClient())
+        assert not scheduler.should_slice(exchange, "BTC/USD", 0.1)
+        assert scheduler.should_slice(exchange, "BTC/USD", 1.0)
+
+    def test_runs_parents_concurrently(self) -> None:
+        clock = FakeClock()
+        client = FakeOrderClient()
+        exchange = make_exchange(client)
+        scheduler = SlicingScheduler(
+            3600, 600, 10000, participation_rate=0.3, clock=clock, sleep=clock.sleep
+        )
+        btc = scheduler.submit(exchange, "BTC/USD", exchange.BUY, 2.0)
+        eth = scheduler.submit(exchange, "ETH/USD", exchange.SELL, 0.5)
+
+        scheduler.run()
+
+        assert btc.slices == [0.5, 0.5, 0.5, 0.5]
+        assert eth.slices == [0.5]
+        assert btc.filled == pytest.approx(2.0)
+        assert eth.filled == pytest.approx(0.5)
+        assert clock.now == 2400
+        assert len(client.orders) == 5
+        assert client.cancelled == []
+
+    def test_unfilled_remainder_carries_over(self) -> None:
+        clock = FakeClock()
+        client = FakeOrderClient(fill_ratio=0.5)
+        exchange = make_exchange(client)
+        scheduler = SlicingScheduler(1200, 600, 10000, clock=clock, sleep=clock.sleep)
+        parent = scheduler.submit(exchange, "BTC/USD", exchange.BUY, 2.0)
+
+        scheduler.run()
+
+        assert [o["size"] for o in parent.children] == [1.0, 1.5]
+        # the last child is cancelled at the end of the horizon
+        assert client.cancelled == [1, 2]
+        assert parent.filled == pytest.approx(0.5 + 0.75)
+        assert parent.unfilled == pytest.approx(0.75)
+
+    def test_size_capped_by_depth_carries_over(self) -> None:
+        clock = FakeClock()
+        client = FakeOrderClient()
+        exchange = make_exchange(client)
+        scheduler = SlicingScheduler(1200, 600, 10000, clock=clock, sleep=clock.sleep)
+        parent = scheduler.submit(exchange, "BTC/USD", exchange.BUY, 2.0)
+
+        place_order = client.place_order
+
+        def book_absorbs_half(market, size, **kwargs):
+            return place_order(market=market, size=size / 2, **kwargs)
+
+        client.place_order = book_absorbs_half
+        scheduler.run()
+
+        assert [o["size"] for o in parent.children] == [0.5, 0.75]
+        assert parent.filled == pytest.approx(1.25)
+        assert parent.unfilled == pytest.approx(0.75)
+
+    def test_a_failed_parent_doesnt_stop_the_others(self) -> None:
+        clock = FakeClock()
+        client = FakeOrderClient(fill_ratio=0.5)
+        exchange = make_exchange(client)
+        scheduler = SlicingScheduler(1200, 600, 10000, clock=clock, sleep=clock.sleep)
+        btc = scheduler.submit(exchange, "BTC/USD", exchange.BUY, 2.0)
+        eth = scheduler.submit(exchange, "ETH/USD", exchange.BUY, 2.0)
+
+        place_order = client.place_order
+
+        def reject_eth_children(market, **kwargs):
+            if market == "ETH/USD" and len(eth.children) == 1:
+                raise ValueError("order rejected")
+            return place_order(market=market, **kwargs)
+
+        client.place_order = reject_eth_children
+        scheduler.run()
+
+        assert str(eth.error) == "order rejected"
+        assert len(eth.children) == 1
+        assert btc.error is None
+        assert len(btc.children) == 2
+        # eth's first child was cancelled before the rejected second one
+        assert sorted(client.cancelled) == [1, 2, 3]
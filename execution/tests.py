@@ -1,3 +1,304 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import management
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from execution.exchanges import registry
+from execution.exchanges.ratelimit import RateLimitedClient, RateLimiter
+from execution.models import Fill, Order
+from sizing.models import StrategyPositionRequest, TargetPosition
+
+
+class FakeExchange:
+    """Records the markets it was asked to trade, failing on `fail`"""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.markets = []
+        self.threads = set()
+        self.snapshot = mock.Mock()
+        self.quote_cache = self.metadata_cache = mock.Mock(stats={})
+
+    def set_position(self, market, target_position, slicer=None, band=None):
+        self.threads.add(threading.get_ident())
+        self.markets.append(market)
+        if market == self.fail:
+            raise Exception("post only order would cross")
+        return {"id": len(self.markets), "market": market, "size": target_position}
+
+
+def target_position(market, size=1.0):
+    return SimpleNamespace(
+        security=market, size=size, exchange=SimpleNamespace(name="ftx")
+    )
+
+
+class CreateOrdersTest(SimpleTestCase):
+    def test_errors_are_collected(self) -> None:
+        exchange = FakeExchange(fail="ETH/USD")
+        targets = [target_position(f"COIN{i}/USD") for i in range(20)]
+        targets.append(target_position("ETH/USD"))
+
+        with mock.patch.object(Order.objects, "_get_exchange", return_value=exchange):
+            results = Order.objects.create_orders(targets, workers=4)
+
+        self.assertEqual(len(results), 21)
+        self.assertEqual(sorted(exchange.markets), sorted(t.security for t in targets))
+        failed = [r for r in results if r.error]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0].target_position.security, "ETH/USD")
+        exchange.snapshot.refresh.assert_called_once_with()
+
+    @override_settings(WAGMI_REPRICE_TIMEOUT=5.0)
+    def test_reprices_only_placed_orders(self) -> None:
+        exchange = FakeExchange(fail="ETH/USD")
+        exchange.reprice_open_orders = mock.Mock(side_effect=Exception("timeout"))
+        targets = [target_position("BTC/USD"), target_position("ETH/USD")]
+
+        with mock.patch.object(Order.objects, "_get_exchange", return_value=exchange):
+            results = Order.objects.create_orders(targets, workers=1)
+
+        self.assertEqual(len(results), 2)  # repricing failing loses nothing
+        (placed,), kwargs = exchange.reprice_open_orders.call_args
+        self.assertEqual(placed, [exchange.markets.index("BTC/USD") + 1])
+        self.assertEqual(kwargs["exclude_markets"], [])
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_blocks_once_bucket_is_empty(self) -> None:
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(rate=2, per=1.0, clock=lambda: now[0], sleep=sleep)
+        client = RateLimitedClient(mock.Mock(), limiter)
+        for _ in range(4):
+            client.get_balances()
+
+        self.assertEqual(waits, [0.5, 0.5])
+
+
+class RegistryTest(SimpleTestCase):
+    def setUp(self) -> None:
+        registry.clear()
+
+    def tearDown(self) -> None:
+        registry.clear()
+
+    @override_settings(WAGMI_FTX_SUB_ACCOUNT="main")
+    def test_adapters_are_shared(self) -> None:
+        exchange = registry.get_exchange("ftx")
+
+        self.assertIs(registry.get_exchange("ftx"), exchange)
+        self.assertIs(registry.get_exchange("ftx", "main"), exchange)
+        self.assertIsNot(registry.get_exchange("ftx", "other"), exchange)
+        self.assertIsNone(registry.get_exchange("nyse"))
+        self.assertNotIn(("nyse", "main"), registry._exchanges)
+
+    def test_connection_pool_sized_for_workers(self) -> None:
+        with override_settings(WAGMI_ORDER_WORKERS=8):
+            exchange = registry.get_exchange("ftx")
+
+        adapter = exchange.client._client._session.get_adapter("https://ftx.com/api/")
+        self.assertEqual(adapter._pool_maxsize, 8)
+
+
+class FakeFillsClient:
+    """Serves fills newest first, two per page, like a paginated API"""
+
+    page_size = 2
+
+    def __init__(self, fills):
+        self.fills = fills
+        self.calls = 0
+
+    def get_fills(self, start_time, end_time):
+        self.calls += 1
+        page = [
+            fill
+            for fill in self.fills
+            if start_time
+            <= datetime.fromisoformat(fill["time"]).timestamp()
+            <= end_time
+        ]
+        return sorted(page, key=lambda fill: fill["time"], reverse=True)[
+            : self.page_size
+        ]
+
+
+def fill(id, when):
+    return {
+        "id": id,
+        "orderId": 100 + id,
+        "market": "BTC/USD",
+        "side": "buy",
+        "size": 0.1,
+        "price": 50000.0,
+        "fee": 0.5,
+        "feeCurrency": "USD",
+        "liquidity": "maker",
+        "time": when.isoformat(),
+    }
+
+
+class FillLedgerTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.start = self.now - timedelta(days=3)
+
+    def test_sync_is_incremental(self) -> None:
+        fills = [fill(i, self.start + timedelta(hours=9 * i)) for i in range(1, 6)]
+        client = FakeFillsClient(fills)
+
+        self.assertEqual(Fill.objects.sync(client, start_time=self.start), 5)
+        self.assertEqual(Fill.objects.sync(client, start_time=self.start), 0)
+
+        client.fills.append(fill(6, self.now - timedelta(minutes=1)))
+        client.calls = 0
+        self.assertEqual(Fill.objects.sync(client, start_time=self.start), 1)
+        self.assertLessEqual(client.calls, 4)
+
+        fills = Fill.objects.to_dataframe("ftx")
+        self.assertEqual(list(fills["id"]), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(
+            list(fills.columns),
+            ["id", "time", "market", "side", "size", "price", "fee"],
+        )
+
+    def test_sync_pages_past_a_shared_timestamp(self) -> None:
+        when = self.now - timedelta(hours=1)
+        fills = [
+            fill(1, when - timedelta(minutes=2)),
+            fill(2, when - timedelta(minutes=1)),
+            fill(3, when),
+            fill(4, when),
+        ]
+
+        self.assertEqual(
+            Fill.objects.sync(FakeFillsClient(fills), start_time=self.start), 4
+        )
+        self.assertEqual(
+            list(Fill.objects.values_list("fill_id", flat=True).order_by("fill_id")),
+            [1, 2, 3, 4],
+        )
+
+
+@override_settings(WAGMI_API_TOKEN="s3cret")
+class ApiTest(TestCase):
+    client_class = partial(Client, HTTP_AUTHORIZATION="Bearer s3cret")
+
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        cache.clear()
+        self.net({"BTC/USD": 0.5, "ETH/USD": 0.1, "SOL/USD": -0.2})
+
+    def net(self, weights):
+        with self.captureOnCommitCallbacks(execute=True):
+            StrategyPositionRequest.objects.set_positions(
+                strategy_name="yolo",
+                exchange_name="ftx",
+                positions=[
+                    {"security_name": name, "weight": w, "arrival_price_usd": 100.0}
+                    for name, w in weights.items()
+                ],
+                calculated_at=datetime.now(timezone.utc),
+            )
+            TargetPosition.objects.create_new_desired_positions()
+
+    def test_targets_are_paginated_and_cached(self) -> None:
+        response = self.client.get("/api/targets?page=2&page_size=2")
+        body = response.json()
+        self.assertEqual((body["count"], body["page"], body["pages"]), (3, 2, 2))
+        self.assertEqual(body["results"][0]["security"], "SOL/USD")  # ordered by id
+        self.assertAlmostEqual(body["results"][0]["size"], -2.0)
+
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/targets?page=2&page_size=2")
+            not_modified = self.client.get(
+                "/api/targets?page=2&page_size=2",
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_only_known_parameters_make_the_cache_key(self) -> None:
+        response = self.client.get("/api/targets?page=2&page_size=2")
+
+        with self.assertNumQueries(0):
+            for query in (
+                "page_size=2&page=2",
+                "page=2&page_size=2&nonce=1",
+                "page=2&page_size=2&exchange=",
+            ):
+                again = self.client.get(f"/api/targets?{query}")
+                self.assertEqual(again["ETag"], response["ETag"], query)
+
+    def test_requires_staff_or_the_token(self) -> None:
+        for url in ("/api/targets", "/api/requests", "/api/positions/ftx", "/metrics"):
+            self.assertEqual(Client().get(url).status_code, 401, url)
+            wrong = Client(HTTP_AUTHORIZATION="Bearer guess")
+            self.assertEqual(wrong.get(url).status_code, 401, url)
+
+        staff = Client()
+        staff.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(staff.get("/api/targets").status_code, 200)
+        user = Client()
+        user.force_login(User.objects.create_user("user"))
+        self.assertEqual(user.get("/api/targets").status_code, 401)
+
+    def test_netting_invalidates(self) -> None:
+        etag = self.client.get("/api/targets")["ETag"]
+        requests = self.client.get("/api/requests?strategy=yolo").json()
+        self.assertEqual(requests["count"], 3)
+
+        self.net({"BTC/USD": 0.6})
+
+        response = self.client.get("/api/targets", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        sizes = {r["security"]: r["size"] for r in response.json()["results"]}
+        self.assertAlmostEqual(sizes["BTC/USD"], 6.0)
+        self.assertAlmostEqual(sizes["SOL/USD"], 0.0)
+
+    def test_positions_come_from_the_snapshot_once(self) -> None:
+        exchange = FakeExchange()
+        exchange.snapshot.balances.return_value = [
+            {"coin": "USD", "total": 1000.0, "usdValue": 1000.0},
+            {"coin": "BTC", "total": 0.5, "usdValue": 25000.0},
+        ]
+        with mock.patch.object(registry, "get_exchange", return_value=exchange):
+            first = self.client.get("/api/positions/ftx").json()
+            self.client.get("/api/positions/ftx")
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Fill.objects.sync(
+                    FakeFillsClient([fill(1, datetime.now(timezone.utc))]),
+                    start_time=datetime.now(timezone.utc) - timedelta(hours=1),
+                )
+            self.client.get("/api/positions/ftx")
+
+        self.assertEqual([b["coin"] for b in first["results"]], ["BTC", "USD"])
+        self.assertEqual(exchange.snapshot.balances.call_count, 2)
+
+    def test_unknown_exchanges_are_not_looked_up(self) -> None:
+        with mock.patch.object(registry, "get_exchange") as get_exchange:
+            response = self.client.get("/api/positions/nyse")
+
+        self.assertEqual(response.status_code, 404)
+        get_exchange.assert_not_called()
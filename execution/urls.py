@@ -2,4 +2,8 @@ from django.urls import path
 
 from . import views
 
-urlpatterns = []
+urlpatterns = [
+    path("targets", views.targets),
+    path("requests", views.requests),
+    path("positions/<str:exchange_name>", views.positions),
+]
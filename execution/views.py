@@ -1,6 +1,145 @@
-import os, base64, json
+from urllib.parse import urlencode
 
-from django.http import JsonResponse
-from django.http.response import HttpResponse
-from django.views import View
-from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
+
+from execution import apicache
+from execution.exchanges import registry
+from sizing.models import StrategyPositionRequest, TargetPosition
+from wagmi.auth import staff_or_token_required
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def _params(request, *filters):
+    """The query parameters a view understands, parsed and bounded.
+
+    Anything else in the query string is ignored, so it neither reaches
+    the view nor multiplies the API cache's keys.
+
+    Args:
+        filters (str): names of the view's optional filters, e.g. "exchange"
+
+    Returns:
+        dict: page and page_size, and whichever filters were given
+    """
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    try:
+        page_size = int(request.GET.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    params = {"page": page, "page_size": min(max(page_size, 1), MAX_PAGE_SIZE)}
+    for name in filters:
+        if request.GET.get(name):
+            params[name] = request.GET[name]
+    return params
+
+
+def _page(params, rows, fields=None):
+    """One page of `rows` (a queryset or list), as `params` ask.
+
+    Args:
+        fields (dict, optional): {output name: queryset values() field}
+    """
+    if fields:
+        rows = rows.values_list(*fields.values())
+    page = Paginator(rows, params["page_size"]).get_page(params["page"])
+    results = list(page.object_list)
+    if fields:
+        results = [dict(zip(fields, row)) for row in results]
+    return {
+        "count": page.paginator.count,
+        "page": page.number,
+        "pages": page.paginator.num_pages,
+        "results": results,
+    }
+
+
+def _cached_json(request, params, build):
+    """Serve build()'s data from the API cache, answering a matching
+    If-None-Match with a 304."""
+    key = f"{request.path}?{urlencode(sorted(params.items()))}"
+    etag, body = apicache.get_or_build(key, build)
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
+@require_GET
+@staff_or_token_required
+def targets(request):
+    """Current TargetPositions, optionally only those on ?exchange="""
+    params = _params(request, "exchange")
+
+    def build():
+        rows = TargetPosition.objects.order_by("id")
+        if "exchange" in params:
+            rows = rows.filter(exchange__name=params["exchange"])
+        return _page(
+            params,
+            rows,
+            {
+                "security": "security__name",
+                "exchange": "exchange__name",
+                "size": "size",
+                "created_at": "created_at",
+            },
+        )
+
+    return _cached_json(request, params, build)
+
+
+@require_GET
+@staff_or_token_required
+def requests(request):
+    """StrategyPositionRequests, optionally only those of ?strategy="""
+    params = _params(request, "strategy")
+
+    def build():
+        rows = StrategyPositionRequest.objects.order_by("id")
+        if "strategy" in params:
+            rows = rows.filter(strategy__name=params["strategy"])
+        return _page(
+            params,
+            rows,
+            {
+                "strategy": "strategy__name",
+                "exchange": "exchange__name",
+                "security": "security__name",
+                "weight": "weight",
+                "arrival_price_usd": "arrival_price_usd",
+                "calculated_at": "calculated_at",
+            },
+        )
+
+    return _cached_json(request, params, build)
+
+
+@require_GET
+@staff_or_token_required
+def positions(request, exchange_name):
+    """Balances held on an exchange, from its account snapshot."""
+    if exchange_name not in registry.SUPPORTED:
+        raise Http404(f"no exchange {exchange_name}")
+    exchange = registry.get_exchange(exchange_name)
+    params = _params(request)
+
+    def build():
+        balances = sorted(exchange.snapshot.balances(), key=lambda b: b["coin"])
+        return _page(
+            params,
+            [
+                {"coin": b["coin"], "total": b["total"], "usd": b.get("usdValue")}
+                for b in balances
+            ],
+        )
+
+    return _cached_json(request, params, build)
@@ -1,18 +1,40 @@
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from tinydb import TinyDB, Query
-
 import ftx
 
+import numpy as np
 import pandas as pd
 
 
 class FTXObject:
+    """A record from the FTX API holding only the fields we use.
+
+    Subclasses list them in __slots__, so instances carry no __dict__.
+    """
+
+    __slots__ = ()
+
     def __init__(self, token):
-        for key in token:
-            setattr(self, key, token[key])
+        self.update(token)
+
+    def update(self, token):
+        """Refresh the fields in place from a newer API record."""
+        for key in self.__slots__:
+            if not key.startswith("_"):
+                setattr(self, key, token.get(key))
 
 
 class LeveragedToken(FTXObject):
+    __slots__ = (
+        "name",
+        "underlying",
+        "leverage",
+        "totalNav",
+        "underlyingMark",
+        "positionPerShare",
+        "outstanding",
+    )
+
     def calc_pending_rebalance(self):
         """
         When a rebalance is triggered (currently 00:02 UTC),
@@ -20,9 +42,7 @@ class LeveragedToken(FTXObject):
         LT needs to buy/sell to return to 3x leverage, marked to
         prices at that time.
         """
-        desired_position = (
-            float(self.leverage) * self.totalNav / self.underlyingMark
-        )
+        desired_position = float(self.leverage) * self.totalNav / self.underlyingMark
 
         current_position = self.positionPerShare * self.outstanding
 
@@ -30,6 +50,20 @@ class LeveragedToken(FTXObject):
 
 
 class Future(FTXObject):
+    __slots__ = (
+        "name",
+        "underlying",
+        "perpetual",
+        "expired",
+        "enabled",
+        "bid",
+        "ask",
+        "mark",
+        "volume",
+        "volumeUsd24h",
+        "_lt_list",
+    )
+
     def __init__(self, *args, **kwargs):
         self._lt_list = None
         super(Future, self).__init__(*args, **kwargs)
@@ -68,45 +102,94 @@ class Future(FTXObject):
         return pending_rebalance
 
 
+class MarketUniverse:
+    """The futures and leveraged tokens on FTX, keyed by name.
+
+    refresh() updates the existing objects in place from fresh
+    get_futures()/list_lts() responses, adding new listings and dropping
+    delisted ones, rather than rebuilding the universe.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self._futures = {}
+        self._leveraged_tokens = {}
+        self.refresh()
+
+    @staticmethod
+    def _sync(existing, cls, records):
+        seen = set()
+        for record in records:
+            seen.add(record["name"])
+            obj = existing.get(record["name"])
+            if obj is None:
+                existing[record["name"]] = cls(record)
+            else:
+                obj.update(record)
+        for name in set(existing) - seen:
+            del existing[name]
+
+    def refresh(self):
+        self._sync(self._leveraged_tokens, LeveragedToken, self.client.list_lts())
+        self._sync(self._futures, Future, self.client.get_futures())
+
+        lts_by_underlying = defaultdict(list)
+        for lt in self._leveraged_tokens.values():
+            lts_by_underlying[lt.underlying].append(lt)
+        for future in self._futures.values():
+            future.set_lt_list(lts_by_underlying.get(future.name, []))
+
+    @property
+    def futures(self):
+        return list(self._futures.values())
+
+    @property
+    def perps(self):
+        return [future for future in self._futures.values() if future.perpetual]
+
+    @property
+    def leveraged_tokens(self):
+        return list(self._leveraged_tokens.values())
+
+
 class FTXStrategy:
 
     BUY = LONG = "buy"
     SELL = SHORT = "sell"
 
     MIN_HOURLY_VOLUME = 0
+    BACKTEST_DAYS = 30
 
-    perps = list()
-    futures = list()
-    leveraged_tokens = list()
-
-    def __init__(
-        self, subaccount, debug=False, api_key=None, api_secret=None
-    ) -> None:
+    def __init__(self, subaccount, debug=False, api_key=None, api_secret=None) -> None:
 
         self.client = ftx.FtxClient(
             api_key=api_key, api_secret=api_secret, subaccount_name=subaccount
         )
 
-        for token in self.client.list_lts():
-            lt = LeveragedToken(token)
-            self.leveraged_tokens.append(lt)
+        self.universe = MarketUniverse(self.client)
 
-        for future in self.client.get_futures():
-            lt_list = [
-                lt
-                for lt in self.leveraged_tokens
-                if lt.underlying == future["name"]
-            ]
+        self.debug = debug
 
-            f = Future(future)
-            f.set_lt_list(lt_list)
-            self.futures.append(f)
+    @property
+    def perps(self):
+        return self.universe.perps
 
-        self.perps = [future for future in self.futures if future.perpetual]
+    @property
+    def futures(self):
+        return self.universe.futures
 
-        self.debug = debug
-        self.db = TinyDB("db.json")
-        self.db.truncate()
+    @property
+    def leveraged_tokens(self):
+        return self.universe.leveraged_tokens
+
+    def scan_rebalances(self):
+        """Refresh the universe and rank the pending rebalances.
+
+        Returns:
+            pd.DataFrame: see pending_rebalances
+        """
+        self.universe.refresh()
+        return pending_rebalances(self.leveraged_tokens, self.futures)
 
     def place_order(self, market, side, size_usd):
         latest = self.client.get_future(market)
@@ -190,140 +273,200 @@ class FTXStrategy:
         print("Closed all positions.")
 
     def pandl(self):
+        """P&L of every trade over the last BACKTEST_DAYS, from the fill
+        ledger (synced incrementally from the exchange first).
+        """
+        from execution.models import Fill
 
-        start_time = (
-            datetime.now(tz=timezone.utc) - timedelta(days=self.BACKTEST_DAYS)
-        ).timestamp()
-        end_time = (datetime.now(tz=timezone.utc)).timestamp()
+        start_time = datetime.now(tz=timezone.utc) - timedelta(days=self.BACKTEST_DAYS)
+        Fill.objects.sync(self.client, "ftx", start_time=start_time)
 
-        fills = pd.DataFrame(
-            self.client.get_fills(start_time=start_time, end_time=end_time)
-        )
-        fills["time"] = pd.to_datetime(fills["time"])
-        fills = fills.drop(["future", "baseCurrency", "quoteCurrency"], axis=1)
-        fills = fills.sort_values(by="time", ascending=True)
+        fills = Fill.objects.to_dataframe("ftx", start_time=start_time)
         print(fills.tail(100))
 
-        for idx, fill in fills.iterrows():
-            # is this a new trade or an open one?
-            Trade = Query()
-            open_trades = self.db.search(
-                (Trade.closed == False) & (Trade.market == fill["market"])
-            )
-
-            # if new, create a new row
-            if len(open_trades) == 0:
-                self.db.insert(
-                    {
-                        "id": fill["id"],
-                        "time": fill["time"].isoformat(),
-                        "market": fill["market"],
-                        "side": fill["side"],
-                        "size": fill["size"],
-                        "size_now": fill["size"],
-                        "total_fees": fill["fee"],
-                        "consideration": fill["price"] * fill["size"],
-                        "closed": False,
-                        "net_profit": 0.0,
-                    }
-                )
-
-            else:
-                trade = open_trades[0]
-
-                # if we're accumulating into the trade
-                if fill["side"] == trade["side"]:
-
-                    if (trade["size_now"] + fill["size"]) >= trade["size"]:
-                        max_size = trade["size_now"] + fill["size"]
-                    else:
-                        max_size = trade["size"]
-
-                    self.db.update(
-                        {
-                            "size_now": round(
-                                trade["size_now"] + fill["size"], 4
-                            ),
-                            "size": max_size,
-                            "total_fees": trade["total_fees"] + fill["fee"],
-                            "consideration": trade["consideration"]
-                            + (fill["price"] * fill["size"]),
-                        },
-                        Trade.id == trade["id"],
-                    )
-
-                else:
-                    # we're reducing out of the trade (we must close any trade that croses sides)
-                    size_now = round(trade["size_now"] - fill["size"], 4)
-
-                    if size_now >= 0.0:
-                        self.db.update(
-                            {
-                                "size_now": size_now,
-                                "total_fees": trade["total_fees"]
-                                + fill["fee"],
-                                "consideration": trade["consideration"]
-                                - (fill["price"] * fill["size"]),
-                            },
-                            Trade.id == trade["id"],
-                        )
-                    else:
-                        # trade has crossed sides. Let's close out the trade and create a new one
-                        size_to_close = trade["size_now"]
-                        new_size = fill["size"] - trade["size_now"]
-
-                        self.db.update(
-                            {
-                                "size_now": 0.0,
-                                "total_fees": trade["total_fees"]
-                                + fill["fee"] * (size_to_close / fill["size"]),
-                                "consideration": trade["consideration"]
-                                - (fill["price"] * size_to_close),
-                            },
-                            Trade.id == trade["id"],
-                        )
-
-                        self.db.insert(
-                            {
-                                "id": fill["id"],
-                                "time": fill["time"].isoformat(),
-                                "market": fill["market"],
-                                "side": fill["side"],
-                                "size": new_size,
-                                "size_now": new_size,
-                                "total_fees": fill["fee"]
-                                * (new_size / fill["size"]),
-                                "consideration": (fill["price"] * new_size),
-                                "closed": False,
-                                "net_profit": 0.0,
-                            }
-                        )
-
-                # and maybe this is the final reduction to size 0
-                ClosableTrades = Query()
-                for trade in self.db.search(
-                    (ClosableTrades.closed == False) & (Trade.size_now == 0)
-                ):
-
-                    if trade["side"] == "buy":
-                        net_profit = (
-                            -trade["consideration"] - trade["total_fees"]
-                        )
-                    else:
-                        net_profit = (
-                            trade["consideration"] - trade["total_fees"]
-                        )
-
-                    self.db.update(
-                        {
-                            "closed": True,
-                            "net_profit": round(net_profit, 2),
-                            "consideration": 0.0,
-                            "total_fees": round(trade["total_fees"], 2),
-                            "size": round(trade["size"], 4),
-                        },
-                        Trade.id == trade["id"],
-                    )
-
-        for row in self.db.all():
+        trades = reconstruct_trades(fills)
+        for row in trades.to_dict("records"):
             print(row)
+        return trades
+
+
+def reconstruct_trades(fills):
+    """Rebuild round-trip trades from a history of fills.
+
+    A trade opens when a market's position leaves zero and closes when it
+    returns to zero. A fill that crosses through zero is split in two
+    (fees pro rata), closing one trade and opening the next. Each market
+    is processed with vectorized cumulative sums rather than fill by fill.
+
+    Args:
+        fills (pd.DataFrame): fills with id, time, market, side, size,
+            price and fee columns.
+
+    Returns:
+        pd.DataFrame: one row per trade, in the order the trades opened,
+        with id, time, market, side, size, size_now, total_fees,
+        consideration, closed and net_profit. Closed trades have their
+        consideration settled into net_profit.
+    """
+    columns = [
+        "id",
+        "time",
+        "market",
+        "side",
+        "size",
+        "size_now",
+        "total_fees",
+        "consideration",
+        "closed",
+        "net_profit",
+    ]
+    if fills.empty:
+        return pd.DataFrame(columns=columns)
+
+    fills = fills.sort_values(by="time", kind="stable").reset_index(drop=True)
+    sign = np.where(fills["side"] == FTXStrategy.BUY, 1.0, -1.0)
+    by_market = fills["market"]
+    pos_after = pd.Series(sign * fills["size"]).groupby(by_market).cumsum().round(4)
+    pos_before = pos_after.groupby(by_market).shift(fill_value=0.0)
+    crossing = (pos_before != 0) & (np.sign(pos_after) == -np.sign(pos_before))
+
+    # every fill becomes one part, or two if it crosses through zero
+    parts = fills.assign(
+        seq=fills.index * 2 + 1,
+        part_size=fills["size"],
+        opens=pos_before == 0,
+        pos_after=pos_after,
+    )
+    closing = parts[crossing].assign(
+        seq=lambda df: df["seq"] - 1,
+        part_size=pos_before[crossing].abs(),
+        opens=False,
+        pos_after=0.0,
+    )
+    parts.loc[crossing, "part_size"] = (
+        fills["size"][crossing] - pos_before[crossing].abs()
+    )
+    parts.loc[crossing, "opens"] = True
+    parts = pd.concat([closing, parts]).sort_values("seq")
+    parts["part_fee"] = parts["fee"] * (parts["part_size"] / parts["size"])
+    parts["trade"] = parts.groupby("market")["opens"].cumsum()
+
+    # running sums, fill by fill, so results match adding fills in order
+    trade_side = parts.groupby(["market", "trade"])["side"].transform("first")
+    same_side = np.where(parts["side"] == trade_side, 1.0, -1.0)
+    parts["part_consideration"] = same_side * parts["price"] * parts["part_size"]
+    running = parts.groupby(["market", "trade"])
+    parts["total_fees"] = running["part_fee"].cumsum()
+    parts["consideration"] = running["part_consideration"].cumsum()
+    parts["abs_pos"] = parts["pos_after"].abs()
+
+    trades = (
+        parts.groupby(["market", "trade"], sort=False)
+        .agg(
+            seq=("seq", "first"),
+            id=("id", "first"),
+            time=("time", "first"),
+            side=("side", "first"),
+            size=("abs_pos", "max"),
+            size_now=("abs_pos", "last"),
+            total_fees=("total_fees", "last"),
+            consideration=("consideration", "last"),
+        )
+        .reset_index()
+    )
+    trades = trades.sort_values("seq").reset_index(drop=True)
+
+    trades["closed"] = closed = trades["size_now"] == 0
+    net_profit = np.where(
+        trades["side"] == FTXStrategy.BUY,
+        -trades["consideration"],
+        trades["consideration"],
+    )
+    net_profit = pd.Series(net_profit - trades["total_fees"])
+
+    # settle closed trades, rounding like python's round()
+    trades["net_profit"] = 0.0
+    trades.loc[closed, "net_profit"] = net_profit[closed].map(lambda v: round(v, 2))
+    trades.loc[closed, "consideration"] = 0.0
+    trades.loc[closed, "total_fees"] = trades.loc[closed, "total_fees"].map(
+        lambda v: round(v, 2)
+    )
+    trades.loc[closed, "size"] = trades.loc[closed, "size"].map(lambda v: round(v, 4))
+    trades["time"] = trades["time"].map(lambda t: t.isoformat())
+    return trades[columns]
+
+
+def _column(records, field, dtype=float):
+    """One field of a list of API dicts or FTXObjects, as a numpy array"""
+    return np.array(
+        [r[field] if isinstance(r, dict) else getattr(r, field) for r in records],
+        dtype=dtype,
+    )
+
+
+def pending_rebalances(leveraged_tokens, futures):
+    """Pending leveraged token rebalances for every future in one pass.
+
+    Does for the whole universe what LeveragedToken.calc_pending_rebalance
+    and Future.rebal_size, pending_rebal_usd and market_impact do one
+    object at a time: tokens are loaded into arrays, their pending
+    rebalances summed per underlying, and joined to the futures.
+
+    Args:
+        leveraged_tokens (list): dicts from list_lts() or LeveragedTokens
+        futures (list): dicts from get_futures() or Futures
+
+    Returns:
+        pd.DataFrame: indexed by future name, with num_tokens, rebal_size,
+        pending_rebal_usd, hourly_volume and market_impact, for futures
+        that have leveraged tokens, largest pending_rebal_usd first.
+    """
+    columns = [
+        "num_tokens",
+        "rebal_size",
+        "pending_rebal_usd",
+        "hourly_volume",
+        "market_impact",
+    ]
+    if not len(leveraged_tokens) or not len(futures):
+        return pd.DataFrame(columns=columns)
+
+    lt = {
+        field: _column(leveraged_tokens, field)
+        for field in [
+            "leverage",
+            "totalNav",
+            "underlyingMark",
+            "positionPerShare",
+            "outstanding",
+        ]
+    }
+    desired = lt["leverage"] * lt["totalNav"] / lt["underlyingMark"]
+    pending = desired - lt["positionPerShare"] * lt["outstanding"]
+    codes, underlyings = pd.factorize(
+        _column(leveraged_tokens, "underlying", dtype=object)
+    )
+    rebal_by_underlying = np.bincount(codes, weights=pending)
+    tokens_by_underlying = np.bincount(codes)
+
+    names = _column(futures, "name", dtype=object)
+    idx = pd.Index(underlyings).get_indexer(names)
+    has_tokens = idx >= 0
+    idx = idx[has_tokens]
+
+    rebal_size = rebal_by_underlying[idx]
+    hourly_volume = _column(futures, "volume")[has_tokens] / 24
+    with np.errstate(divide="ignore", invalid="ignore"):
+        market_impact = np.where(hourly_volume > 0, rebal_size / hourly_volume, np.nan)
+    table = pd.DataFrame(
+        {
+            "num_tokens": tokens_by_underlying[idx],
+            "rebal_size": rebal_size,
+            "pending_rebal_usd": rebal_size * _column(futures, "mark")[has_tokens],
+            "hourly_volume": hourly_volume,
+            "market_impact": market_impact,
+        },
+        index=pd.Index(names[has_tokens], name="name"),
+    )
+    order = np.argsort(-np.abs(table["pending_rebal_usd"].to_numpy()))
+    return table.iloc[order]
@@ -0,0 +1,153 @@
+import pandas as pd
+import pytest
+
+from helpers.ftxtools import (
+    Future,
+    LeveragedToken,
+    MarketUniverse,
+    pending_rebalances,
+    reconstruct_trades,
+)
+
+
+def make_fills(rows):
+    """rows of (id, hour, market, side, size, price, fee)"""
+    fills = pd.DataFrame(
+        rows, columns=["id", "hour", "market", "side", "size", "price", "fee"]
+    )
+    fills["time"] = pd.Timestamp("2021-11-01", tz="UTC") + pd.to_timedelta(
+        fills.pop("hour"), unit="h"
+    )
+    return fills
+
+
+class TestReconstructTrades:
+    def test_round_trip(self) -> None:
+        trades = reconstruct_trades(
+            make_fills(
+                [
+                    (1, 0, "BTC/USD", "buy", 1.0, 100.0, 0.1),
+                    (2, 1, "BTC/USD", "buy", 1.0, 110.0, 0.1),
+                    (3, 2, "BTC/USD", "sell", 2.0, 120.0, 0.2),
+                ]
+            )
+        )
+
+        assert trades.to_dict("records") == [
+            {
+                "id": 1,
+                "time": "2021-11-01T00:00:00+00:00",
+                "market": "BTC/USD",
+                "side": "buy",
+                "size": 2.0,
+                "size_now": 0.0,
+                "total_fees": 0.4,
+                "consideration": 0.0,
+                "closed": True,
+                "net_profit": 29.6,
+            }
+        ]
+
+    def test_crossing_fill_is_split(self) -> None:
+        trades = reconstruct_trades(
+            make_fills(
+                [
+                    (1, 0, "ETH/USD", "sell", 1.0, 100.0, 0.1),
+                    (2, 1, "BTC/USD", "buy", 0.5, 10.0, 0.0),
+                    (3, 2, "ETH/USD", "buy", 3.0, 90.0, 0.3),
+                ]
+            )
+        )
+
+        assert list(trades["id"]) == [1, 2, 3]
+        closed, btc, opened = trades.to_dict("records")
+        assert closed["closed"] and closed["net_profit"] == pytest.approx(9.8)
+        assert closed["total_fees"] == pytest.approx(0.2)
+        assert not btc["closed"] and btc["consideration"] == pytest.approx(5.0)
+        assert opened["side"] == "buy" and not opened["closed"]
+        assert opened["size"] == opened["size_now"] == pytest.approx(2.0)
+        assert opened["total_fees"] == pytest.approx(0.2)
+        assert opened["consideration"] == pytest.approx(180.0)
+
+    def test_no_fills(self) -> None:
+        assert reconstruct_trades(make_fills([])).empty
+
+
+def lt(name, underlying, leverage, nav, outstanding, position_per_share):
+    return {
+        "name": name,
+        "underlying": underlying,
+        "leverage": leverage,
+        "totalNav": nav,
+        "underlyingMark": 100.0,
+        "outstanding": outstanding,
+        "positionPerShare": position_per_share,
+    }
+
+
+class TestPendingRebalances:
+    lts = [
+        lt("BULL", "BTC-PERP", 3.0, 1000.0, 10.0, 2.5),
+        lt("BEAR", "BTC-PERP", -3.0, 1000.0, 10.0, -3.5),
+        lt("ETHBULL", "ETH-PERP", 3.0, 500.0, 5.0, 3.2),
+    ]
+    futures = [
+        {"name": "BTC-PERP", "volume": 2400.0, "mark": 100.0, "perpetual": True},
+        {"name": "ETH-PERP", "volume": 48.0, "mark": 100.0, "perpetual": True},
+        {"name": "SOL-PERP", "volume": 10.0, "mark": 100.0, "perpetual": True},
+    ]
+
+    def test_matches_per_object_calculation(self) -> None:
+        table = pending_rebalances(self.lts, self.futures)
+
+        assert list(table.index) == ["BTC-PERP", "ETH-PERP"]
+        tokens = [LeveragedToken(token) for token in self.lts]
+        for future in self.futures[:2]:
+            f = Future(future)
+            f.set_lt_list([t for t in tokens if t.underlying == f.name])
+            row = table.loc[f.name]
+            assert row["rebal_size"] == pytest.approx(f.rebal_size)
+            assert row["pending_rebal_usd"] == pytest.approx(f.pending_rebal_usd)
+            assert row["market_impact"] == pytest.approx(f.market_impact)
+        assert table.loc["BTC-PERP", "num_tokens"] == 2
+
+    def test_empty_universe(self) -> None:
+        assert pending_rebalances([], self.futures).empty
+
+
+class FakeUniverseClient:
+    def __init__(self, lts, futures):
+        self.lts = lts
+        self.futures = futures
+
+    def list_lts(self):
+        return self.lts
+
+    def get_futures(self):
+        return self.futures
+
+
+class TestMarketUniverse:
+    def test_refresh_updates_in_place(self) -> None:
+        client = FakeUniverseClient(
+            list(TestPendingRebalances.lts), list(TestPendingRebalances.futures)
+        )
+        universe = MarketUniverse(client)
+        btc = next(f for f in universe.futures if f.name == "BTC-PERP")
+        assert len(btc.lt_list) == 2
+        assert not hasattr(btc, "__dict__")
+
+        client.futures = [dict(client.futures[0], mark=200.0), client.futures[1]]
+        client.lts = client.lts[:2] + [lt("SOLBULL", "SOL-PERP", 3.0, 1, 1, 1)]
+        universe.refresh()
+
+        assert next(f for f in universe.futures if f.name == "BTC-PERP") is btc
+        assert btc.mark == 200.0
+        assert [f.name for f in universe.perps] == ["BTC-PERP", "ETH-PERP"]
+        assert sorted(t.name for t in universe.leveraged_tokens) == [
+            "BEAR",
+            "BULL",
+            "SOLBULL",
+        ]
+        eth = next(f for f in universe.futures if f.name == "ETH-PERP")
+        assert eth.lt_list == []
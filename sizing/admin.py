@@ -1,4 +1,10 @@
+import hashlib
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, models
+from django.utils.functional import cached_property
 
 # Register your models here.
 
@@ -6,10 +12,66 @@ from sizing.models import (
     Strategy,
     StrategyPositionRequest,
     TargetPosition,
+    TargetPositionHistory,
     Exchange,
     Security,
 )
 
+# below this many rows the planner's estimate isn't worth its error
+ESTIMATE_ABOVE = 100_000
+COUNT_CACHE_SECONDS = 60
+# a case-sensitive prefix (tickers are upper case, e.g. BTC/USD) is served by
+# Security.name's index; "^security__name" would be UPPER(name) LIKE, which isn't
+SECURITY_PREFIX = "security__name__startswith"
+
+
+class EstimatedCountPaginator(Paginator):
+    """Avoids COUNT(*) over big tables on every changelist page.
+
+    An unfiltered changelist on Postgres is counted from the planner's
+    row estimate; any other count is cached for COUNT_CACHE_SECONDS.
+    """
+
+    @cached_property
+    def count(self):
+        model = self.object_list.model
+        query = self.object_list.query
+        if not query.where and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATE_ABOVE:
+                return int(row[0])
+
+        key = hashlib.md5(str(query).encode("utf-8")).hexdigest()
+        return cache.get_or_set(
+            f"admin-count:{model._meta.label}:{key}",
+            lambda: super(EstimatedCountPaginator, self).count,
+            COUNT_CACHE_SECONDS,
+        )
+
+
+class SummaryAdmin(admin.ModelAdmin):
+    """A changelist over joined querysets, with a summary of the filtered
+    rows computed by one aggregate query."""
+
+    change_list_template = "admin/sizing/summary_change_list.html"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # a second COUNT(*), of the whole table
+    summary = {}  # {label: aggregate expression}
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is not None and self.summary:
+            response.context_data["summary"] = changelist.queryset.order_by().aggregate(
+                **self.summary
+            )
+        return response
+
 
 class StrategyAdmin(admin.ModelAdmin):
     list_display = [
@@ -19,12 +81,14 @@ class StrategyAdmin(admin.ModelAdmin):
         "execute_immediately",
         "command",
     ]
+    list_select_related = ["exchange"]
+    search_fields = ["^name"]
 
 
 admin.site.register(Strategy, StrategyAdmin)
 
 
-class StrategyPositionRequestAdmin(admin.ModelAdmin):
+class StrategyPositionRequestAdmin(SummaryAdmin):
     list_display = [
         "strategy",
         "exchange",
@@ -33,24 +97,71 @@ class StrategyPositionRequestAdmin(admin.ModelAdmin):
         "arrival_price_usd",
         "calculated_at",
     ]
+    list_select_related = ["strategy", "exchange", "security"]
+    list_filter = ["strategy", "exchange"]
+    search_fields = [SECURITY_PREFIX]
+    autocomplete_fields = ["strategy", "security"]
+    summary = {
+        "requests": models.Count("id"),
+        "strategies": models.Count("strategy", distinct=True),
+        "securities": models.Count("security", distinct=True),
+        "gross": models.Sum(models.Func("weight", function="ABS")),
+        "latest": models.Max("calculated_at"),
+    }
 
 
 admin.site.register(StrategyPositionRequest, StrategyPositionRequestAdmin)
 
 
-class TargetPositionAdmin(admin.ModelAdmin):
+class TargetPositionAdmin(SummaryAdmin):
     list_display = [
         "security",
         "size",
         "exchange",
     ]
+    list_select_related = ["security", "exchange"]
+    list_filter = ["exchange"]
+    search_fields = [SECURITY_PREFIX]
+    autocomplete_fields = ["security"]
+    summary = {
+        "targets": models.Count("id"),
+        "long": models.Count("id", filter=models.Q(size__gt=0)),
+        "short": models.Count("id", filter=models.Q(size__lt=0)),
+        "flat": models.Count("id", filter=models.Q(size=0)),
+    }
 
 
 admin.site.register(TargetPosition, TargetPositionAdmin)
 
 
+class TargetPositionHistoryAdmin(admin.ModelAdmin):
+    list_display = ["netted_at", "security", "size", "exchange"]
+    list_select_related = ["security", "exchange"]
+    list_filter = ["exchange"]
+    search_fields = [SECURITY_PREFIX]
+    # newest first by the primary key: rows are only ever appended, and no
+    # btree index starts with netted_at
+    ordering = ["-id"]
+    sortable_by = []
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False  # append-only, written by netting
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False  # compact_target_history is what trims it
+
+
+admin.site.register(TargetPositionHistory, TargetPositionHistoryAdmin)
+
+
 class ExchangeAdmin(admin.ModelAdmin):
     list_display = ["name"]
+    search_fields = ["^name"]
 
 
 admin.site.register(Exchange, ExchangeAdmin)
@@ -58,6 +169,7 @@ admin.site.register(Exchange, ExchangeAdmin)
 
 class SecurityAdmin(admin.ModelAdmin):
     list_display = ["name"]
+    search_fields = ["^name"]
 
 
 admin.site.register(Security, SecurityAdmin)
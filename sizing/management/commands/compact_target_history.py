@@ -0,0 +1,33 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sizing.models import TargetPositionHistory
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Thin old TargetPositionHistory out to one row per day and drop expired rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full-days",
+            type=int,
+            default=settings.WAGMI_TARGET_HISTORY_FULL_DAYS,
+            help="keep every row this many days back",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.WAGMI_TARGET_HISTORY_RETENTION_DAYS,
+            help="delete rows older than this (0 = keep forever)",
+        )
+
+    def handle(self, *args, **options):
+        deleted = TargetPositionHistory.objects.compact(
+            full_resolution_days=options["full_days"],
+            retention_days=options["retention_days"],
+        )
+        self.stdout.write(f"deleted {deleted} target position history rows")
@@ -0,0 +1,50 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sizing import replay
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Replay historical weight payloads (JSONL) through netting, in memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="+", help="JSONL files of payloads")
+        parser.add_argument(
+            "--max-position-size",
+            action="append",
+            default=[],
+            metavar="STRATEGY=USD",
+            help="override a Strategy's max_position_size_usd",
+        )
+        parser.add_argument("--output", help="write the target sizes to this csv")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        payloads = [p for path in options["path"] for p in replay.load_jsonl(path)]
+        sizes = replay.strategy_sizes()
+        for override in options["max_position_size"]:
+            name, size = override.split("=")
+            sizes[name] = float(size)
+
+        try:
+            targets = replay.replay(replay.payloads_to_frame(payloads), sizes)
+        except ValueError as e:
+            raise CommandError(f"{e}, size them with --max-position-size")
+        elapsed = time.perf_counter() - start
+
+        if options["output"]:
+            targets.to_csv(options["output"])
+        if targets.empty:
+            self.stdout.write("no payloads")
+            return
+        turnover = replay.trades(targets).abs().sum().sum()
+        self.stdout.write(
+            f"replayed {len(payloads)} payloads, {len(targets)} rebalances from "
+            f"{targets.index[0]} to {targets.index[-1]} in {elapsed:.2f}s, "
+            f"{targets.shape[1]} securities, {turnover:.4f} units traded"
+        )
+        self.stdout.write(targets.iloc[-1].to_string())
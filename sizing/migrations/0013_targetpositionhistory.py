@@ -0,0 +1,73 @@
+# Generated by Django 3.2.8 on 2026-10-18 20:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_brin_index(apps, schema_editor):
+    # history is appended in time order, which is what a BRIN index needs
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX sizing_targetpositionhistory_netted_at_brin "
+            "ON sizing_targetpositionhistory USING brin (netted_at)"
+        )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS sizing_targetpositionhistory_netted_at_brin"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sizing", "0012_auto_20211115_2111"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TargetPositionHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("size", models.FloatField(help_text="how many units of the security")),
+                ("netted_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "exchange",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sizing.exchange",
+                    ),
+                ),
+                (
+                    "security",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="sizing.security",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "target position history",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="targetpositionhistory",
+            index=models.Index(
+                fields=["security", "exchange", "netted_at"],
+                name="sizing_targ_securit_af3d56_idx",
+            ),
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
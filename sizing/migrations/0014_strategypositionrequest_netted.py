@@ -0,0 +1,24 @@
+# Generated by Django 3.2.8 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sizing", "0013_targetpositionhistory"),
+    ]
+
+    operations = [
+        # requests stored before this were netted when they were stored
+        migrations.AddField(
+            model_name="strategypositionrequest",
+            name="netted",
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AlterField(
+            model_name="strategypositionrequest",
+            name="netted",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -1,14 +1,27 @@
 import logging
 import json
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
+from django.db.models.functions import Cast, TruncDate
 from django.conf import settings
-from datetime import datetime
+from django.utils import timezone
+from datetime import datetime, timedelta
 
+from execution import apicache
 from execution.models import Order
+from wagmi import tracing
 
 logger = logging.getLogger("sizing")
 
 
+def position_size(weight, max_position_size_usd, arrival_price_usd):
+    """Units of a Security one Strategy asks for; TargetPositions are the sum
+    of these. Works elementwise on numbers, pandas/numpy arrays and ORM
+    expressions alike, so the replay engine nets exactly as the database does.
+    """
+    return weight * max_position_size_usd / arrival_price_usd
+
+
 class Strategy(models.Model):
 
     name = models.CharField(max_length=24, db_index=True)
@@ -69,6 +82,98 @@ class StrategyPositionRequestManager(models.Manager):
         )
         return obj
 
+    @tracing.traced("sizing.set_positions")
+    def set_positions(
+        self,
+        strategy_name: str,
+        exchange_name: str,
+        positions: list,
+        calculated_at: datetime,
+    ):
+        """Upsert a whole weights payload for a Strategy in one transaction.
+
+        Any of the Strategy's requests calculated before `calculated_at`
+        (i.e. securities missing from this payload) are zeroed with a
+        single UPDATE.
+
+        Args:
+            strategy_name (str): name of the Strategy making the requests
+            exchange_name (str): name of the Exchange to trade on
+            positions (list): dicts of security_name, weight and arrival_price_usd
+            calculated_at (datetime): Datetime when the weights were calculated.
+
+        Returns:
+            QuerySet: the Securities whose requests changed, ready for netting.
+
+        Raises:
+            ValueError: if the payload names a security more than once.
+        """
+        names = [position["security_name"] for position in positions]
+        duplicates = sorted(name for name, n in Counter(names).items() if n > 1)
+        if duplicates:
+            raise ValueError(f"{strategy_name} requests {duplicates} more than once")
+        strategy, _ = Strategy.objects.get_or_create(name=strategy_name)
+        exchange, _ = Exchange.objects.get_or_create(name=exchange_name)
+        now = timezone.now()
+
+        with transaction.atomic():
+            securities = {s.name: s for s in Security.objects.filter(name__in=names)}
+            missing = [name for name in dict.fromkeys(names) if name not in securities]
+            if missing:
+                Security.objects.bulk_create([Security(name=name) for name in missing])
+                securities = {
+                    s.name: s for s in Security.objects.filter(name__in=names)
+                }
+
+            existing = {
+                spr.security_id: spr
+                for spr in StrategyPositionRequest.objects.filter(
+                    strategy=strategy,
+                    exchange=exchange,
+                    security__in=securities.values(),
+                )
+            }
+            to_update, to_create = [], []
+            for position in positions:
+                security = securities[position["security_name"]]
+                spr = existing.get(security.id)
+                if spr is None:
+                    spr = StrategyPositionRequest(
+                        strategy=strategy, exchange=exchange, security=security
+                    )
+                    to_create.append(spr)
+                else:
+                    to_update.append(spr)
+                spr.weight = position["weight"]
+                spr.arrival_price_usd = position["arrival_price_usd"]
+                spr.calculated_at = calculated_at
+                spr.netted = False
+                spr.updated_at = now
+
+            StrategyPositionRequest.objects.bulk_update(
+                to_update,
+                [
+                    "weight",
+                    "arrival_price_usd",
+                    "calculated_at",
+                    "netted",
+                    "updated_at",
+                ],
+            )
+            StrategyPositionRequest.objects.bulk_create(to_create)
+
+            stale = StrategyPositionRequest.objects.filter(
+                strategy=strategy, calculated_at__lt=calculated_at
+            ).exclude(weight=0.0)
+            stale_ids = list(stale.values_list("security_id", flat=True))
+            if stale_ids:
+                stale.update(weight=0.0, netted=False, updated_at=now)
+            transaction.on_commit(apicache.invalidate)
+
+        return Security.objects.filter(
+            id__in={s.id for s in securities.values()} | set(stale_ids)
+        )
+
     def get_position(self, strategy_name: str, exchange_name: str, security_name: str):
         return StrategyPositionRequest.objects.filter(
             strategy__name=strategy_name,
@@ -87,6 +192,7 @@ class StrategyPositionRequest(models.Model):
         weight (float): Notional weight of the request (not shares or dollars)
         arrival_price_usd (float): Price in USd of the security when we calculated weights
         calculated_at (datetime): Datetime when the weisghts were calculated.
+        netted (bool): False until netting has read this weight
     """
 
     strategy = models.ForeignKey("Strategy", on_delete=models.CASCADE)
@@ -95,6 +201,7 @@ class StrategyPositionRequest(models.Model):
     weight = models.FloatField()
     arrival_price_usd = models.FloatField()
     calculated_at = models.DateTimeField()
+    netted = models.BooleanField(default=False, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -114,48 +221,116 @@ class StrategyPositionRequest(models.Model):
 
 
 class TargetPositionManager(models.Manager):
+    @tracing.traced("sizing.create_new_desired_positions")
     def create_new_desired_positions(self, security=None, execute_immediately=False):
         """Once all new Position Requests are in for the day,
         we can now calculate the net of all of these as a set
-        of TargetPositions. One TargetPosition per Security.
+        of TargetPositions. One TargetPosition per Security and Exchange.
+        Every netted size is also appended to TargetPositionHistory, and the
+        requests it was netted from are marked `netted`.
+
+        Netting is set based: every target size is computed in one
+        aggregate query (sum of weight * max_position_size_usd / arrival
+        price, grouped by security and exchange) and written back with
+        bulk operations, so the number of database round trips does not
+        grow with the number of securities or strategies.
 
         Optional - pass in a Security, or Queryset of Security models.
+
+        Returns:
+            list: the TargetPositions that were created or updated.
         """
-        if (
-            security
-            and isinstance(security, models.QuerySet)
-            and security.model is Security
-        ):
-            securities = security
-        elif security and isinstance(security, Security):
-            securities = Security.objects.filter(id=security.id)
-        elif security:
+        requests = StrategyPositionRequest.objects.all()
+        if isinstance(security, models.QuerySet) and security.model is Security:
+            requests = requests.filter(security__in=security)
+        elif isinstance(security, Security):
+            requests = requests.filter(security=security)
+        elif security is not None:
             raise TypeError(
                 "security should be a single Security or a queryset, or None"
             )
-        else:
-            securities = Security.objects.all()
 
-        for security in securities:
-            desired_size = 0.0
+        with transaction.atomic():
+            # marked before they're read: a request stored from here on is
+            # left unnetted for the next pass
+            requests.filter(netted=False).update(netted=True)
+            netted = {
+                (row["security"], row["exchange"]): row
+                for row in requests.values("security", "exchange")
+                .annotate(
+                    size=models.Sum(
+                        position_size(
+                            models.F("weight"),
+                            Cast(
+                                "strategy__max_position_size_usd", models.FloatField()
+                            ),
+                            models.F("arrival_price_usd"),
+                        ),
+                        output_field=models.FloatField(),
+                    ),
+                    num_requests=models.Count("id"),
+                )
+                .order_by("security", "exchange")
+            }
+            if not netted:
+                return []
 
-            spr_qs = StrategyPositionRequest.objects.filter(security=security)
+            security_ids = {security_id for security_id, _ in netted}
+            exchange_ids = {exchange_id for _, exchange_id in netted}
+            now = timezone.now()
 
-            for req in spr_qs:
-                desired_size += req.weight * float(req.strategy.max_position_size_usd)
+            existing = {
+                (tp.security_id, tp.exchange_id): tp
+                for tp in TargetPosition.objects.filter(
+                    security_id__in=security_ids, exchange_id__in=exchange_ids
+                )
+            }
+            to_update, to_create = [], []
+            for key, row in netted.items():
+                tp = existing.get(key)
+                if tp is None:
+                    to_create.append(
+                        TargetPosition(
+                            security_id=key[0], exchange_id=key[1], size=row["size"]
+                        )
+                    )
+                else:
+                    tp.size = row["size"]
+                    to_update.append(tp)
+            TargetPosition.objects.bulk_update(to_update, ["size"])
+            TargetPosition.objects.bulk_create(to_create)
+            transaction.on_commit(apicache.invalidate)
+            TargetPositionHistory.objects.bulk_create(
+                [
+                    TargetPositionHistory(
+                        security_id=key[0],
+                        exchange_id=key[1],
+                        size=row["size"],
+                        netted_at=now,
+                    )
+                    for key, row in netted.items()
+                ]
+            )
 
-            tp, created = TargetPosition.objects.update_or_create(
-                security=security,
-                exchange=req.exchange,  # TODO - do we care about multiple exchanges?
-                defaults={"size": desired_size / req.arrival_price_usd},
+        target_positions = [
+            tp
+            for tp in TargetPosition.objects.filter(
+                security_id__in=security_ids, exchange_id__in=exchange_ids
+            )
+            .select_related("security", "exchange")
+            .order_by("id")
+            if (tp.security_id, tp.exchange_id) in netted
+        ]
+
+        for tp in target_positions:
+            logger.info(
+                f"TargetPosition {tp.id} nets {netted[(tp.security_id, tp.exchange_id)]['num_requests']} StrategyPositionRequests for {tp.security}, {tp.exchange}, {tp.size}"
             )
-            if execute_immediately:
-                Order.objects.create_order(tp)
 
-            for req in spr_qs:
-                logger.info(
-                    f"TargetPosition {tp.id} includes StrategyPositionRequest {req.strategy}, {req.exchange}, {req.security}, {req.weight}, {req.arrival_price_usd}"
-                )
+        if execute_immediately:
+            Order.objects.create_orders(target_positions)
+
+        return target_positions
 
 
 class TargetPosition(models.Model):
@@ -185,3 +360,74 @@ class TargetPosition(models.Model):
                 "size": self.size,
             }
         )
+
+
+class TargetPositionHistoryManager(models.Manager):
+    def compact(self, full_resolution_days: int, retention_days: int = 0, now=None):
+        """Thin out old history.
+
+        Rows older than `full_resolution_days` are reduced to the last one
+        of each day per Security and Exchange; rows older than
+        `retention_days` (if set) are deleted.
+
+        Returns:
+            int: how many rows were deleted.
+        """
+        now = now or timezone.now()
+        deleted = 0
+        if retention_days:
+            deleted += self.filter(
+                netted_at__lt=now - timedelta(days=retention_days)
+            ).delete()[0]
+
+        old = self.filter(netted_at__lt=now - timedelta(days=full_resolution_days))
+        # rows are only ever appended, so the highest id is the day's last
+        last_of_day = (
+            old.annotate(day=TruncDate("netted_at"))
+            .values("security", "exchange", "day")
+            .annotate(last_id=models.Max("id"))
+            .values_list("last_id", flat=True)
+        )
+        deleted += old.exclude(id__in=last_of_day).delete()[0]
+        logger.info(f"compacted target position history, deleted {deleted} rows")
+        return deleted
+
+
+class TargetPositionHistory(models.Model):
+    """Append-only log of every netted TargetPosition size.
+
+    TargetPosition holds only the current targets, so the hot read path
+    never touches this table. Range queries over time use the composite
+    (security, exchange, netted_at) index, and on Postgres a BRIN index on
+    netted_at, which stays tiny because rows arrive in time order.
+
+    Fields:
+        security (Security): The security to be traded
+        exchange (Exchange): Exchange the security should be traded on
+        size (float): Size in tradeable units (e.g. shares).
+        netted_at (datetime): When the netting pass ran.
+    """
+
+    # the composite index leads with security, so no separate one
+    security = models.ForeignKey("Security", on_delete=models.CASCADE, db_index=False)
+    exchange = models.ForeignKey("Exchange", on_delete=models.CASCADE)
+    size = models.FloatField(help_text="how many units of the security")
+    netted_at = models.DateTimeField(default=timezone.now)
+
+    objects = TargetPositionHistoryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["security", "exchange", "netted_at"]),
+        ]
+        verbose_name_plural = "target position history"
+
+    def __str__(self):
+        return json.dumps(
+            {
+                "security": self.security.name,
+                "exchange": self.exchange.name,
+                "size": self.size,
+                "netted_at": self.netted_at.isoformat(),
+            }
+        )
@@ -0,0 +1,106 @@
+"""The scheduled rebalance: fetch every strategy's weights, net, execute.
+
+Each Strategy's `command` (a management command such as rw_yolo) is run
+with --no-net, all of them in parallel. Once they have all finished, or
+their timeout has passed, every security with a request not netted yet is
+netted in one pass and the resulting TargetPositions executed in one pass.
+If there are no such requests, there's nothing to net or execute.
+"""
+
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.core.management import call_command
+from django.db import connection
+
+from execution.models import Order
+from sizing.models import (
+    Security,
+    Strategy,
+    StrategyPositionRequest,
+    TargetPosition,
+)
+from wagmi import tracing
+
+logger = logging.getLogger("sizing")
+
+PipelineResult = namedtuple(
+    "PipelineResult", ["fetched", "failed", "target_positions", "orders"]
+)
+
+
+def _fetch(strategy):
+    try:
+        with tracing.span(f"pipeline.fetch.{strategy.name}"):
+            call_command(strategy.command, "--no-net")
+    finally:
+        connection.close()  # this thread's connection
+
+
+def run_pipeline(job_timeout: float, deadline: float, clock=time.monotonic):
+    """Run one rebalance.
+
+    A command that times out is left running on its own thread (Python
+    can't kill it). Whatever it stores after the deadline isn't marked
+    netted, so the next run nets it.
+
+    Args:
+        job_timeout (float): seconds each strategy's command may take
+        deadline (float): seconds after which netting starts regardless
+
+    Returns:
+        PipelineResult: strategies fetched and failed (or timed out), the
+            netted TargetPositions and the execution's OrderResults.
+    """
+    strategies = list(Strategy.objects.exclude(command=""))
+    if not strategies:
+        return PipelineResult([], [], [], [])
+
+    with tracing.run("pipeline"):
+        start = clock()
+        fetched, failed = [], []
+        pool = ThreadPoolExecutor(max_workers=len(strategies))
+        futures = [(pool.submit(_fetch, s), s) for s in strategies]
+        for future, strategy in futures:
+            timeout = min(job_timeout, deadline) - (clock() - start)
+            try:
+                future.result(timeout=max(0.0, timeout))
+                fetched.append(strategy)
+            except TimeoutError:
+                logger.error(f"{strategy} {strategy.command} timed out")
+                failed.append(strategy)
+            except Exception as e:
+                logger.error(f"{strategy} {strategy.command} failed: {e}")
+                failed.append(strategy)
+        pool.shutdown(wait=False)  # don't wait on commands that timed out
+
+        if not fetched:
+            logger.error("no strategy fetched its weights")
+
+        # (security id, its strategy executes immediately) of each request
+        # not netted yet, including those stored after an earlier deadline
+        pending = list(
+            StrategyPositionRequest.objects.filter(netted=False).values_list(
+                "security_id", "strategy__execute_immediately"
+            )
+        )
+        if not pending:
+            logger.info("no strategy has new weights, nothing to net")
+            return PipelineResult(fetched, failed, [], [])
+
+        target_positions = TargetPosition.objects.create_new_desired_positions(
+            security=Security.objects.filter(id__in={s for s, _ in pending})
+        )
+
+        securities = {s for s, immediately in pending if immediately}
+        to_execute = [tp for tp in target_positions if tp.security_id in securities]
+        orders = Order.objects.create_orders(to_execute) if to_execute else []
+
+        logger.info(
+            f"pipeline fetched {len(fetched)} strategies ({len(failed)} failed, "
+            f"{len(pending)} new requests), "
+            f"netted {len(target_positions)} and executed {len(to_execute)} targets"
+        )
+        return PipelineResult(fetched, failed, target_positions, orders)
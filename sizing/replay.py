@@ -0,0 +1,139 @@
+"""Replay historical weights through the netting pipeline in memory.
+
+A payload is one Strategy's weights at one point in time, in the shape
+the weights runners receive them:
+
+    {"strategy": "yolo", "exchange": "ftx", "last_updated": 1637798400,
+     "data": [{"ticker": "BTC/USD", "combo_weight": 0.1, "arrival_price": 50000}]}
+
+("calculated_at" and "positions" of security_name/weight/arrival_price_usd
+are accepted too.) As with StrategyPositionRequest.objects.set_positions, a
+payload replaces all of its Strategy's earlier requests, and it stays in
+force until that Strategy's next payload. Target sizes are netted across
+strategies with the same position_size formula TargetPositionManager uses,
+but as a handful of pandas operations over the whole history rather than
+database round trips per day.
+"""
+
+import json
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from sizing.models import Strategy, position_size
+
+COLUMNS = [
+    "calculated_at",
+    "strategy",
+    "exchange",
+    "security",
+    "weight",
+    "arrival_price_usd",
+]
+
+
+def _calculated_at(payload):
+    if payload.get("last_updated") is not None:
+        return datetime.fromtimestamp(payload["last_updated"], timezone.utc)
+    return pd.Timestamp(payload["calculated_at"]).to_pydatetime()
+
+
+def payloads_to_frame(payloads):
+    """Flatten payloads into one row per requested position.
+
+    Returns:
+        pd.DataFrame: calculated_at, strategy, exchange, security, weight
+            and arrival_price_usd columns.
+    """
+    rows = []
+    for payload in payloads:
+        head = (
+            _calculated_at(payload),
+            payload["strategy"],
+            payload.get("exchange", "ftx"),
+        )
+        for position in payload.get("positions", ()):
+            rows.append(
+                head
+                + (
+                    position["security_name"],
+                    position["weight"],
+                    position["arrival_price_usd"],
+                )
+            )
+        for position in payload.get("data", ()):
+            rows.append(
+                head
+                + (
+                    position["ticker"],
+                    position["combo_weight"],
+                    position["arrival_price"],
+                )
+            )
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+    frame["calculated_at"] = pd.to_datetime(frame["calculated_at"], utc=True)
+    return frame
+
+
+def load_jsonl(path):
+    """Payloads from a file with one JSON payload per line."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def strategy_sizes():
+    """{strategy name: max_position_size_usd} from the database, one query."""
+    return {
+        name: float(size)
+        for name, size in Strategy.objects.values_list("name", "max_position_size_usd")
+    }
+
+
+def replay(requests, max_position_size_usd=None):
+    """Target position sizes after every payload.
+
+    Args:
+        requests (pd.DataFrame): as returned by payloads_to_frame()
+        max_position_size_usd (dict, optional): {strategy name: size}, e.g.
+            to try an allocation change. Defaults to strategy_sizes().
+
+    Returns:
+        pd.DataFrame: indexed by calculated_at, one column per
+            (exchange, security), holding the netted target size.
+
+    Raises:
+        ValueError: if a payload's strategy has no size to replay it with.
+    """
+    if max_position_size_usd is None:
+        max_position_size_usd = strategy_sizes()
+    if requests.empty:
+        return pd.DataFrame()
+    unknown = sorted(set(requests["strategy"]) - set(max_position_size_usd))
+    if unknown:
+        raise ValueError(f"no max_position_size_usd for strategies {unknown}")
+
+    sizes = requests.assign(
+        size=position_size(
+            requests["weight"],
+            requests["strategy"].map(max_position_size_usd),
+            requests["arrival_price_usd"],
+        )
+    )
+    # one row per payload; securities a payload leaves out are zeroed
+    by_payload = sizes.pivot_table(
+        index=["strategy", "calculated_at"],
+        columns=["exchange", "security"],
+        values="size",
+        aggfunc="sum",
+        fill_value=0.0,
+    )
+    # each Strategy's latest payload stays in force until its next one
+    by_strategy = by_payload.unstack("strategy").sort_index().ffill().fillna(0.0)
+    targets = by_strategy.T.groupby(level=["exchange", "security"]).sum().T
+    targets.columns = targets.columns.remove_unused_levels()
+    return targets
+
+
+def trades(targets):
+    """Units traded to move from one set of targets to the next."""
+    return targets.diff().fillna(targets)
@@ -1,3 +1,517 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import management
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from execution.models import Order
+from sizing import pipeline, replay
+from sizing.models import (
+    Exchange,
+    Security,
+    Strategy,
+    StrategyPositionRequest,
+    TargetPosition,
+    TargetPositionHistory,
+)
+
+calculated_at = datetime(2021, 11, 25, tzinfo=timezone.utc)
+
+
+class TargetPositionManagerTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        self.ftx = Exchange.objects.get(name="ftx")
+        self.yolo = Strategy.objects.get(name="yolo")
+        self.other = Strategy.objects.create(
+            name="other",
+            exchange=self.ftx,
+            max_position_size_usd=500,
+            url="http://localhost:8000/weights/other",
+            command="other",
+        )
+
+    def _request(self, strategy, security_name, weight, arrival_price_usd):
+        security, _ = Security.objects.get_or_create(name=security_name)
+        return StrategyPositionRequest.objects.create(
+            strategy=strategy,
+            exchange=self.ftx,
+            security=security,
+            weight=weight,
+            arrival_price_usd=arrival_price_usd,
+            calculated_at=calculated_at,
+        )
+
+    def _universe(self, size):
+        for i in range(size):
+            self._request(self.yolo, f"COIN{i}/USD", 0.01, 10.0)
+            self._request(self.other, f"COIN{i}/USD", -0.01, 10.0)
+
+    def test_nets_strategies(self) -> None:
+        self._request(self.yolo, "ETH/USD", 0.1, 4000.0)
+        self._request(self.other, "ETH/USD", -0.1, 4000.0)
+        self._request(self.yolo, "BTC/USD", 0.5, 50000.0)
+
+        TargetPosition.objects.create_new_desired_positions()
+
+        sizes = {
+            tp.security.name: tp.size
+            for tp in TargetPosition.objects.select_related("security")
+        }
+        self.assertAlmostEqual(sizes["ETH/USD"], (100.0 - 50.0) / 4000.0)
+        self.assertAlmostEqual(sizes["BTC/USD"], 500.0 / 50000.0)
+
+    def test_updates_existing_targets(self) -> None:
+        spr = self._request(self.yolo, "ETH/USD", 0.1, 4000.0)
+        TargetPosition.objects.create_new_desired_positions()
+
+        spr.weight = 0.2
+        spr.save()
+        TargetPosition.objects.create_new_desired_positions(security=spr.security)
+
+        self.assertEqual(TargetPosition.objects.count(), 1)
+        self.assertAlmostEqual(TargetPosition.objects.get().size, 200.0 / 4000.0)
+
+    def test_query_count_is_independent_of_universe_size(self) -> None:
+        self._universe(3)
+        # each pass also marks the requests netted and appends one history insert
+        with self.assertNumQueries(8):  # insert only
+            TargetPosition.objects.create_new_desired_positions()
+        with self.assertNumQueries(8):  # update only
+            TargetPosition.objects.create_new_desired_positions()
+
+        self._universe(30)
+        with self.assertNumQueries(9):  # update and insert
+            TargetPosition.objects.create_new_desired_positions()
+
+    def test_netting_appends_history(self) -> None:
+        self._request(self.yolo, "ETH/USD", 0.1, 4000.0)
+        TargetPosition.objects.create_new_desired_positions()
+        self._request(self.other, "ETH/USD", -0.1, 4000.0)
+        TargetPosition.objects.create_new_desired_positions()
+
+        self.assertEqual(TargetPosition.objects.count(), 1)
+        history = TargetPositionHistory.objects.order_by("netted_at", "id")
+        self.assertEqual(len(history), 2)
+        for h, size in zip(history, [0.025, 0.0125]):
+            self.assertAlmostEqual(h.size, size)
+
+
+class AdminTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "admin")
+        )
+        cache.clear()
+
+    def _universe(self, size):
+        yolo = Strategy.objects.get(name="yolo")
+        StrategyPositionRequest.objects.set_positions(
+            strategy_name="yolo",
+            exchange_name="ftx",
+            positions=[
+                {
+                    "security_name": f"COIN{i}/USD",
+                    "weight": 0.01 * (i - size / 2),
+                    "arrival_price_usd": 10.0,
+                }
+                for i in range(size)
+            ],
+            calculated_at=calculated_at,
+        )
+        TargetPosition.objects.create_new_desired_positions()
+        return yolo
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_changelists_dont_query_per_row(self) -> None:
+        for model in (
+            "strategypositionrequest",
+            "targetposition",
+            "targetpositionhistory",
+        ):
+            url = reverse(f"admin:sizing_{model}_changelist")
+            self._universe(3)
+            cache.clear()
+            _, few = self._queries(url)
+            self._universe(40)
+            cache.clear()
+            _, many = self._queries(url)
+            self.assertEqual(few, many, model)
+
+    def test_summary_and_cached_count(self) -> None:
+        self._universe(10)
+        url = reverse("admin:sizing_targetposition_changelist")
+
+        response, first = self._queries(url)
+        self.assertEqual(
+            response.context["summary"],
+            {"targets": 10, "long": 4, "short": 5, "flat": 1},
+        )
+        self.assertContains(response, "Summary of target positions")
+        _, second = self._queries(url)
+        self.assertEqual(second, first - 1)  # the count came from the cache
+
+        response, _ = self._queries(url + "?q=COIN1")
+        self.assertEqual(response.context["summary"]["targets"], 1)
+
+    def test_history_is_read_only(self) -> None:
+        self._universe(3)
+        history = TargetPositionHistory.objects.first()
+
+        response, _ = self._queries(
+            reverse("admin:sizing_targetpositionhistory_changelist")
+        )
+        self.assertIsNone(response.context["action_form"])  # no bulk delete
+        # served by the primary key, not a sort of the whole table
+        self.assertEqual(
+            set(response.context["cl"].result_list.query.order_by), {"-id"}
+        )
+        response = self.client.post(
+            reverse("admin:sizing_targetpositionhistory_delete", args=[history.id]),
+            {"post": "yes"},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(TargetPositionHistory.objects.filter(id=history.id).exists())
+
+
+class TargetPositionHistoryTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        self.ftx = Exchange.objects.get(name="ftx")
+        self.btc = Security.objects.create(name="BTC/USD")
+        self.now = datetime(2021, 12, 31, tzinfo=timezone.utc)
+        # four nettings a day for 60 days
+        TargetPositionHistory.objects.bulk_create(
+            [
+                TargetPositionHistory(
+                    security=self.btc,
+                    exchange=self.ftx,
+                    size=day + hour / 100,
+                    netted_at=self.now - timedelta(days=day) + timedelta(hours=hour),
+                )
+                for day in range(60, 0, -1)
+                for hour in (0, 3, 6, 9)
+            ]
+        )
+
+    def test_compact_keeps_the_last_row_of_old_days(self) -> None:
+        deleted = TargetPositionHistory.objects.compact(
+            full_resolution_days=30, now=self.now
+        )
+
+        self.assertEqual(deleted, 30 * 3)
+        old = TargetPositionHistory.objects.filter(
+            netted_at__lt=self.now - timedelta(days=30)
+        )
+        self.assertEqual(old.count(), 30)
+        self.assertTrue(all(h.netted_at.hour == 9 for h in old))
+        self.assertEqual(
+            TargetPositionHistory.objects.filter(
+                netted_at__gte=self.now - timedelta(days=30)
+            ).count(),
+            30 * 4,
+        )
+
+    def test_compact_drops_expired_rows(self) -> None:
+        deleted = TargetPositionHistory.objects.compact(
+            full_resolution_days=60, retention_days=45, now=self.now
+        )
+
+        self.assertEqual(deleted, 15 * 4)
+        oldest = TargetPositionHistory.objects.order_by("netted_at").first()
+        self.assertEqual(oldest.netted_at, self.now - timedelta(days=45))
+
+
+class StrategyPositionRequestManagerTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+
+    def _payload(self, names, weight):
+        return [
+            {"security_name": name, "weight": weight, "arrival_price_usd": 10.0}
+            for name in names
+        ]
+
+    def test_set_positions_upserts_and_zeroes_stale(self) -> None:
+        StrategyPositionRequest.objects.set_positions(
+            "yolo", "ftx", self._payload(["ETH/USD", "BTC/USD"], 0.1), calculated_at
+        )
+        later = calculated_at.replace(day=26)
+        touched = StrategyPositionRequest.objects.set_positions(
+            "yolo", "ftx", self._payload(["ETH/USD", "SOL/USD"], 0.2), later
+        )
+
+        self.assertEqual(
+            sorted(touched.values_list("name", flat=True)),
+            ["BTC/USD", "ETH/USD", "SOL/USD"],
+        )
+        weights = {
+            spr.security.name: spr.weight
+            for spr in StrategyPositionRequest.objects.select_related("security")
+        }
+        self.assertEqual(weights, {"ETH/USD": 0.2, "BTC/USD": 0.0, "SOL/USD": 0.2})
+
+    def test_set_positions_rejects_duplicate_securities(self) -> None:
+        with self.assertRaisesRegex(ValueError, "ETH/USD"):
+            StrategyPositionRequest.objects.set_positions(
+                "yolo",
+                "ftx",
+                self._payload(["ETH/USD", "BTC/USD", "ETH/USD"], 0.1),
+                calculated_at,
+            )
+        self.assertFalse(StrategyPositionRequest.objects.exists())
+
+    def test_set_positions_query_count_is_independent_of_payload_size(self) -> None:
+        names = [f"COIN{i}/USD" for i in range(50)]
+        StrategyPositionRequest.objects.set_positions(
+            "yolo", "ftx", self._payload(names[:5], 0.1), calculated_at
+        )
+        later = calculated_at.replace(day=26)
+        with self.assertNumQueries(11):
+            StrategyPositionRequest.objects.set_positions(
+                "yolo", "ftx", self._payload(names, 0.2), later
+            )
+
+
+class ReplayTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        Strategy.objects.create(
+            name="other",
+            exchange=Exchange.objects.get(name="ftx"),
+            max_position_size_usd=500,
+            url="http://localhost:8000/weights/other",
+            command="other",
+        )
+        day = 86400
+        start = int(calculated_at.timestamp())
+
+        def payload(strategy, days, data):
+            return {
+                "strategy": strategy,
+                "exchange": "ftx",
+                "last_updated": start + days * day,
+                "data": [
+                    {"ticker": t, "combo_weight": w, "arrival_price": p}
+                    for t, w, p in data
+                ],
+            }
+
+        self.payloads = [
+            payload("yolo", 0, [("ETH/USD", 0.1, 4000.0), ("BTC/USD", 0.2, 50000.0)]),
+            payload("other", 0, [("ETH/USD", -0.1, 4000.0)]),
+            payload("yolo", 1, [("ETH/USD", 0.3, 4100.0), ("SOL/USD", 0.1, 200.0)]),
+            payload("other", 2, [("BTC/USD", 0.4, 51000.0)]),
+        ]
+
+    def test_matches_database_netting(self) -> None:
+        targets = replay.replay(replay.payloads_to_frame(self.payloads))
+
+        for i, payload in enumerate(self.payloads):
+            at = replay.payloads_to_frame([payload])["calculated_at"][0]
+            StrategyPositionRequest.objects.set_positions(
+                payload["strategy"],
+                "ftx",
+                [
+                    {
+                        "security_name": p["ticker"],
+                        "weight": p["combo_weight"],
+                        "arrival_price_usd": p["arrival_price"],
+                    }
+                    for p in payload["data"]
+                ],
+                at,
+            )
+            later = self.payloads[i + 1 :]
+            if later and later[0]["last_updated"] == payload["last_updated"]:
+                continue  # net once every payload at this time is in
+            TargetPosition.objects.create_new_desired_positions()
+            expected = {
+                tp.security.name: tp.size
+                for tp in TargetPosition.objects.select_related("security")
+            }
+            for name, size in expected.items():
+                self.assertAlmostEqual(targets.loc[at][("ftx", name)], size)
+
+        self.assertEqual(len(targets), 3)  # payloads at the same time net together
+        self.assertAlmostEqual(targets.iloc[-1][("ftx", "ETH/USD")], 300.0 / 4100.0)
+        self.assertAlmostEqual(targets.iloc[-1][("ftx", "BTC/USD")], 200.0 / 51000.0)
+
+    def test_allocation_override_and_trades(self) -> None:
+        targets = replay.replay(
+            replay.payloads_to_frame(self.payloads), {"yolo": 2000.0, "other": 0.0}
+        )
+        traded = replay.trades(targets)
+
+        self.assertAlmostEqual(targets.iloc[0][("ftx", "ETH/USD")], 200.0 / 4000.0)
+        self.assertAlmostEqual(traded.iloc[0][("ftx", "ETH/USD")], 200.0 / 4000.0)
+        self.assertAlmostEqual(traded.iloc[1][("ftx", "BTC/USD")], -400.0 / 50000.0)
+
+    def test_unknown_strategy_is_an_error(self) -> None:
+        with self.assertRaisesRegex(ValueError, "other"):
+            replay.replay(replay.payloads_to_frame(self.payloads), {"yolo": 2000.0})
+
+
+class PipelineTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        self.ftx = Exchange.objects.get(name="ftx")
+        Strategy.objects.filter(name="yolo").update(execute_immediately=True)
+        for name in ("other", "broken", "slow"):
+            Strategy.objects.create(
+                name=name,
+                exchange=self.ftx,
+                url=f"http://localhost:8000/weights/{name}",
+                command=f"rw_{name}",
+            )
+        for name, security in (
+            ("yolo", "BTC/USD"),
+            ("other", "ETH/USD"),
+            ("slow", "SOL/USD"),
+        ):
+            StrategyPositionRequest.objects.create(
+                strategy=Strategy.objects.get(name=name),
+                exchange=self.ftx,
+                security=Security.objects.get_or_create(name=security)[0],
+                weight=0.1,
+                arrival_price_usd=100.0,
+                calculated_at=calculated_at,
+                netted=True,
+            )
+        self.release = threading.Event()
+        self.commands = []
+
+    def tearDown(self) -> None:
+        self.release.set()
+
+    def fake_command(self, name, *args):
+        # stands in for the weights commands; runs on the pipeline's threads
+        self.commands.append((name,) + args)
+        if name == "rw_broken":
+            raise ValueError("bad payload")
+        if name == "rw_slow":
+            self.release.wait(5)
+
+    def new_weights(self, *names):
+        # as if the strategies' commands had stored new weights
+        StrategyPositionRequest.objects.filter(strategy__name__in=names).update(
+            netted=False
+        )
+
+    def test_nets_once_and_executes_immediate_strategies(self) -> None:
+        self.new_weights("yolo", "other")
+        with mock.patch.object(
+            pipeline, "call_command", side_effect=self.fake_command
+        ), mock.patch.object(
+            TargetPosition.objects,
+            "create_new_desired_positions",
+            wraps=TargetPosition.objects.create_new_desired_positions,
+        ) as net, mock.patch.object(
+            Order.objects, "create_orders", return_value=["order"]
+        ) as execute:
+            result = pipeline.run_pipeline(job_timeout=0.2, deadline=10.0)
+
+        self.assertEqual(
+            sorted(self.commands),
+            [
+                (f"rw_{name}", "--no-net")
+                for name in ("broken", "other", "slow", "yolo")
+            ],
+        )
+        self.assertEqual(sorted(s.name for s in result.fetched), ["other", "yolo"])
+        self.assertEqual(sorted(s.name for s in result.failed), ["broken", "slow"])
+        net.assert_called_once()
+        # slow's SOL/USD request wasn't netted, its command didn't finish
+        self.assertEqual(
+            sorted(tp.security.name for tp in result.target_positions),
+            ["BTC/USD", "ETH/USD"],
+        )
+        # only yolo executes immediately
+        (executed,), _ = execute.call_args
+        self.assertEqual([tp.security.name for tp in executed], ["BTC/USD"])
+        self.assertEqual(result.orders, ["order"])
+        self.assertFalse(
+            StrategyPositionRequest.objects.filter(
+                strategy__name__in=["yolo", "other"], netted=False
+            ).exists()
+        )
+
+    def test_weights_stored_after_the_deadline_are_netted_next_run(self) -> None:
+        self.new_weights("yolo")
+        with mock.patch.object(
+            pipeline, "call_command", side_effect=self.fake_command
+        ), mock.patch.object(Order.objects, "create_orders", return_value=[]):
+            first = pipeline.run_pipeline(job_timeout=0.2, deadline=10.0)
+            # slow's command stores its weights after it timed out
+            self.new_weights("slow")
+            self.release.set()
+            second = pipeline.run_pipeline(job_timeout=0.2, deadline=10.0)
+
+        self.assertIn("slow", [s.name for s in first.failed])
+        self.assertEqual(
+            [tp.security.name for tp in first.target_positions], ["BTC/USD"]
+        )
+        self.assertEqual(
+            [tp.security.name for tp in second.target_positions], ["SOL/USD"]
+        )
+
+    def test_unchanged_weights_skip_netting(self) -> None:
+        with mock.patch.object(
+            pipeline, "call_command", side_effect=self.fake_command
+        ), mock.patch.object(Order.objects, "create_orders") as execute:
+            result = pipeline.run_pipeline(job_timeout=0.2, deadline=10.0)
+
+        self.assertEqual(len(result.fetched), 2)
+        self.assertEqual(result.target_positions, [])
+        execute.assert_not_called()
+        self.assertFalse(TargetPosition.objects.exists())
+
+    def test_nothing_fetched_nets_nothing(self) -> None:
+        Strategy.objects.exclude(name="broken").delete()
+        with mock.patch.object(
+            pipeline, "call_command", side_effect=self.fake_command
+        ), mock.patch.object(Order.objects, "create_orders") as execute:
+            result = pipeline.run_pipeline(job_timeout=1.0, deadline=1.0)
 
-# Create your tests here.
+        self.assertEqual(result.target_positions, [])
+        execute.assert_not_called()
+        self.assertFalse(TargetPosition.objects.exists())
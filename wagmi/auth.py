@@ -0,0 +1,37 @@
+"""Who may read the JSON API and the metrics.
+
+The admin's staff users, through their session, or anything presenting
+WAGMI_API_TOKEN as a bearer token, e.g. a Prometheus scraper.
+"""
+
+import functools
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+def _has_token(request):
+    token = settings.WAGMI_API_TOKEN
+    scheme, _, presented = request.headers.get("Authorization", "").partition(" ")
+    return (
+        bool(token)
+        and scheme.lower() == "bearer"
+        and hmac.compare_digest(presented.encode("utf-8"), token.encode("utf-8"))
+    )
+
+
+def staff_or_token_required(view):
+    """Answer 401, rather than redirect to the admin's login page, unless
+    the request is from a staff user or has the API token."""
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        # the token first: checking it doesn't load a session
+        if _has_token(request) or (request.user.is_active and request.user.is_staff):
+            return view(request, *args, **kwargs)
+        response = HttpResponse("authentication required", status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="wagmi"'
+        return response
+
+    return wrapped
@@ -22,6 +22,40 @@ env = environ.Env(
     # set casting, default value
     DEBUG=(bool, False),
     WAGMI_ORDER_TESTMODE=(bool, True),
+    WAGMI_ACCOUNT_SNAPSHOT_MAX_AGE=(float, 30.0),
+    WAGMI_MARKET_METADATA_TTL=(float, 3600.0),
+    WAGMI_QUOTE_TTL=(float, 1.0),
+    WAGMI_ORDER_WORKERS=(int, 4),
+    WAGMI_FTX_RATE_LIMIT=(float, 30.0),
+    WAGMI_FTX_BASE_URL=(str, ""),
+    WAGMI_METRICS_PORT=(int, 0),
+    WAGMI_METRICS_HOST=(str, "127.0.0.1"),
+    WAGMI_MARKET_DATA_FEED=(str, ""),
+    WAGMI_MARKET_DATA_MAX_AGE=(float, 2.0),
+    WAGMI_SLICE_ABOVE_USD=(float, 0.0),
+    WAGMI_SLICE_HORIZON=(float, 3600.0),
+    WAGMI_SLICE_INTERVAL=(float, 300.0),
+    WAGMI_SLICE_PARTICIPATION=(float, 0.0),
+    WAGMI_DEPTH_MODEL=(bool, False),
+    WAGMI_ORDERBOOK_TTL=(float, 1.0),
+    WAGMI_SWEEP_MAX_BPS=(float, 2.0),
+    WAGMI_MAX_SLIPPAGE_BPS=(float, 50.0),
+    WAGMI_REPRICE_TIMEOUT=(float, 0.0),
+    WAGMI_REPRICE_INTERVAL=(float, 5.0),
+    WAGMI_NO_TRADE_USD=(float, 0.0),
+    WAGMI_NO_TRADE_PCT=(float, 0.0),
+    WAGMI_NO_TRADE_HYSTERESIS=(float, 0.0),
+    WAGMI_TARGET_HISTORY_FULL_DAYS=(int, 30),
+    WAGMI_TARGET_HISTORY_RETENTION_DAYS=(int, 0),
+    WAGMI_CACHE_URL=(str, "locmemcache://wagmi"),
+    WAGMI_SHARED_EXCHANGE_CACHE=(bool, False),
+    WAGMI_API_CACHE_TTL=(float, 30.0),
+    WAGMI_API_TOKEN=(str, ""),
+    WAGMI_WEIGHTS_TIMEOUT=(float, 10.0),
+    WAGMI_WEIGHTS_RETRIES=(int, 3),
+    WAGMI_PIPELINE_CRON=(str, "5 * * * *"),
+    WAGMI_PIPELINE_JOB_TIMEOUT=(float, 120.0),
+    WAGMI_PIPELINE_DEADLINE=(float, 300.0),
 )
 # reading .env file
 environ.Env.read_env()
@@ -48,6 +82,72 @@ WAGMI_FTX_SUB_ACCOUNT = env("WAGMI_FTX_SUB_ACCOUNT")
 WAGMI_ORDER_TESTMODE = env("WAGMI_ORDER_TESTMODE")
 WAGMI_FTX_API_KEY = env("WAGMI_FTX_API_KEY")
 WAGMI_FTX_API_SECRET = env("WAGMI_FTX_API_SECRET")
+# seconds an account snapshot (balances, positions, open orders) may be reused
+WAGMI_ACCOUNT_SNAPSHOT_MAX_AGE = env("WAGMI_ACCOUNT_SNAPSHOT_MAX_AGE")
+# seconds market increments/min sizes, and quotes, are cached for
+WAGMI_MARKET_METADATA_TTL = env("WAGMI_MARKET_METADATA_TTL")
+WAGMI_QUOTE_TTL = env("WAGMI_QUOTE_TTL")
+# threads placing orders concurrently, sharing one limit of ftx calls per second
+WAGMI_ORDER_WORKERS = env("WAGMI_ORDER_WORKERS")
+WAGMI_FTX_RATE_LIMIT = env("WAGMI_FTX_RATE_LIMIT")
+# talk to another ftx api, e.g. a local FakeFTXServer, instead of ftx.com
+WAGMI_FTX_BASE_URL = env("WAGMI_FTX_BASE_URL")
+# the web server has /metrics, runapscheduler serves them on this port (0 = don't)
+# without authentication, on WAGMI_METRICS_HOST ("" = every interface)
+WAGMI_METRICS_PORT = env("WAGMI_METRICS_PORT")
+WAGMI_METRICS_HOST = env("WAGMI_METRICS_HOST")
+# "ftx" prices orders from the streaming ticker (needs websocket-client),
+# falling back to REST quotes older than WAGMI_MARKET_DATA_MAX_AGE seconds
+WAGMI_MARKET_DATA_FEED = env("WAGMI_MARKET_DATA_FEED")
+WAGMI_MARKET_DATA_MAX_AGE = env("WAGMI_MARKET_DATA_MAX_AGE")
+# deltas worth at least WAGMI_SLICE_ABOVE_USD (0 = never) are sent as a child
+# order every WAGMI_SLICE_INTERVAL seconds over WAGMI_SLICE_HORIZON, evenly, or
+# capped at WAGMI_SLICE_PARTICIPATION (e.g. 0.05) of hourly volume if set
+WAGMI_SLICE_ABOVE_USD = env("WAGMI_SLICE_ABOVE_USD")
+WAGMI_SLICE_HORIZON = env("WAGMI_SLICE_HORIZON")
+WAGMI_SLICE_INTERVAL = env("WAGMI_SLICE_INTERVAL")
+WAGMI_SLICE_PARTICIPATION = env("WAGMI_SLICE_PARTICIPATION")
+# price and size orders from order book depth: cross the book when that costs
+# at most WAGMI_SWEEP_MAX_BPS beyond the mid, and cap each order at what the
+# book absorbs within WAGMI_MAX_SLIPPAGE_BPS. Books are cached for WAGMI_ORDERBOOK_TTL
+WAGMI_DEPTH_MODEL = env("WAGMI_DEPTH_MODEL")
+WAGMI_ORDERBOOK_TTL = env("WAGMI_ORDERBOOK_TTL")
+WAGMI_SWEEP_MAX_BPS = env("WAGMI_SWEEP_MAX_BPS")
+WAGMI_MAX_SLIPPAGE_BPS = env("WAGMI_MAX_SLIPPAGE_BPS")
+# after placing orders, reprice unfilled post-only orders every
+# WAGMI_REPRICE_INTERVAL seconds for up to WAGMI_REPRICE_TIMEOUT (0 = don't)
+WAGMI_REPRICE_TIMEOUT = env("WAGMI_REPRICE_TIMEOUT")
+WAGMI_REPRICE_INTERVAL = env("WAGMI_REPRICE_INTERVAL")
+# don't trade deltas worth less than WAGMI_NO_TRADE_USD or WAGMI_NO_TRADE_PCT
+# (e.g. 0.05) of the target, and stop WAGMI_NO_TRADE_HYSTERESIS of that band
+# short of the target when trading (0 = all the way), see execution.bands
+WAGMI_NO_TRADE_USD = env("WAGMI_NO_TRADE_USD")
+WAGMI_NO_TRADE_PCT = env("WAGMI_NO_TRADE_PCT")
+WAGMI_NO_TRADE_HYSTERESIS = env("WAGMI_NO_TRADE_HYSTERESIS")
+# every netted target is kept in TargetPositionHistory for
+# WAGMI_TARGET_HISTORY_FULL_DAYS, then one per day until
+# WAGMI_TARGET_HISTORY_RETENTION_DAYS (0 = forever)
+WAGMI_TARGET_HISTORY_FULL_DAYS = env("WAGMI_TARGET_HISTORY_FULL_DAYS")
+WAGMI_TARGET_HISTORY_RETENTION_DAYS = env("WAGMI_TARGET_HISTORY_RETENTION_DAYS")
+# market metadata and account snapshots live in the CACHES backend, so every
+# process sharing it fetches them once; only worth it with a shared WAGMI_CACHE_URL
+WAGMI_SHARED_EXCHANGE_CACHE = env("WAGMI_SHARED_EXCHANGE_CACHE")
+# /api responses are cached until netting or a fill sync changes them, and for
+# at most WAGMI_API_CACHE_TTL seconds (exchange positions move by themselves)
+WAGMI_API_CACHE_TTL = env("WAGMI_API_CACHE_TTL")
+# /api and /metrics are for staff users, or for requests with the header
+# "Authorization: Bearer <WAGMI_API_TOKEN>" (staff only if it's not set)
+WAGMI_API_TOKEN = env("WAGMI_API_TOKEN")
+# weights downloads time out after WAGMI_WEIGHTS_TIMEOUT seconds and are retried
+# WAGMI_WEIGHTS_RETRIES times
+WAGMI_WEIGHTS_TIMEOUT = env("WAGMI_WEIGHTS_TIMEOUT")
+WAGMI_WEIGHTS_RETRIES = env("WAGMI_WEIGHTS_RETRIES")
+# runapscheduler's rebalance: on WAGMI_PIPELINE_CRON run every Strategy's
+# command in parallel, each for up to WAGMI_PIPELINE_JOB_TIMEOUT seconds, then
+# net and execute once (at the latest WAGMI_PIPELINE_DEADLINE seconds in)
+WAGMI_PIPELINE_CRON = env("WAGMI_PIPELINE_CRON")
+WAGMI_PIPELINE_JOB_TIMEOUT = env("WAGMI_PIPELINE_JOB_TIMEOUT")
+WAGMI_PIPELINE_DEADLINE = env("WAGMI_PIPELINE_DEADLINE")
 
 RW_API_KEY = env("RW_API_KEY")
 RW_YOLO_TRADE_BUFFER = env("RW_YOLO_TRADE_BUFFER")
@@ -56,12 +156,11 @@ ALLOWED_HOSTS = [
     "localhost",
 ]
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "processed-messages",
-    }
-}
+# per process by default. To share it between the web server and
+# runapscheduler (exchange caches, and /api invalidation by netting), use an
+# external store such as "pymemcache://127.0.0.1:11211", not a file cache,
+# which culls keys at random (see execution.exchanges.cache.SharedTTLCache)
+CACHES = {"default": env.cache_url("WAGMI_CACHE_URL")}
 
 # Application definition
 
@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from execution.exchanges.ratelimit import RateLimitedClient, RateLimiter
+from sizing.models import Exchange
+from wagmi import tracing
+
+
+class SpanTest(TestCase):
+    def test_records_duration_errors_and_queries(self) -> None:
+        registry = tracing.Registry()
+
+        with tracing.span("sizing.stage", registry):
+            Exchange.objects.count()
+            Exchange.objects.count()
+        with self.assertRaises(ValueError):
+            with tracing.span("sizing.stage", registry):
+                raise ValueError("boom")
+
+        count, seconds, errors, queries = registry.totals()["sizing.stage"]
+        self.assertEqual((count, errors, queries), (2, 1, 2))
+        self.assertGreaterEqual(seconds, 0.0)
+
+    def test_run_summary_is_logged(self) -> None:
+        registry = tracing.Registry()
+        with self.assertLogs("wagmi", level="INFO") as logs:
+            with tracing.run("yolo", registry):
+                with tracing.span("weights.fetch", registry):
+                    pass
+        self.assertIn("run yolo took", logs.output[0])
+        self.assertIn("weights.fetch 1x", logs.output[0])
+
+
+class FakeClient:
+    def get_market(self, market):
+        return {"name": market}
+
+
+class MetricsTest(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        registry = tracing.Registry()
+        for seconds in (0.003, 0.2, 0.2, 100.0):
+            registry.record("exchange.get_market", seconds)
+
+        text = registry.render()
+
+        self.assertIn(
+            'wagmi_span_seconds_bucket{span="exchange.get_market",le="0.005"} 1', text
+        )
+        self.assertIn(
+            'wagmi_span_seconds_bucket{span="exchange.get_market",le="0.25"} 3', text
+        )
+        self.assertIn(
+            'wagmi_span_seconds_bucket{span="exchange.get_market",le="+Inf"} 4', text
+        )
+        self.assertIn('wagmi_span_seconds_count{span="exchange.get_market"} 4', text)
+
+    def test_metrics_server_is_local_by_default(self) -> None:
+        httpd = tracing.start_metrics_server(0)
+        try:
+            self.assertEqual(httpd.server_address[0], "127.0.0.1")
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+    @override_settings(WAGMI_API_TOKEN="s3cret")
+    def test_exchange_calls_are_exposed(self) -> None:
+        client = RateLimitedClient(FakeClient(), RateLimiter(100))
+        client.get_market("BTC/USD")
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'wagmi_span_seconds_count{span="exchange.get_market"}',
+            response.content.decode(),
+        )
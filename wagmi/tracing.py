@@ -0,0 +1,201 @@
+"""Spans and Prometheus style metrics for the rebalance pipeline.
+
+Wrap a stage in span() to record how long it took, whether it failed and
+how many DB queries it made:
+
+    with tracing.span("sizing.create_new_desired_positions"):
+        ...
+
+Every span feeds the process-wide REGISTRY, which render() prints in the
+Prometheus text format (served at /metrics by the web process, and by
+start_metrics_server() in the scheduler). run() logs a per-stage summary
+of everything recorded while it was open.
+"""
+
+import contextlib
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection
+
+logger = logging.getLogger("wagmi")
+
+# seconds, from a cached quote to a slow weights download
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        # counts are cumulative, as Prometheus expects
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry(object):
+    """Thread-safe per-span duration histograms and error/query counters,
+    plus free-standing counters (e.g. cache hits)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.errors = {}
+        self.queries = {}
+        self.counters = {}  # {(metric, (("label", "value"), ...)): count}
+
+    def record(self, name, seconds, error=False, queries=0):
+        with self._lock:
+            self.durations.setdefault(name, Histogram()).observe(seconds)
+            self.errors[name] = self.errors.get(name, 0) + int(error)
+            self.queries[name] = self.queries.get(name, 0) + queries
+
+    def increment(self, metric, amount=1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def totals(self):
+        """{span: (count, seconds, errors, queries)}"""
+        with self._lock:
+            return {
+                name: (h.count, h.sum, self.errors[name], self.queries[name])
+                for name, h in self.durations.items()
+            }
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP wagmi_span_seconds Time spent in each pipeline stage or exchange call.",
+            "# TYPE wagmi_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self.durations.items()):
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(
+                        f'wagmi_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'wagmi_span_seconds_bucket{{span="{name}",le="+Inf"}} {h.count}'
+                )
+                lines.append(f'wagmi_span_seconds_sum{{span="{name}"}} {h.sum}')
+                lines.append(f'wagmi_span_seconds_count{{span="{name}"}} {h.count}')
+            for metric, values, help in (
+                ("wagmi_span_errors_total", self.errors, "Spans that raised."),
+                ("wagmi_span_db_queries_total", self.queries, "DB queries per span."),
+            ):
+                lines.append(f"# HELP {metric} {help}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, value in sorted(values.items()):
+                    lines.append(f'{metric}{{span="{name}"}} {value}')
+            typed = set()
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextlib.contextmanager
+def span(name, registry=None):
+    """Time a block, counting its DB queries (on this thread) and whether
+    it raised."""
+    registry = registry or REGISTRY
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    error = False
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_query):
+            yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        registry.record(name, time.perf_counter() - start, error, queries[0])
+
+
+def traced(name):
+    """Decorator form of span()"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+@contextlib.contextmanager
+def run(name, registry=None):
+    """Log what every span recorded while this block ran, slowest first.
+
+    Spans from other threads of the process (e.g. order workers) are
+    included, so concurrent runs show up in each other's summaries.
+    """
+    registry = registry or REGISTRY
+    before = registry.totals()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        rows = []
+        for stage, (count, seconds, errors, queries) in registry.totals().items():
+            c0, s0, e0, q0 = before.get(stage, (0, 0.0, 0, 0))
+            if count > c0:
+                rows.append(
+                    (seconds - s0, stage, count - c0, errors - e0, queries - q0)
+                )
+        summary = "; ".join(
+            f"{stage} {count}x {seconds:.3f}s {errors} errors {queries} queries"
+            for seconds, stage, count, errors, queries in sorted(rows, reverse=True)
+        )
+        logger.info(f"run {name} took {elapsed:.3f}s: {summary}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics from a background thread, for processes without the
+    Django web server (e.g. runapscheduler).
+
+    There's no authentication, so by default only this host can connect.
+    """
+    httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    logger.info(f"serving metrics on {host}:{port}")
+    return httpd
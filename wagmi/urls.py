@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from wagmi import views
+
 admin.site.site_header = "W.A.G.M.I. - systematic trade execution"
 
 urlpatterns = [
     path("wagmi/", admin.site.urls),
+    path("metrics", views.metrics),
+    path("api/", include("execution.urls")),
 ]
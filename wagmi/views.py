@@ -0,0 +1,12 @@
+from django.http import HttpResponse
+
+from wagmi import tracing
+from wagmi.auth import staff_or_token_required
+
+
+@staff_or_token_required
+def metrics(request):
+    """Span durations, errors and DB queries of this process, for Prometheus."""
+    return HttpResponse(
+        tracing.REGISTRY.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,111 @@
+"""Fetch Strategy weights over pooled, retried, conditional HTTP requests.
+
+One WeightsFetcher (FETCHER) is shared by every weights command in the
+process, so the scheduler's pipeline, which runs them on parallel threads,
+reuses keep-alive connections instead of opening one per request. The
+ETag and Last-Modified of each url's last payload are sent back as
+If-None-Match and If-Modified-Since, and a 304 is reported as None: an
+unchanged signal costs one empty response.
+
+Secrets such as an api_key belong in `params`, not in the url: the url is
+what gets logged, and what errors are reported against.
+"""
+
+import logging
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("wagmi")
+
+
+class WeightsFetcher(object):
+    """Thread-safe GETs of weights payloads.
+
+    Args:
+        timeout (float): seconds to connect and to wait for each read
+        retries (int): retries of connection errors and 429/5xx responses,
+            with exponential backoff
+        pool_size (int): keep-alive connections kept per host
+        session (requests.Session, optional): e.g. for tests
+    """
+
+    def __init__(self, timeout=10.0, retries=3, pool_size=10, session=None) -> None:
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            ),
+        )
+        for prefix in ("https://", "http://"):
+            self.session.mount(prefix, adapter)
+        self._lock = threading.Lock()
+        self.validators = {}  # {url: (etag, last_modified)}
+        self.stats = {"fetched": 0, "not_modified": 0}
+
+    def fetch(self, url, params=None):
+        """GET a payload, unless it hasn't changed since the last fetch.
+
+        Args:
+            url (str): without a query string, which would be logged
+            params (dict, optional): query parameters, e.g. an api_key
+
+        Returns:
+            dict: the decoded JSON payload, or None if the server says it's
+                not modified.
+        Raises:
+            requests.RequestException: after the retries are used up, with
+                a message that doesn't include `params`
+        """
+        with self._lock:
+            etag, last_modified = self.validators.get(url, (None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            resp = self.session.get(
+                url, params=params, headers=headers, timeout=self.timeout
+            )
+            if resp.status_code == 304:
+                logger.info(f"{url} not modified")
+                with self._lock:
+                    self.stats["not_modified"] += 1
+                return None
+            resp.raise_for_status()
+            payload = resp.json()
+        except requests.RequestException as e:
+            # requests' own messages quote the full url, params and all
+            raise requests.RequestException(
+                f"GET {url} failed: {type(e).__name__}", response=e.response
+            ) from None
+
+        with self._lock:
+            self.stats["fetched"] += 1
+            self.validators[url] = (
+                resp.headers.get("ETag"),
+                resp.headers.get("Last-Modified"),
+            )
+        return payload
+
+    def forget(self, url):
+        """Drop a url's validators so the next fetch gets the full payload,
+        e.g. when it couldn't be stored."""
+        with self._lock:
+            self.validators.pop(url, None)
+
+
+FETCHER = WeightsFetcher(
+    timeout=settings.WAGMI_WEIGHTS_TIMEOUT, retries=settings.WAGMI_WEIGHTS_RETRIES
+)
@@ -12,5 +12,12 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = "Runs YOLO"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-net",
+            action="store_true",
+            help="only store the weights, netting is left to the caller",
+        )
+
     def handle(self, *args, **options):
-        get_yolo_weights()
+        get_yolo_weights(net=not options["no_net"])
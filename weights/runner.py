@@ -3,54 +3,76 @@ from datetime import datetime
 
 from django.utils import timezone
 
-import requests
 from django.conf import settings
 
 from sizing.models import Strategy, StrategyPositionRequest, TargetPosition
+from wagmi import tracing
+from weights.fetcher import FETCHER
 
 strategy = Strategy.objects.get(name="yolo")
 
 logger = logging.getLogger(strategy.name)
 
-url = f"{strategy.url}?api_key={settings.RW_API_KEY}"
+url = strategy.url
+params = {"api_key": settings.RW_API_KEY}  # kept out of the url, which is logged
 
 
-def get_yolo_weights():
-    """Call the API, get the weights, send for sizing."""
-    resp = requests.get(url=url)
-    yolo = resp.json()
+def get_yolo_weights(net=True):
+    """Call the API, get the weights, send for sizing.
+
+    Args:
+        net (bool, optional): net the new requests into TargetPositions (and
+            execute them if the Strategy executes immediately). The
+            scheduler's pipeline passes False and nets every strategy at once.
+    """
+    with tracing.run(strategy.name):
+        _get_yolo_weights(net)
+
+
+def _get_yolo_weights(net):
+    with tracing.span("weights.fetch"):
+        yolo = FETCHER.fetch(url, params=params)
+    if yolo is None:
+        return  # not modified since the last fetch
 
     if yolo.get("success") == "true":
         last_updated = yolo.get("last_updated")
+        calculated_at = datetime.fromtimestamp(last_updated, timezone.utc)
+        if StrategyPositionRequest.objects.filter(
+            strategy=strategy, calculated_at__gte=calculated_at
+        ).exists():
+            logger.info(f"weights calculated at {calculated_at} are already stored")
+            return
+
         for position in yolo.get("data"):
             logger.info(
                 f"{position.get('ticker')}, {position.get('combo_weight')}, {position.get('arrival_price')}"
             )
-            calculated_at = datetime.fromtimestamp(last_updated, timezone.utc)
 
-            spr = StrategyPositionRequest.objects.set_position(
+        try:
+            securities = StrategyPositionRequest.objects.set_positions(
                 strategy_name=strategy.name,
-                exchange_name=strategy.exchange,
-                security_name=position.get("ticker"),
-                weight=position.get("combo_weight"),
-                arrival_price_usd=position.get("arrival_price"),
+                exchange_name=strategy.exchange.name,
+                positions=[
+                    {
+                        "security_name": position.get("ticker"),
+                        "weight": position.get("combo_weight"),
+                        "arrival_price_usd": position.get("arrival_price"),
+                    }
+                    for position in yolo.get("data")
+                ],
                 calculated_at=calculated_at,
             )
+        except Exception:
+            FETCHER.forget(url)  # so the next run doesn't get a 304
+            raise
 
+        if net:
             TargetPosition.objects.create_new_desired_positions(
-                security=spr.security,
+                security=securities,
                 execute_immediately=strategy.execute_immediately,
             )
 
-        closing_positions = StrategyPositionRequest.objects.filter(
-            strategy=strategy, calculated_at__lt=calculated_at
-        )
-        closing_positions.update(weight=0.0)
-        for position in closing_positions:
-            TargetPosition.objects.create_new_desired_positions(
-                security=position.security,
-                execute_immediately=position.execute_immediately,
-            )
-
     else:
+        FETCHER.forget(url)
         logger.error(f'yolo api failed: {yolo.get("message")}')
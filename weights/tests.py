@@ -1,3 +1,131 @@
-from django.test import TestCase
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.test import SimpleTestCase, TestCase
+from django.core import management
+
+from sizing.models import StrategyPositionRequest, TargetPosition
+from weights.fetcher import WeightsFetcher
+from .test_endtoend import strategy_url, weights_payload
+from .test_server import TestServer
+
+
+class WeightsHandler(BaseHTTPRequestHandler):
+    etag = '"v1"'
+    payload = {"success": "true", "data": []}
+    failures = 0  # 503s to send before answering
+    seen = []
+
+    def do_GET(self):
+        type(self).seen.append(dict(self.headers))
+        if type(self).failures:
+            type(self).failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(self.payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", "Thu, 25 Nov 2021 00:00:00 GMT")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WeightsFetcherTest(SimpleTestCase):
+    def setUp(self) -> None:
+        WeightsHandler.seen = []
+        WeightsHandler.failures = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), WeightsHandler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/weights/yolo"
+
+    def tearDown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_unchanged_payload_is_not_modified(self) -> None:
+        fetcher = WeightsFetcher(timeout=2.0)
+
+        self.assertEqual(fetcher.fetch(self.url), WeightsHandler.payload)
+        self.assertIsNone(fetcher.fetch(self.url))
+
+        self.assertEqual(WeightsHandler.seen[1]["If-None-Match"], '"v1"')
+        self.assertEqual(
+            WeightsHandler.seen[1]["If-Modified-Since"],
+            "Thu, 25 Nov 2021 00:00:00 GMT",
+        )
+        self.assertEqual(fetcher.stats, {"fetched": 1, "not_modified": 1})
+
+        fetcher.forget(self.url)
+        self.assertEqual(fetcher.fetch(self.url), WeightsHandler.payload)
+
+    def test_retries_server_errors(self) -> None:
+        WeightsHandler.failures = 2
+        fetcher = WeightsFetcher(timeout=2.0, retries=2)
+        with mock.patch("urllib3.util.retry.Retry.sleep"):
+            self.assertEqual(fetcher.fetch(self.url), WeightsHandler.payload)
+        self.assertEqual(len(WeightsHandler.seen), 3)
+
+    def test_params_are_not_logged_or_raised(self) -> None:
+        fetcher = WeightsFetcher(timeout=2.0, retries=0)
+        params = {"api_key": "s3cret"}
+        fetcher.fetch(self.url, params=params)
+        with self.assertLogs("wagmi", level="INFO") as logs:
+            self.assertIsNone(fetcher.fetch(self.url, params=params))
+        self.assertNotIn("s3cret", "\n".join(logs.output))
+
+        WeightsHandler.failures = 1
+        fetcher.forget(self.url)
+        with self.assertRaises(requests.RequestException) as raised:
+            fetcher.fetch(self.url, params=params)
+        self.assertNotIn("s3cret", str(raised.exception))
+        self.assertIsNone(raised.exception.__cause__)
+        self.assertTrue(raised.exception.__suppress_context__)
+
+
+class StoredWeightsTest(TestCase):
+    def setUp(self) -> None:
+        management.call_command(
+            "loaddata", "sizing/fixtures/exchanges.yaml", verbosity=0
+        )
+        management.call_command(
+            "loaddata", "sizing/fixtures/strategies.yaml", verbosity=0
+        )
+        self.test_server = TestServer()
+        self.test_server.run(weights_payload)
+
+    def tearDown(self) -> None:
+        self.test_server.stop()
+
+    def test_already_stored_weights_are_not_resized(self) -> None:
+        from weights import runner
+
+        with mock.patch.object(runner, "url", strategy_url):
+            management.call_command("rw_yolo")
+            updated = set(
+                StrategyPositionRequest.objects.values_list("updated_at", flat=True)
+            )
+            with mock.patch.object(
+                TargetPosition.objects, "create_new_desired_positions"
+            ) as net:
+                management.call_command("rw_yolo")
+
+        net.assert_not_called()
+        self.assertEqual(
+            set(StrategyPositionRequest.objects.values_list("updated_at", flat=True)),
+            updated,
+        )